@@ -0,0 +1,103 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from Modules.Moderator.database import Database
+
+# Какие наказания держатся ролью и должны вернуться при повторном входе
+PUNISHMENT_ROLES = {
+    'mute': "Muted",
+    'temp_mute': "Muted",
+    'voice_mute': "Voice Muted",
+    'temp_voice_mute': "Voice Muted",
+}
+
+# Действия, которые снимают наказания, а не создают их: записи в punishments у них нет
+REVOKING_ACTIONS = {
+    'unmute': tuple(PUNISHMENT_ROLES),
+    'unban': ('ban', 'temp_ban'),
+}
+
+
+async def revoke_punishments(db: Database, guild_id: int, user_id: int, type_ids: List[int],
+                             revoked_by: int, reason: Optional[str], now: datetime) -> List[int]:
+    """Отмечает снятыми все неснятые наказания пользователя указанных типов.
+
+    Ищет по базе, а не по индексу: снимаются и записи, которых в индексе
+    нет (бан, просроченный кэш). Возвращает id снятых записей.
+    """
+    if not type_ids:
+        return []
+    async with db.transaction() as cursor:
+        rows = await cursor.fetchall(f'''
+        SELECT id FROM punishments
+        WHERE guild_id = %s AND user_id = %s AND revoked = FALSE
+        AND punishment_type_id IN ({", ".join(["%s"] * len(type_ids))})
+        ''', (guild_id, user_id, *type_ids))
+        revoked = [row['id'] for row in rows]
+        if revoked:
+            await cursor.execute(f'''
+            UPDATE punishments
+            SET revoked = TRUE, revoked_at = %s, revoked_by = %s, revoked_reason = %s
+            WHERE id IN ({", ".join(["%s"] * len(revoked))}) AND revoked = FALSE
+            ''', (now, revoked_by, reason, *revoked))
+    return revoked
+
+
+class ActivePunishments:
+    """Индекс действующих наказаний-ролей по (сервер, пользователь).
+
+    Хранятся только непросроченные и неснятые муты; запись удаляется при
+    снятии, а просроченная отбрасывается при первом обращении, так что
+    проверка на входе участника — один поиск в словаре без запроса в базу.
+    """
+
+    def __init__(self):
+        self._by_member: Dict[Tuple[int, int], Dict[int, Tuple[str, Optional[datetime]]]] = {}
+        self._members: Dict[int, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def add(self, punishment_id: int, guild_id: int, user_id: int, name: str, expires_at: Optional[datetime]) -> None:
+        if name not in PUNISHMENT_ROLES:
+            return
+        key = (guild_id, user_id)
+        self._by_member.setdefault(key, {})[punishment_id] = (name, expires_at)
+        self._members[punishment_id] = key
+
+    def discard(self, punishment_id: int) -> None:
+        key = self._members.pop(punishment_id, None)
+        if key is None:
+            return
+        entries = self._by_member.get(key)
+        if entries is not None:
+            entries.pop(punishment_id, None)
+            if not entries:
+                del self._by_member[key]
+
+    def discard_member(self, guild_id: int, user_id: int, names: Iterable[str] = PUNISHMENT_ROLES) -> List[int]:
+        """Снимает все наказания пользователя указанных типов и возвращает их id"""
+        entries = self._by_member.get((guild_id, user_id), {})
+        names = set(names)
+        removed = [punishment_id for punishment_id, (name, _) in entries.items() if name in names]
+        for punishment_id in removed:
+            self.discard(punishment_id)
+        return removed
+
+    def forget_guild(self, guild_id: int) -> None:
+        for key in [key for key in self._by_member if key[0] == guild_id]:
+            for punishment_id in self._by_member.pop(key):
+                self._members.pop(punishment_id, None)
+
+    def roles_for(self, guild_id: int, user_id: int, now: datetime) -> Set[str]:
+        """Названия ролей, которые должны быть у пользователя прямо сейчас"""
+        entries = self._by_member.get((guild_id, user_id))
+        if not entries:
+            return set()
+        roles = set()
+        for punishment_id, (name, expires_at) in list(entries.items()):
+            if expires_at is not None and expires_at <= now:
+                self.discard(punishment_id)
+            else:
+                roles.add(PUNISHMENT_ROLES[name])
+        return roles
@@ -0,0 +1,151 @@
+import asyncio
+import gzip
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from Modules.Moderator.database import Database
+
+# Что архивируется: столбец времени, выгружаемые столбцы и доп. условие
+ARCHIVE_TABLES = {
+    'logs': {
+        'time_column': 'created_at',
+        'columns': 'id, guild_id, user_id, action_type, details, created_at',
+        'where': '',
+    },
+    'voice_activity': {
+        'time_column': 'join_time',
+        'columns': 'id, guild_id, user_id, channel_id, channel_name, join_time, leave_time, duration_seconds',
+        # Открытые сессии ещё нужны буферу голосовой активности
+        'where': 'AND leave_time IS NOT NULL',
+    },
+}
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _months(since: date, until: date) -> Iterator[date]:
+    month = _month_start(since)
+    while month < until:
+        yield month
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+class RetentionArchiver:
+    """Перенос старых строк из горячих таблиц в сжатые архивы.
+
+    Строки старше срока хранения читаются пачками по времени, дописываются
+    в Saves/.../<таблица>/<сервер>/<ГГГГ-ММ>.jsonl.gz отдельным gzip-членом
+    и только после записи удаляются из базы короткими DELETE по id. Если
+    процесс упал между записью и удалением, строки попадут в архив повторно;
+    чтение архива отбрасывает повторы по id.
+    """
+
+    def __init__(self, db: Database, directory: str, retention_days: Dict[str, int],
+                 chunk_size: int = 1000, prune_batch: int = 500, pause: float = 0.1):
+        self.db = db
+        self.directory = directory
+        self.retention_days = retention_days
+        self.chunk_size = chunk_size
+        self.prune_batch = prune_batch
+        self.pause = pause
+
+    def _path(self, table: str, guild_id: Optional[int], month: date) -> str:
+        return os.path.join(self.directory, table, str(guild_id or 'global'), f"{month:%Y-%m}.jsonl.gz")
+
+    def _write(self, table: str, guild_id: Optional[int], rows: List[dict]) -> None:
+        time_column = ARCHIVE_TABLES[table]['time_column']
+        by_month: Dict[date, List[dict]] = {}
+        for row in rows:
+            by_month.setdefault(_month_start(row[time_column].date()), []).append(row)
+        for month, month_rows in by_month.items():
+            path = self._path(table, guild_id, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            payload = "".join(json.dumps(row, default=str, ensure_ascii=False) + "\n" for row in month_rows)
+            # Режим "ab" добавляет новый gzip-член; gzip.open читает их подряд как один поток
+            with open(path, 'ab') as f:
+                f.write(gzip.compress(payload.encode('utf-8')))
+                f.flush()
+                os.fsync(f.fileno())
+
+    async def _prune(self, table: str, ids: List[int]) -> None:
+        for i in range(0, len(ids), self.prune_batch):
+            batch = ids[i:i + self.prune_batch]
+            await self.db.execute(f'''
+            DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(batch))})
+            ''', batch)
+            await asyncio.sleep(self.pause)
+
+    async def archive_table(self, table: str, guild_id: Optional[int], cutoff: datetime) -> int:
+        """Архивирует и удаляет строки сервера старше cutoff; возвращает их число"""
+        spec = ARCHIVE_TABLES[table]
+        guild_filter = "guild_id = %s" if guild_id is not None else "guild_id IS NULL"
+        params = (guild_id,) if guild_id is not None else ()
+        loop = asyncio.get_running_loop()
+        archived = 0
+        while True:
+            # Архивированное сразу удаляется, поэтому каждая пачка берётся с начала
+            rows = await self.db.fetchall(f'''
+            SELECT {spec['columns']}
+            FROM {table}
+            WHERE {guild_filter} AND {spec['time_column']} < %s {spec['where']}
+            ORDER BY {spec['time_column']}, id
+            LIMIT %s
+            ''', (*params, cutoff, self.chunk_size))
+            if not rows:
+                return archived
+            await loop.run_in_executor(None, self._write, table, guild_id, rows)
+            await self._prune(table, [row['id'] for row in rows])
+            archived += len(rows)
+
+    async def run_once(self, guild_ids: List[Optional[int]], now: Optional[datetime] = None) -> Dict[str, int]:
+        """Один проход по всем таблицам и серверам"""
+        now = now or datetime.utcnow()
+        result = {}
+        for table, days in self.retention_days.items():
+            if not days:
+                continue
+            cutoff = now - timedelta(days=days)
+            result[table] = 0
+            for guild_id in guild_ids:
+                result[table] += await self.archive_table(table, guild_id, cutoff)
+        return result
+
+    def cutoff_date(self, table: str, now: Optional[datetime] = None) -> Optional[date]:
+        """Первый день, данные которого ещё точно есть в горячей таблице"""
+        days = self.retention_days.get(table)
+        if not days:
+            return None
+        return ((now or datetime.utcnow()) - timedelta(days=days)).date() + timedelta(days=1)
+
+    def _scan(self, table: str, guild_id: int, since: datetime, until: datetime,
+              user_id: Optional[int], limit: int) -> List[dict]:
+        time_column = ARCHIVE_TABLES[table]['time_column']
+        since_key, until_key = since.isoformat(sep=' '), until.isoformat(sep=' ')
+        seen = set()
+        rows = []
+        for month in _months(since.date(), until.date() + timedelta(days=1)):
+            path = self._path(table, guild_id, month)
+            if not os.path.exists(path):
+                continue
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    row = json.loads(line)
+                    if row['id'] in seen or not (since_key <= row[time_column] < until_key):
+                        continue
+                    if user_id is not None and row['user_id'] != user_id:
+                        continue
+                    seen.add(row['id'])
+                    rows.append(row)
+                    if len(rows) >= limit:
+                        return rows
+        return rows
+
+    async def query(self, table: str, guild_id: int, since: datetime, until: datetime,
+                    user_id: Optional[int] = None, limit: int = 10000) -> List[dict]:
+        """Чтение архива за [since, until) без загрузки обратно в базу"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._scan, table, guild_id, since, until, user_id, limit)
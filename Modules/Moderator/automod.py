@@ -0,0 +1,157 @@
+import json
+import os
+import re
+from collections import deque
+from typing import Deque, Dict, Hashable, Iterable, Optional, Tuple
+
+from Modules.Moderator.cache import LRUCache
+
+INVITE_PATTERN = r"(?:https?://)?(?:www\.)?(?:discord\.gg|discord(?:app)?\.com/invite)/[\w-]+"
+LINK_PATTERN = r"https?://(?:www\.)?(?P<domain>[^\s/:?#]+)[^\s]*"
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Регулярка-префиксное дерево: общие префиксы слов проверяются один раз"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if end:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+class AutoModFilter:
+    """Запрещённые слова и ссылки одной скомпилированной регуляркой.
+
+    Слова собираются в префиксное дерево, приглашения и ссылки идут
+    отдельными именованными ветками той же регулярки, поэтому сообщение
+    просматривается за один проход независимо от размера списка.
+    """
+
+    def __init__(self, words: Iterable[str] = (), allowed_domains: Iterable[str] = (),
+                 block_invites: bool = False, block_links: bool = False):
+        self.words = sorted({w.strip().lower() for w in words if w.strip()})
+        self.allowed_domains = {d.lower() for d in allowed_domains}
+        self.block_invites = block_invites
+        self.block_links = block_links
+
+        branches = []
+        if self.words:
+            branches.append(rf"(?<!\w)(?P<word>{_trie_pattern(self.words)})(?!\w)")
+        if block_invites:
+            branches.append(rf"(?P<invite>{INVITE_PATTERN})")
+        if block_links:
+            branches.append(rf"(?P<link>{LINK_PATTERN})")
+        self._pattern = re.compile("|".join(branches), re.IGNORECASE) if branches else None
+
+    @classmethod
+    def from_file(cls, path: str) -> Optional["AutoModFilter"]:
+        """Правила из JSON: words, allowed_domains, block_invites, block_links.
+
+        Без файла правил автомодерация не работает: возвращается None,
+        а не фильтр с правилами по умолчанию.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            rules = json.load(f)
+        return cls(
+            words=rules.get('words', []),
+            allowed_domains=rules.get('allowed_domains', []),
+            block_invites=rules.get('block_invites', False),
+            block_links=rules.get('block_links', False)
+        )
+
+    def _allowed(self, domain: str) -> bool:
+        domain = domain.lower()
+        while domain:
+            if domain in self.allowed_domains:
+                return True
+            _, _, domain = domain.partition('.')
+        return False
+
+    def match(self, text: str) -> Optional[Tuple[str, str]]:
+        """(вид нарушения, найденный фрагмент) или None"""
+        if self._pattern is None or not text:
+            return None
+        for found in self._pattern.finditer(text):
+            kind = found.lastgroup
+            if kind == 'link' and self._allowed(found.group('domain')):
+                continue
+            return kind, found.group(kind)
+        return None
+
+
+class _AuthorState:
+    __slots__ = ('times', 'digests', 'strikes')
+
+    def __init__(self, spam_count: int, duplicate_count: int, strike_limit: int):
+        self.times: Deque[float] = deque(maxlen=spam_count)
+        self.digests: Deque[Tuple[float, int]] = deque(maxlen=duplicate_count)
+        self.strikes: Deque[float] = deque(maxlen=strike_limit)
+
+
+class MessageRateTracker:
+    """Скользящие окна по авторам: флуд, повторы и счётчик нарушений.
+
+    Окна — кольцевые буферы фиксированной длины, авторы хранятся в LRU,
+    поэтому и время на сообщение, и память ограничены константой.
+    """
+
+    def __init__(self, spam_count: int = 5, spam_window: float = 5.0, duplicate_count: int = 3,
+                 duplicate_window: float = 30.0, duplicate_min_length: int = 10, strike_window: float = 3600.0, strike_limit: int = 10,
+                 capacity: int = 10000):
+        self.spam_count = spam_count
+        self.spam_window = spam_window
+        self.duplicate_count = duplicate_count
+        self.duplicate_window = duplicate_window
+        self.duplicate_min_length = duplicate_min_length
+        self.strike_window = strike_window
+        self.strike_limit = strike_limit
+        self._authors = LRUCache(capacity)
+
+    def _state(self, key: Hashable) -> _AuthorState:
+        state = self._authors.get(key)
+        if state is None:
+            state = _AuthorState(self.spam_count, self.duplicate_count, self.strike_limit)
+            self._authors.put(key, state)
+        return state
+
+    def observe(self, key: Hashable, content: str, now: float) -> Optional[str]:
+        """'spam', 'duplicate' или None; после срабатывания окно начинается заново"""
+        state = self._state(key)
+
+        state.times.append(now)
+        if len(state.times) == self.spam_count and now - state.times[0] <= self.spam_window:
+            state.times.clear()
+            return 'spam'
+
+        if len(content) >= self.duplicate_min_length:
+            digest = hash(" ".join(content.lower().split()))
+            state.digests.append((now, digest))
+            if len(state.digests) == self.duplicate_count and all(
+                d == digest and now - t <= self.duplicate_window for t, d in state.digests
+            ):
+                state.digests.clear()
+                return 'duplicate'
+        return None
+
+    def strike(self, key: Hashable, now: float) -> int:
+        """Фиксирует нарушение и возвращает их число за strike_window"""
+        strikes = self._state(key).strikes
+        strikes.append(now)
+        while strikes and now - strikes[0] > self.strike_window:
+            strikes.popleft()
+        return len(strikes)
@@ -0,0 +1,122 @@
+import asyncio
+import re
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from Modules.Moderator.database import Database
+
+# Snowflake: 17-20 цифр, не часть более длинного числа
+USER_ID_RE = re.compile(r"(?<!\d)\d{17,20}(?!\d)")
+
+BULK_ACTIONS = ['ban', 'temp_ban', 'kick', 'mute', 'temp_mute']
+
+# Какое право нужно модератору для каждого массового действия
+BULK_PERMISSIONS = {
+    'ban': 'ban_members',
+    'temp_ban': 'ban_members',
+    'kick': 'kick_members',
+    'mute': 'manage_roles',
+    'temp_mute': 'manage_roles',
+}
+
+
+def parse_user_ids(*texts: Optional[str]) -> List[int]:
+    """ID из произвольного текста (упоминания, списки, CSV) без повторов, в исходном порядке"""
+    seen = {}
+    for text in texts:
+        if text:
+            for match in USER_ID_RE.findall(text):
+                seen.setdefault(int(match), None)
+    return list(seen)
+
+
+def recent_joins(guild: discord.Guild, minutes: int, now: Optional[datetime] = None) -> List[int]:
+    """Участники, зашедшие за последние minutes минут (без ботов)"""
+    now = now or discord.utils.utcnow()
+    since = now - timedelta(minutes=minutes)
+    return [m.id for m in guild.members if not m.bot and m.joined_at and m.joined_at >= since]
+
+
+class BulkRunner:
+    """Выполнение одного действия над множеством пользователей.
+
+    Не больше concurrency запросов одновременно и не чаще rate в секунду;
+    бакеты и 429 по-прежнему обрабатывает HTTP-клиент py-cord. Ошибка по
+    одному пользователю не останавливает остальных.
+    """
+
+    def __init__(self, concurrency: int = 5, rate: float = 10.0):
+        self.concurrency = concurrency
+        self.interval = 1.0 / rate if rate else 0.0
+        self._throttle_lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    async def _throttle(self) -> None:
+        async with self._throttle_lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_slot - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_slot = max(loop.time(), self._next_slot) + self.interval
+
+    async def run(self, user_ids: Iterable[int], worker: Callable[[int], Awaitable[None]]) -> Tuple[List[int], Dict[int, str]]:
+        """Возвращает (успешные id, {id: причина отказа})"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        succeeded: List[int] = []
+        failed: Dict[int, str] = {}
+
+        async def apply(user_id):
+            async with semaphore:
+                await self._throttle()
+                try:
+                    await worker(user_id)
+                except discord.NotFound:
+                    failed[user_id] = "не найден"
+                except discord.Forbidden:
+                    failed[user_id] = "нет прав"
+                except Exception as e:
+                    failed[user_id] = str(e) or type(e).__name__
+                else:
+                    succeeded.append(user_id)
+
+        await asyncio.gather(*(apply(user_id) for user_id in user_ids))
+        return succeeded, failed
+
+
+async def insert_bulk_punishments(db: Database, guild_id: int, moderator_id: int, users: Dict[int, str],
+                                  punishment_type_id: int, reason: Optional[str], duration_seconds: Optional[int],
+                                  expires_at: Optional[datetime], chunk_size: int = 500) -> List[dict]:
+    """Записывает массовое наказание многострочными INSERT в одной транзакции.
+
+    users — {user_id: имя}. Строки пачки помечаются своим batch_id, по
+    которому читаются их id: совпадение по времени создания путало бы
+    пачки, записанные в одну секунду. Возвращает [{'id', 'user_id'}].
+    """
+    batch_id = uuid.uuid4().hex
+    created_at = datetime.utcnow().replace(microsecond=0)
+    user_ids = list(users)
+    inserted = []
+    async with db.transaction() as cursor:
+        for i in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[i:i + chunk_size]
+            await cursor.execute(f'''
+            INSERT IGNORE INTO users (user_id, username)
+            VALUES {", ".join(["(%s, %s)"] * len(chunk))}
+            ''', [v for user_id in chunk for v in (user_id, users[user_id])])
+            await cursor.execute(f'''
+            INSERT INTO punishments
+            (guild_id, user_id, moderator_id, punishment_type_id, reason, duration_seconds, expires_at, created_at, batch_id)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(chunk))}
+            ''', [v for user_id in chunk for v in (
+                guild_id, user_id, moderator_id, punishment_type_id,
+                reason, duration_seconds, expires_at, created_at, batch_id
+            )])
+            # guild_id + user_id идут по idx_punishments_guild_user_created
+            inserted += await cursor.fetchall(f'''
+            SELECT id, user_id FROM punishments
+            WHERE guild_id = %s AND user_id IN ({", ".join(["%s"] * len(chunk))}) AND batch_id = %s
+            ''', (guild_id, *chunk, batch_id))
+    return inserted
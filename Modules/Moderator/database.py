@@ -0,0 +1,515 @@
+import asyncio
+import os
+import queue
+import re
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import mysql.connector
+    from mysql.connector import pooling
+except ImportError:  # локальный бэкенд работает и без драйвера MySQL
+    mysql = None
+    pooling = None
+
+
+class DatabaseError(Exception):
+    pass
+
+
+class Database:
+    """Асинхронная обёртка над пулом синхронных соединений.
+
+    Каждый запрос выполняется в отдельном потоке пула, поэтому event loop
+    бота никогда не ждёт сетевого обмена с базой.
+    """
+
+    dialect = ""
+    # Сбрасывается схемой, если в сборке SQLite нет FTS5: поиск тогда идёт через LIKE
+    fulltext = True
+
+    def __init__(self, pool_size: int = 5, query_timeout: float = 10.0):
+        self.pool_size = pool_size
+        self.query_timeout = query_timeout
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="moderator-db")
+        # Слоты пула раздаются в event loop, поэтому поток никогда не ждёт свободное соединение
+        self._slots = asyncio.Semaphore(pool_size)
+        self._closed = False
+
+    # --- методы, которые реализуют бэкенды ---
+
+    def _acquire(self):
+        raise NotImplementedError
+
+    def _release(self, conn) -> None:
+        raise NotImplementedError
+
+    def _limit_session(self, conn, timeout: float) -> None:
+        pass
+
+    def _reconnect(self, conn):
+        raise NotImplementedError
+
+    def _is_connection_error(self, error: Exception) -> bool:
+        return False
+
+    def _cursor(self, conn):
+        return conn.cursor()
+
+    def _rows(self, cursor) -> List[Dict[str, Any]]:
+        return cursor.fetchall()
+
+    def _stream_cursor(self, conn):
+        return self._cursor(conn)
+
+    def _fetch_chunk(self, cursor, size: int) -> List[Dict[str, Any]]:
+        return cursor.fetchmany(size)
+
+    def _abort_stream(self, conn) -> None:
+        pass
+
+    def translate(self, query: str) -> str:
+        return query
+
+    def _close_all(self) -> None:
+        pass
+
+    def _columns_query(self, table: str) -> Tuple[str, Sequence]:
+        raise NotImplementedError
+
+    def _index_query(self, table: str, name: str) -> Tuple[str, Sequence]:
+        raise NotImplementedError
+
+    # --- синхронная часть, выполняется в потоках пула ---
+
+    def _checkout(self, timeout: Optional[float] = None):
+        """Соединение из пула с серверным лимитом под таймаут этого вызова"""
+        conn = self._acquire()
+        try:
+            self._limit_session(conn, timeout or self.query_timeout)
+        except BaseException:
+            self._release(conn)
+            raise
+        return conn
+
+    def _run(self, conn, query: str, params: Sequence, many: bool, fetch: Optional[str]):
+        cursor = self._cursor(conn)
+        try:
+            if many:
+                cursor.executemany(self.translate(query), params)
+            else:
+                cursor.execute(self.translate(query), tuple(params))
+            if fetch == "one":
+                rows = self._rows(cursor)
+                return rows[0] if rows else None
+            if fetch == "all":
+                return self._rows(cursor)
+            if fetch == "lastrowid":
+                return cursor.lastrowid
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def _call(self, query: str, params: Sequence, many: bool, fetch: Optional[str], timeout: Optional[float] = None):
+        conn = self._checkout(timeout)
+        try:
+            try:
+                result = self._run(conn, query, params, many, fetch)
+            except Exception as e:
+                if not self._is_connection_error(e):
+                    conn.rollback()
+                    raise
+                # Соединение оборвалось: переподключаемся и повторяем один раз
+                conn = self._reconnect(conn)
+                self._limit_session(conn, timeout or self.query_timeout)
+                result = self._run(conn, query, params, many, fetch)
+            conn.commit()
+            return result
+        finally:
+            self._release(conn)
+
+    def _stream(self, query: str, params: Sequence, chunk_size: int, consume: Callable[[List[Dict[str, Any]]], None],
+                timeout: Optional[float] = None) -> int:
+        conn = self._checkout(timeout)
+        cursor = self._stream_cursor(conn)
+        total = 0
+        try:
+            cursor.execute(self.translate(query), tuple(params))
+            while True:
+                rows = self._fetch_chunk(cursor, chunk_size)
+                if not rows:
+                    return total
+                consume(rows)
+                total += len(rows)
+        except BaseException:
+            self._abort_stream(conn)
+            raise
+        finally:
+            try:
+                cursor.close()
+                conn.rollback()
+            finally:
+                self._release(conn)
+
+    async def _submit(self, func, *args, timeout: Optional[float] = None, slot: bool = False):
+        """Запускает func в потоке пула и ждёт не дольше timeout.
+
+        Таймаут здесь только клиентский: поток с запросом прервать нельзя,
+        он освободится, когда ответит база. Поэтому сами запросы ограничены
+        и на стороне сервера (см. MySQLDatabase._limit_session), а слот пула при
+        slot=True возвращается только по завершении потока — иначе брошенные
+        запросы незаметно занимали бы все потоки, и новые ждали бы в очереди
+        executor'а мимо семафора.
+        """
+        if self._closed:
+            raise DatabaseError("Database is closed")
+        if slot:
+            await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, func, *args)
+        except BaseException:
+            if slot:
+                self._slots.release()
+            raise
+        if slot:
+            future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout or self.query_timeout)
+        except asyncio.TimeoutError as e:
+            raise DatabaseError("Query timed out") from e
+
+    async def _query(self, query: str, params: Sequence, many: bool, fetch: Optional[str], timeout: Optional[float]):
+        return await self._submit(self._call, query, params, many, fetch, timeout, timeout=timeout, slot=True)
+
+    # --- публичный API ---
+
+    async def execute(self, query: str, params: Sequence = (), timeout: Optional[float] = None) -> int:
+        """Выполняет запрос и возвращает количество затронутых строк"""
+        return await self._query(query, params, False, None, timeout)
+
+    async def executemany(self, query: str, seq_params: Iterable[Sequence], timeout: Optional[float] = None) -> int:
+        """Выполняет запрос для каждого набора параметров одной транзакцией"""
+        return await self._query(query, [tuple(p) for p in seq_params], True, None, timeout)
+
+    async def insert(self, query: str, params: Sequence = (), timeout: Optional[float] = None) -> Optional[int]:
+        """Выполняет INSERT и возвращает id новой строки"""
+        return await self._query(query, params, False, "lastrowid", timeout)
+
+    async def fetchone(self, query: str, params: Sequence = (), timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        return await self._query(query, params, False, "one", timeout)
+
+    async def fetchall(self, query: str, params: Sequence = (), timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        return await self._query(query, params, False, "all", timeout)
+
+    async def stream(self, query: str, params: Sequence, consume: Callable[[List[Dict[str, Any]]], None],
+                     chunk_size: int = 1000, timeout: Optional[float] = None) -> int:
+        """Читает результат пачками по chunk_size и отдаёт их в consume.
+
+        consume вызывается в потоке пула, а не в event loop, поэтому может
+        писать на диск. В памяти одновременно держится только одна пачка.
+        Возвращает количество строк. Серверный лимит соединения берётся из
+        timeout, а не из query_timeout, иначе MySQL оборвал бы долгую выгрузку.
+        """
+        return await self._submit(self._stream, query, params, chunk_size, consume, timeout, timeout=timeout, slot=True)
+
+    async def columns(self, table: str) -> List[str]:
+        """Имена столбцов таблицы — для миграций существующих баз"""
+        query, params = self._columns_query(table)
+        return [row['name'] for row in await self.fetchall(query, params)]
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Несколько запросов на одном соединении с общим COMMIT/ROLLBACK"""
+        async with self._slots:
+            conn = await self._submit(self._checkout)
+            tx = Transaction(self, conn)
+            try:
+                yield tx
+                await self._submit(tx._locked, conn.commit)
+            except BaseException:
+                try:
+                    await self._submit(tx._locked, conn.rollback)
+                except Exception:
+                    pass
+                raise
+            finally:
+                # Брошенный по таймауту запрос ещё может идти на этом соединении —
+                # слот освобождается только после него
+                await asyncio.get_running_loop().run_in_executor(self._executor, tx._locked, self._release, conn)
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        # Дожидаемся незавершённых запросов, не блокируя event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+        self._close_all()
+
+
+class Transaction:
+    """Соединение, закреплённое за транзакцией"""
+
+    def __init__(self, db: Database, conn):
+        self.db = db
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    def _locked(self, func, *args):
+        # Вызовы на соединении идут строго по очереди, даже если предыдущий брошен по таймауту
+        with self._lock:
+            return func(*args)
+
+    async def _do(self, query, params, many, fetch):
+        return await self.db._submit(self._locked, self.db._run, self.conn, query, params, many, fetch)
+
+    async def execute(self, query: str, params: Sequence = ()) -> int:
+        return await self._do(query, params, False, None)
+
+    async def executemany(self, query: str, seq_params: Iterable[Sequence]) -> int:
+        return await self._do(query, [tuple(p) for p in seq_params], True, None)
+
+    async def insert(self, query: str, params: Sequence = ()) -> Optional[int]:
+        return await self._do(query, params, False, "lastrowid")
+
+    async def fetchone(self, query: str, params: Sequence = ()) -> Optional[Dict[str, Any]]:
+        return await self._do(query, params, False, "one")
+
+    async def fetchall(self, query: str, params: Sequence = ()) -> List[Dict[str, Any]]:
+        return await self._do(query, params, False, "all")
+
+    async def columns(self, table: str) -> List[str]:
+        query, params = self.db._columns_query(table)
+        return [row['name'] for row in await self.fetchall(query, params)]
+
+    async def ensure_index(self, table: str, name: str, columns: Sequence[str]) -> bool:
+        """Создаёт индекс, если его ещё нет; True, если индекс был создан.
+
+        MySQL не понимает CREATE INDEX IF NOT EXISTS, поэтому наличие
+        индекса проверяется по каталогу базы.
+        """
+        query, params = self.db._index_query(table, name)
+        if await self.fetchone(query, params):
+            return False
+        await self.execute(f'CREATE INDEX {name} ON {table}({", ".join(columns)})')
+        return True
+
+
+class MySQLDatabase(Database):
+    """Пул соединений mysql.connector"""
+
+    dialect = "mysql"
+
+    def __init__(self, host, user, password, database, pool_size: int = 5, query_timeout: float = 10.0, connect_timeout: float = 5.0):
+        if pooling is None:
+            raise DatabaseError("mysql-connector-python is not installed")
+        super().__init__(pool_size=pool_size, query_timeout=query_timeout)
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name=f"moderator-{uuid.uuid4().hex[:8]}",
+            pool_size=pool_size,
+            pool_reset_session=True,
+            host=host,
+            user=user,
+            password=password,
+            database=database,
+            connection_timeout=int(connect_timeout),
+            autocommit=False
+        )
+        self._session_limits = True
+
+    def _acquire(self):
+        conn = self._pool.get_connection()
+        try:
+            # Проверяем соединение перед выдачей и при необходимости переподключаемся
+            conn.ping(reconnect=True, attempts=3, delay=1)
+        except mysql.connector.Error as e:
+            conn.close()
+            raise DatabaseError(f"Connection failed: {e}") from e
+        return conn
+
+    def _limit_session(self, conn, timeout: float) -> None:
+        """Ограничивает запросы соединения на сервере таймаутом вызова.
+
+        Клиентский таймаут не останавливает запрос, и поток пула ждал бы его
+        сколько угодно. max_execution_time прерывает долгие SELECT, а
+        innodb_lock_wait_timeout — ожидание блокировок в UPDATE/DELETE.
+        pool_reset_session сбрасывает сессию при возврате в пул, поэтому
+        переменные выставляются при каждой выдаче соединения и после
+        переподключения.
+        """
+        if not self._session_limits:
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SET SESSION max_execution_time = %s, innodb_lock_wait_timeout = %s",
+                (int(timeout * 1000), max(1, int(timeout)))
+            )
+        except mysql.connector.errors.ProgrammingError:
+            # Сервер без max_execution_time (MariaDB, MySQL до 5.7.8): остаётся только клиентский таймаут
+            self._session_limits = False
+        finally:
+            cursor.close()
+
+    def _release(self, conn) -> None:
+        conn.close()  # возвращает соединение в пул
+
+    def _reconnect(self, conn):
+        conn.reconnect(attempts=3, delay=1)
+        return conn
+
+    def _is_connection_error(self, error: Exception) -> bool:
+        return isinstance(error, (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError))
+
+    def _cursor(self, conn):
+        return conn.cursor(dictionary=True)
+
+    def _stream_cursor(self, conn):
+        # Небуферизованный курсор: строки читаются с сервера по мере fetchmany
+        return conn.cursor(dictionary=True, buffered=False)
+
+    def _abort_stream(self, conn) -> None:
+        # Недочитанный результат иначе не даст закрыть курсор и вернуть соединение в пул
+        try:
+            conn.consume_results()
+        except mysql.connector.Error:
+            pass
+
+    def _columns_query(self, table: str) -> Tuple[str, Sequence]:
+        return ('''
+        SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ''', (table,))
+
+    def _index_query(self, table: str, name: str) -> Tuple[str, Sequence]:
+        return ('''
+        SELECT INDEX_NAME AS name FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+        ''', (table, name))
+
+
+def _adapt_datetime(value: datetime) -> str:
+    return value.isoformat(" ")
+
+
+def _convert_timestamp(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+
+
+class SQLiteDatabase(Database):
+    """Локальная замена MySQL на sqlite3 — для разработки и тестов без сервера"""
+
+    dialect = "sqlite"
+
+    _TRANSLATIONS = [
+        (re.compile(r"%s"), "?"),
+        (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+        (re.compile(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        (re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I), "ON CONFLICT DO UPDATE SET"),
+        (re.compile(r"\bVALUES\((\w+)\)", re.I), r"excluded.\1"),
+    ]
+
+    def __init__(self, path: str = ":memory:", pool_size: int = 5, query_timeout: float = 10.0):
+        super().__init__(pool_size=pool_size, query_timeout=query_timeout)
+        if path == ":memory:":
+            # Общая in-memory база для всех соединений пула; живёт, пока открыт _anchor
+            self._target = f"file:moderator-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._target = f"file:{path}"
+        self._anchor = self._connect()
+        self._idle = queue.LifoQueue()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self._target,
+            uri=True,
+            timeout=self.query_timeout,
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def translate(self, query: str) -> str:
+        for pattern, replacement in self._TRANSLATIONS:
+            query = pattern.sub(replacement, query)
+        return query
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _release(self, conn) -> None:
+        self._idle.put(conn)
+
+    def _reconnect(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        return self._connect()
+
+    def _is_connection_error(self, error: Exception) -> bool:
+        return isinstance(error, sqlite3.ProgrammingError) and "closed" in str(error)
+
+    def _columns_query(self, table: str) -> Tuple[str, Sequence]:
+        return f"SELECT name FROM pragma_table_info('{table}')", ()
+
+    def _index_query(self, table: str, name: str) -> Tuple[str, Sequence]:
+        return "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s", (table, name)
+
+    def _rows(self, cursor) -> List[Dict[str, Any]]:
+        if cursor.description is None:
+            return []
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def _fetch_chunk(self, cursor, size: int) -> List[Dict[str, Any]]:
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchmany(size)]
+
+    def _close_all(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._anchor.close()
+
+
+def create_database(settings: Dict[str, Any]) -> Database:
+    """Создаёт пул по настройкам из config.DATABASE"""
+    backend = (settings.get("backend") or "mysql").lower()
+    pool_size = int(settings.get("pool_size") or 5)
+    query_timeout = float(settings.get("query_timeout") or 10)
+
+    if backend == "sqlite":
+        return SQLiteDatabase(
+            path=settings.get("sqlite_path") or ":memory:",
+            pool_size=pool_size,
+            query_timeout=query_timeout
+        )
+    if backend == "mysql":
+        return MySQLDatabase(
+            host=settings["host"],
+            user=settings["user"],
+            password=settings["password"],
+            database=settings["database"],
+            pool_size=pool_size,
+            query_timeout=query_timeout
+        )
+    raise DatabaseError(f"Unknown database backend: {backend}")
@@ -0,0 +1,112 @@
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+# Выгружаемые таблицы: запрос с фильтром по серверу и столбец времени для периода
+EXPORT_TABLES = {
+    'punishments': ('''
+        SELECT p.id, p.guild_id, p.user_id, p.moderator_id, pt.name AS type, p.reason,
+               p.duration_seconds, p.created_at, p.expires_at, p.revoked, p.revoked_at,
+               p.revoked_by, p.revoked_reason
+        FROM punishments p
+        JOIN punishment_types pt ON p.punishment_type_id = pt.id
+        WHERE p.guild_id = %s
+    ''', 'p.created_at', 'p.id'),
+    'logs': ('''
+        SELECT id, guild_id, user_id, action_type, details, created_at
+        FROM logs
+        WHERE guild_id = %s
+    ''', 'created_at', 'id'),
+    'voice_activity': ('''
+        SELECT id, guild_id, user_id, channel_id, channel_name, join_time, leave_time, duration_seconds
+        FROM voice_activity
+        WHERE guild_id = %s
+    ''', 'join_time', 'id'),
+}
+
+
+def export_query(table: str, guild_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    query, time_column, id_column = EXPORT_TABLES[table]
+    params: List[Any] = [guild_id]
+    if since is not None:
+        query += f" AND {time_column} >= %s"
+        params.append(since)
+    if until is not None:
+        query += f" AND {time_column} < %s"
+        params.append(until)
+    return query + f" ORDER BY {id_column}", params
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+class ExportWriter:
+    """Потоковая запись строк в gzip-файлы CSV или JSONL.
+
+    Пачки строк дописываются по мере чтения из базы; когда сжатый файл
+    подходит к max_bytes, начинается следующая часть (в CSV — с заголовком).
+    Вызывается из потока пула базы, event loop не блокирует.
+    """
+
+    # Запас на то, что gzip ещё держит в буфере и допишет при закрытии
+    SAFETY_MARGIN = 256 * 1024
+
+    def __init__(self, directory: str, basename: str, fmt: str = 'csv', max_bytes: int = 25 * 1024 * 1024):
+        if fmt not in ('csv', 'jsonl'):
+            raise ValueError(f"Неизвестный формат: {fmt}")
+        self.directory = directory
+        self.basename = basename
+        self.fmt = fmt
+        self.limit = max(max_bytes - self.SAFETY_MARGIN, max_bytes // 2)
+        self.paths: List[str] = []
+        self.rows = 0
+        self._raw = None
+        self._gzip = None
+        self._text = None
+        self._csv = None
+        self._columns: Optional[List[str]] = None
+
+    def _open(self) -> None:
+        path = os.path.join(self.directory, f"{self.basename}-{len(self.paths) + 1:03d}.{self.fmt}.gz")
+        self.paths.append(path)
+        self._raw = open(path, 'wb')
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        self._text = io.TextIOWrapper(self._gzip, encoding='utf-8', newline='')
+        if self.fmt == 'csv':
+            self._csv = csv.writer(self._text)
+            if self._columns is not None:
+                self._csv.writerow(self._columns)
+
+    def _close_part(self) -> None:
+        if self._text is not None:
+            self._text.close()  # закрывает и gzip-поток
+            self._raw.close()
+            self._raw = self._gzip = self._text = self._csv = None
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if self._columns is None:
+            self._columns = list(rows[0].keys())
+        for row in rows:
+            if self._text is None or self._raw.tell() >= self.limit:
+                self._close_part()
+                self._open()
+            if self.fmt == 'csv':
+                self._csv.writerow([_plain(row[c]) for c in self._columns])
+            else:
+                self._text.write(json.dumps({k: _plain(v) for k, v in row.items()}, ensure_ascii=False) + "\n")
+            self.rows += 1
+
+    def close(self) -> List[str]:
+        self._close_part()
+        return self.paths
@@ -0,0 +1,112 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from Modules.Moderator.database import Database
+
+
+class KeysetPager:
+    """Постраничный обход по ключу (order_column, id_column) по убыванию.
+
+    Каждая страница — это один запрос с LIMIT page_size + 1 от последней
+    строки предыдущей страницы, поэтому стоимость не зависит от глубины.
+    Курсоры пройденных страниц хранятся для кнопки «назад».
+    """
+
+    def __init__(self, db: Database, select: str, where: str, params: Sequence, order_column: str, id_column: str, page_size: int = 5):
+        self.db = db
+        self.select = select
+        self.where = where
+        self.params = tuple(params)
+        self.order_column = order_column
+        self.id_column = id_column
+        self.page_size = page_size
+        self._cursors: List[Optional[Tuple[Any, int]]] = [None]
+        self.rows: List[Dict[str, Any]] = []
+        self.has_next = False
+
+    @property
+    def page_number(self) -> int:
+        return len(self._cursors)
+
+    @property
+    def has_prev(self) -> bool:
+        return len(self._cursors) > 1
+
+    async def _load(self) -> None:
+        cursor = self._cursors[-1]
+        where, params = self.where, self.params
+        if cursor is not None:
+            # Раскрытая форма (a, b) < (x, y): так оба диалекта используют индекс
+            where += f" AND ({self.order_column} < %s OR ({self.order_column} = %s AND {self.id_column} < %s))"
+            params += (cursor[0], cursor[0], cursor[1])
+        rows = await self.db.fetchall(f'''
+        {self.select}
+        WHERE {where}
+        ORDER BY {self.order_column} DESC, {self.id_column} DESC
+        LIMIT %s
+        ''', params + (self.page_size + 1,))
+        self.has_next = len(rows) > self.page_size
+        self.rows = rows[:self.page_size]
+
+    async def first(self) -> List[Dict[str, Any]]:
+        self._cursors = [None]
+        await self._load()
+        return self.rows
+
+    async def next(self) -> List[Dict[str, Any]]:
+        if self.has_next and self.rows:
+            last = self.rows[-1]
+            self._cursors.append((last['_order'], last['_id']))
+            await self._load()
+        return self.rows
+
+    async def prev(self) -> List[Dict[str, Any]]:
+        if self.has_prev:
+            self._cursors.pop()
+            await self._load()
+        return self.rows
+
+
+def punishments_pager(db: Database, guild_id: int, user_id: int, type_id: Optional[int] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      page_size: int = 5) -> KeysetPager:
+    where = "p.guild_id = %s AND p.user_id = %s"
+    params = [guild_id, user_id]
+    if type_id is not None:
+        where += " AND p.punishment_type_id = %s"
+        params.append(type_id)
+    if since is not None:
+        where += " AND p.created_at >= %s"
+        params.append(since)
+    if until is not None:
+        where += " AND p.created_at < %s"
+        params.append(until)
+    return KeysetPager(
+        db,
+        '''
+        SELECT p.id AS _id, p.created_at AS _order, pt.name, p.reason, p.expires_at, p.created_at
+        FROM punishments p
+        JOIN punishment_types pt ON p.punishment_type_id = pt.id
+        ''',
+        where, params, "p.created_at", "p.id", page_size
+    )
+
+
+def voice_pager(db: Database, guild_id: int, user_id: int, since: Optional[datetime] = None,
+                until: Optional[datetime] = None, page_size: int = 5) -> KeysetPager:
+    where = "guild_id = %s AND user_id = %s"
+    params = [guild_id, user_id]
+    if since is not None:
+        where += " AND join_time >= %s"
+        params.append(since)
+    if until is not None:
+        where += " AND join_time < %s"
+        params.append(until)
+    return KeysetPager(
+        db,
+        '''
+        SELECT id AS _id, join_time AS _order, channel_name, join_time, leave_time
+        FROM voice_activity
+        ''',
+        where, params, "join_time", "id", page_size
+    )
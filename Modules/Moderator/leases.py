@@ -0,0 +1,86 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from Modules.Moderator.database import Database
+
+
+def default_owner() -> str:
+    """Идентификатор реплики: хост, pid и случайный хвост на случай перезапуска"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"[:64]
+
+
+class ExpiryLeases:
+    """Аренда истёкших наказаний между репликами бота.
+
+    Реплика захватывает строки атомарным UPDATE по lease_owner/lease_until,
+    обрабатывает только то, что досталось ей, и снимает наказание тем же
+    условием. Если реплика упала, аренда истекает через ttl и строки
+    подхватывает другая.
+    """
+
+    def __init__(self, db: Database, owner: Optional[str] = None, ttl: float = 60.0):
+        self.db = db
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+
+    @staticmethod
+    def _placeholders(ids: List[int]) -> str:
+        return ", ".join(["%s"] * len(ids))
+
+    async def claim(self, ids: List[int], now: Optional[datetime] = None) -> Set[int]:
+        """Захватывает свободные (или уже свои) строки и возвращает их id"""
+        if not ids:
+            return set()
+        now = now or datetime.utcnow()
+        async with self.db.transaction() as cursor:
+            await cursor.execute(f'''
+            UPDATE punishments
+            SET lease_owner = %s, lease_until = %s
+            WHERE id IN ({self._placeholders(ids)})
+            AND revoked = FALSE
+            AND (lease_until IS NULL OR lease_until < %s OR lease_owner = %s)
+            ''', (self.owner, now + timedelta(seconds=self.ttl), *ids, now, self.owner))
+            rows = await cursor.fetchall(f'''
+            SELECT id FROM punishments
+            WHERE id IN ({self._placeholders(ids)}) AND lease_owner = %s AND revoked = FALSE
+            ''', (*ids, self.owner))
+        return {row['id'] for row in rows}
+
+    async def revoke(self, ids: List[int], revoked_by: int, now: datetime) -> Set[int]:
+        """Снимает наказания, которые всё ещё арендованы этой репликой.
+
+        Возвращает id, которые сняла именно эта реплика: если аренда успела
+        истечь и строку забрала другая, запись в мод-лог — её дело.
+        """
+        if not ids:
+            return set()
+        async with self.db.transaction() as cursor:
+            # lease_owner пока остаётся меткой: по нему видно, какие строки обновил этот вызов
+            await cursor.execute(f'''
+            UPDATE punishments
+            SET revoked = TRUE, revoked_at = %s, revoked_by = %s, lease_until = NULL
+            WHERE id IN ({self._placeholders(ids)}) AND revoked = FALSE AND lease_owner = %s
+            ''', (now, revoked_by, *ids, self.owner))
+            rows = await cursor.fetchall(f'''
+            SELECT id FROM punishments
+            WHERE id IN ({self._placeholders(ids)}) AND revoked = TRUE AND lease_owner = %s
+            ''', (*ids, self.owner))
+            revoked = [row['id'] for row in rows]
+            if revoked:
+                await cursor.execute(f'''
+                UPDATE punishments SET lease_owner = NULL WHERE id IN ({self._placeholders(revoked)})
+                ''', revoked)
+        return set(revoked)
+
+    async def release(self, ids: List[int]) -> None:
+        """Отдаёт аренду досрочно (например, при остановке реплики)"""
+        if not ids:
+            return
+        await self.db.execute(f'''
+        UPDATE punishments
+        SET lease_owner = NULL, lease_until = NULL
+        WHERE id IN ({self._placeholders(ids)}) AND lease_owner = %s AND revoked = FALSE
+        ''', (*ids, self.owner))
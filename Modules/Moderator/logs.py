@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import discord
+
+from Modules.Moderator.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class ModLogQueue:
+    """Асинхронная очередь мод-логов.
+
+    Записи копятся в течение короткого окна, после чего строки logs
+    вставляются одним INSERT, а эмбеды уходят в mod-logs пачками по 10
+    на сообщение. Ограниченный размер очереди даёт обратное давление.
+    """
+
+    EMBEDS_PER_MESSAGE = 10
+
+    def __init__(self, db: Database, max_size: int = 1000, batch_size: int = 100, window: float = 1.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.window = window
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, guild_id: Optional[int], user_id: Optional[int], action_type: Optional[str], details: Optional[str],
+                  created_at, channel: Optional[discord.abc.Messageable] = None, embed: Optional[discord.Embed] = None) -> None:
+        """Ставит запись в очередь; ждёт только если очередь переполнена"""
+        await self._queue.put({
+            'guild_id': guild_id,
+            'user_id': user_id,
+            'action_type': action_type,
+            'details': details,
+            'created_at': created_at,
+            'channel': channel,
+            'embed': embed
+        })
+
+    async def _collect(self) -> List[dict]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @staticmethod
+    def _values(entry: dict) -> tuple:
+        return entry['guild_id'], entry['user_id'], entry['action_type'], entry['details'], entry['created_at']
+
+    async def _insert(self, rows: List[dict]) -> None:
+        try:
+            await self.db.execute(f'''
+            INSERT INTO logs (guild_id, user_id, action_type, details, created_at)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))}
+            ''', [v for e in rows for v in self._values(e)])
+            return
+        except Exception as e:
+            if len(rows) == 1:
+                logger.error("Запись мод-лога отброшена (%s): %s", e, rows[0]['action_type'])
+                return
+            logger.warning("Пачка мод-логов из %d строк не записалась (%s), пишем по одной", len(rows), e)
+        # Одна плохая строка (FK на users, неверное значение) не должна уносить всю пачку
+        for row in rows:
+            await self._insert([row])
+
+    async def _write(self, batch: List[dict]) -> None:
+        rows = [e for e in batch if e['action_type']]
+        if rows:
+            await self._insert(rows)
+
+        by_channel: Dict[int, list] = {}
+        for entry in batch:
+            if entry['channel'] is not None and entry['embed'] is not None:
+                by_channel.setdefault(entry['channel'].id, [entry['channel'], []])[1].append(entry['embed'])
+
+        for channel, embeds in by_channel.values():
+            for i in range(0, len(embeds), self.EMBEDS_PER_MESSAGE):
+                try:
+                    await channel.send(embeds=embeds[i:i + self.EMBEDS_PER_MESSAGE])
+                except Exception as e:
+                    logger.error("Ошибка при отправке мод-лога: %s", e)
+
+    async def run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def close(self, timeout: Optional[float] = 30.0) -> None:
+        """Дожидается отправки всего, что уже в очереди, но не дольше timeout.
+
+        Упавший обработчик очередь уже не разберёт: ждать его нельзя,
+        его исключение пробрасывается, а о потерянных записях пишется в лог.
+        """
+        task, self._task = self._task, None
+        if task is None:
+            return
+        if not task.done():
+            joined = asyncio.ensure_future(self._queue.join())
+            await asyncio.wait({joined, task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not joined.done():
+                joined.cancel()
+                logger.error("Мод-логи не записаны при остановке: %d в очереди", self._queue.qsize())
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return
+        elif self._queue.qsize():
+            logger.error("Мод-логи не записаны при остановке: %d в очереди", self._queue.qsize())
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
@@ -1,253 +1,578 @@
 import discord
 from discord.ext import bridge, tasks
 from datetime import datetime, timedelta
-import mysql.connector
+import asyncio
 import re
 import os
-from config import DATABASE
-from typing import Optional, Union
+import io
+import gzip
+import json
+import shutil
+import tempfile
+import time
+from config import DATABASE, MODERATOR, SETTINGS
+from typing import List, Optional, Tuple, Union
+from Modules.Moderator.database import create_database
+from Modules.Moderator.cache import LRUCache
+from Modules.Moderator.scheduler import ExpiryScheduler
+from Modules.Moderator.leases import ExpiryLeases
+from Modules.Moderator.voice import VoiceActivityBuffer
+from Modules.Moderator.rollup import VoiceRollup
+from Modules.Moderator.archive import ARCHIVE_TABLES, RetentionArchiver
+from Modules.Moderator.schema import create_schema
+from Modules.Moderator.search import search_pager
+from Modules.Moderator.export import EXPORT_TABLES, ExportWriter, export_query
+from Modules.Moderator.logs import ModLogQueue
+from Modules.Moderator.resolver import GuildResolver
+from Modules.Moderator.rollout import PermissionRollout
+from Modules.Moderator.history import punishments_pager, voice_pager
+from Modules.Moderator.raid import RaidDetector
+from Modules.Moderator.active import ActivePunishments, PUNISHMENT_ROLES, REVOKING_ACTIONS, revoke_punishments
+from Modules.Moderator.automod import AutoModFilter, MessageRateTracker
+from Modules.Moderator.bulk import BULK_ACTIONS, BULK_PERMISSIONS, BulkRunner, parse_user_ids, recent_joins, insert_bulk_punishments
 
 class Moderator(bridge.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = self.setup_db()
-        self.initialize_db()
-        self.check_temp_punishments.start()
-        self.voice_cache = {}
+        self.db_ready = asyncio.Event()
+        self._background = set()
+        self.punishment_types = {}
+        self.user_cache = LRUCache(MODERATOR["user_cache_size"])
+        self.voice_rollup = VoiceRollup(self.db)
+        self.voice_cache = VoiceActivityBuffer(
+            self.db,
+            flush_size=MODERATOR["voice_flush_size"],
+            flush_interval=MODERATOR["voice_flush_interval"],
+            rollup=self.voice_rollup
+        )
+        self.resolver = GuildResolver()
+        self.permission_rollout = PermissionRollout(
+            concurrency=MODERATOR["rollout_concurrency"],
+            rate=MODERATOR["rollout_rate"],
+            progress=self.report_rollout,
+            db=self.db
+        )
+        self.raid_detector = RaidDetector(
+            join_window=MODERATOR["raid_join_window"],
+            join_threshold=MODERATOR["raid_join_threshold"],
+            cluster_window=MODERATOR["raid_cluster_window"],
+            cluster_threshold=MODERATOR["raid_cluster_threshold"],
+            account_age=MODERATOR["raid_account_age"],
+            buffer_size=MODERATOR["raid_buffer_size"],
+            cooldown=MODERATOR["raid_cooldown"]
+        )
+        self.automod_filter = AutoModFilter.from_file(MODERATOR["automod_rules"])
+        if MODERATOR["automod_enabled"] and self.automod_filter is None:
+            print(f"Автомодерация включена, но файла правил {MODERATOR['automod_rules']} нет — она не работает")
+        self.message_tracker = MessageRateTracker(
+            spam_count=MODERATOR["automod_spam_count"],
+            spam_window=MODERATOR["automod_spam_window"],
+            duplicate_count=MODERATOR["automod_duplicate_count"],
+            duplicate_window=MODERATOR["automod_duplicate_window"],
+            strike_window=MODERATOR["automod_strike_window"],
+            strike_limit=MODERATOR["automod_mute_after"],
+            capacity=MODERATOR["user_cache_size"]
+        )
+        self.bulk_runner = BulkRunner(
+            concurrency=MODERATOR["bulk_concurrency"],
+            rate=MODERATOR["bulk_rate"]
+        )
+        self.active_punishments = ActivePunishments()
+        self.expiry_scheduler = ExpiryScheduler(self.expire_punishments)
+        self.expiry_leases = ExpiryLeases(
+            self.db,
+            owner=MODERATOR["replica_id"],
+            ttl=MODERATOR["expiry_lease_seconds"]
+        )
+        self.sweep_expiry_leases.change_interval(seconds=MODERATOR["expiry_sweep_interval"])
+        self.archiver = RetentionArchiver(
+            self.db,
+            MODERATOR["archive_dir"],
+            {'logs': MODERATOR["retention_logs_days"], 'voice_activity': MODERATOR["retention_voice_days"]},
+            chunk_size=MODERATOR["archive_chunk_size"],
+            prune_batch=MODERATOR["archive_prune_batch"]
+        )
+        self.archive_old_rows.change_interval(seconds=MODERATOR["archive_interval"])
+        self.mod_logs = ModLogQueue(
+            self.db,
+            max_size=MODERATOR["log_queue_size"],
+            window=MODERATOR["log_batch_window"]
+        )
+        self.bot.loop.create_task(self.startup())
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Фоновая задача, на которую держится ссылка до завершения"""
+        task = self.bot.loop.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
 
     def setup_db(self):
-        conn = mysql.connector.connect(
-            host=DATABASE["host"],
-            user=DATABASE["user"],
-            password=DATABASE["password"],
-            database=DATABASE["name"]
-        )
-        return conn
+        """Создание асинхронного пула соединений"""
+        return create_database(DATABASE)
+
+    def cog_unload(self):
+        self.expiry_scheduler.stop()
+        self.sweep_expiry_leases.cancel()
+        self.archive_old_rows.cancel()
+        self.permission_rollout.cancel_all()
+        self.bot.loop.create_task(self.shutdown())
+
+    async def shutdown(self):
+        """Сброс буферов и закрытие пула"""
+        try:
+            await self.voice_cache.close()
+        except Exception as e:
+            print(f"Ошибка при сохранении голосовой активности: {e}")
+        try:
+            await self.mod_logs.close()
+        except Exception as e:
+            print(f"Ошибка в очереди мод-логов: {e}")
+        await self.db.close()
+
+    async def startup(self):
+        try:
+            await self.initialize_db()
+            self.mod_logs.start()
+            await self.bot.wait_until_ready()
+            await self.reconcile_voice_sessions()
+            self.voice_cache.start()
+            await self.load_expiry_schedule()
+            await self.load_active_punishments()
+            self.sweep_expiry_leases.start()
+            self.archive_old_rows.start()
+            await self.resume_permission_rollouts()
+        except Exception as e:
+            print(f"Ошибка при запуске модуля модерации: {e}")
     
-    def initialize_db(self):
-        cursor = self.db.cursor(dictionary=True)
-        
-        # Улучшенная структура базы данных для MySQL
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id BIGINT PRIMARY KEY,
-            username VARCHAR(32) NOT NULL,
-            discriminator VARCHAR(4),
-            avatar_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS punishment_types (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(32) UNIQUE NOT NULL,
-            is_temporary BOOLEAN DEFAULT FALSE
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS punishments (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id BIGINT NOT NULL,
-            moderator_id BIGINT NOT NULL,
-            punishment_type_id INT NOT NULL,
-            reason TEXT,
-            duration_seconds INT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP NULL,
-            revoked BOOLEAN DEFAULT FALSE,
-            revoked_at TIMESTAMP NULL,
-            revoked_by BIGINT,
-            revoked_reason TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(user_id),
-            FOREIGN KEY(punishment_type_id) REFERENCES punishment_types(id),
-            FOREIGN KEY(moderator_id) REFERENCES users(user_id),
-            FOREIGN KEY(revoked_by) REFERENCES users(user_id)
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS voice_activity (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id BIGINT NOT NULL,
-            channel_id BIGINT NOT NULL,
-            channel_name VARCHAR(100),
-            join_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            leave_time TIMESTAMP NULL,
-            duration_seconds INT,
-            FOREIGN KEY(user_id) REFERENCES users(user_id)
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS logs (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id BIGINT,
-            action_type VARCHAR(50) NOT NULL,
-            details TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(user_id)
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_punishments_user ON punishments(user_id)
-        ''')
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_punishments_expires ON punishments(expires_at)
-        ''')
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_voice_activity_user ON voice_activity(user_id)
-        ''')
-        
-        punishment_types = [
-            ('kick', False),
-            ('ban', False),
-            ('temp_ban', True),
-            ('mute', False),
-            ('temp_mute', True),
-            ('voice_mute', False),
-            ('temp_voice_mute', True),
-            ('warn', False)
-        ]
+    async def initialize_db(self):
+        async with self.db.transaction() as cursor:
+            await create_schema(cursor)
+        await self.load_punishment_types()
+        self.db_ready.set()
+
+    async def load_expiry_schedule(self, guild_ids: Optional[list] = None):
+        """Загрузка активных временных наказаний своих серверов в планировщик"""
+        await self.bot.wait_until_ready()
+        # revoked_by ссылается на users, поэтому бот должен там быть
+        await self.update_user_data(self.bot.user)
         
-        cursor.executemany('''
-        INSERT IGNORE INTO punishment_types (name, is_temporary) 
-        VALUES (%s, %s)
-        ''', punishment_types)
+        # Каждый шард (процесс) видит и обрабатывает только свои серверы
+        if guild_ids is None:
+            guild_ids = [guild.id for guild in self.bot.guilds]
+        for i in range(0, len(guild_ids), 500):
+            chunk = guild_ids[i:i + 500]
+            punishments = await self.db.fetchall(f'''
+            SELECT p.id, p.guild_id, p.user_id, pt.name, p.expires_at 
+            FROM punishments p
+            JOIN punishment_types pt ON p.punishment_type_id = pt.id
+            WHERE p.guild_id IN ({", ".join(["%s"] * len(chunk))})
+            AND p.revoked = FALSE 
+            AND p.expires_at IS NOT NULL
+            ''', chunk)
+            for punishment in punishments:
+                self.expiry_scheduler.schedule(punishment['id'], punishment['expires_at'], punishment)
         
-        self.db.commit()
+        self.expiry_scheduler.start()
 
-    @tasks.loop(minutes=1)
-    async def check_temp_punishments(self):
-        cursor = self.db.cursor(dictionary=True)
+    async def load_active_punishments(self, guild_ids: Optional[list] = None):
+        """Индекс действующих мутов своих серверов и возврат ролей тем, кто зашёл без бота"""
+        if guild_ids is None:
+            guild_ids = [guild.id for guild in self.bot.guilds]
+        names = list(PUNISHMENT_ROLES)
         now = datetime.utcnow()
+        for i in range(0, len(guild_ids), 500):
+            chunk = guild_ids[i:i + 500]
+            punishments = await self.db.fetchall(f'''
+            SELECT p.id, p.guild_id, p.user_id, pt.name, p.expires_at 
+            FROM punishments p
+            JOIN punishment_types pt ON p.punishment_type_id = pt.id
+            WHERE p.guild_id IN ({", ".join(["%s"] * len(chunk))})
+            AND p.revoked = FALSE 
+            AND pt.name IN ({", ".join(["%s"] * len(names))})
+            AND (p.expires_at IS NULL OR p.expires_at > %s)
+            ''', (*chunk, *names, now))
+            for punishment in punishments:
+                self.active_punishments.add(
+                    punishment['id'], punishment['guild_id'], punishment['user_id'],
+                    punishment['name'], punishment['expires_at']
+                )
         
-        cursor.execute('''
-        SELECT p.id, p.user_id, pt.name, p.expires_at 
-        FROM punishments p
-        JOIN punishment_types pt ON p.punishment_type_id = pt.id
-        WHERE p.revoked = FALSE 
-        AND p.expires_at IS NOT NULL 
-        AND p.expires_at <= %s
-        ''', (now,))
-        
-        for punishment in cursor.fetchall():
-            guild = self.bot.guilds[0] if self.bot.guilds else None
+        for guild_id in guild_ids:
+            guild = self.bot.get_guild(guild_id)
             if not guild:
                 continue
-                
+            for member in guild.members:
+                role_names = self.active_punishments.roles_for(guild.id, member.id, now)
+                if role_names:
+                    self.spawn(self.restore_punishment_roles(member, role_names))
+
+    async def restore_punishment_roles(self, member, role_names):
+        """Возвращает роли действующих наказаний (после выхода и повторного входа)"""
+        try:
+            roles = [await self.get_or_create_role(member.guild, role_name) for role_name in sorted(role_names)]
+            missing = [role for role in roles if role not in member.roles]
+            if not missing:
+                return
+            await member.add_roles(*missing, reason="Действующее наказание")
+        except (discord.Forbidden, discord.NotFound):
+            return
+        except discord.HTTPException as e:
+            print(f"Ошибка при возврате ролей наказания {member.id}: {e}")
+            return
+        
+        await self.log_action(
+            user_id=member.id,
+            action_type="Возврат наказания",
+            details=f"Роли: {', '.join(role.name for role in missing)}",
+            guild=member.guild
+        )
+
+    @tasks.loop(seconds=60)
+    async def sweep_expiry_leases(self):
+        """Подхват наказаний, созданных другими репликами или брошенных упавшей"""
+        now = datetime.utcnow()
+        horizon = now + timedelta(seconds=self.sweep_expiry_leases.seconds)
+        guild_ids = [guild.id for guild in self.bot.guilds]
+        for i in range(0, len(guild_ids), 500):
+            chunk = guild_ids[i:i + 500]
+            punishments = await self.db.fetchall(f'''
+            SELECT p.id, p.guild_id, p.user_id, pt.name, p.expires_at 
+            FROM punishments p
+            JOIN punishment_types pt ON p.punishment_type_id = pt.id
+            WHERE p.guild_id IN ({", ".join(["%s"] * len(chunk))})
+            AND p.revoked = FALSE 
+            AND p.expires_at IS NOT NULL
+            AND p.expires_at <= %s
+            AND (p.lease_until IS NULL OR p.lease_until < %s)
+            ''', (*chunk, horizon, now))
+            for punishment in punishments:
+                if punishment['id'] not in self.expiry_scheduler:
+                    self.expiry_scheduler.schedule(punishment['id'], punishment['expires_at'], punishment)
+
+    @sweep_expiry_leases.before_loop
+    async def before_sweep_expiry_leases(self):
+        await self.db_ready.wait()
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=3600)
+    async def archive_old_rows(self):
+        """Перенос строк logs и voice_activity старше срока хранения в архив"""
+        guild_ids = [guild.id for guild in self.bot.guilds]
+        # Записи без сервера архивирует один процесс — тот, у кого нулевой шард
+        if not SETTINGS["SHARDED"] or 0 in getattr(self.bot, 'shards', {}):
+            guild_ids.append(None)
+        try:
+            archived = await self.archiver.run_once(guild_ids)
+        except Exception as e:
+            print(f"Ошибка при архивации: {e}")
+            return
+        if any(archived.values()):
+            print(f"Архивировано строк: {archived}")
+
+    @archive_old_rows.before_loop
+    async def before_archive_old_rows(self):
+        await self.db_ready.wait()
+        await self.bot.wait_until_ready()
+
+    async def expire_punishments(self, punishments: list):
+        """Снятие пачки наказаний, истёкших в одну секунду"""
+        now = datetime.utcnow()
+        
+        # Несколько реплик: обрабатываем только то, что удалось арендовать
+        claimed = await self.expiry_leases.claim([p['id'] for p in punishments], now)
+        
+        expired = []
+        for punishment in punishments:
+            if punishment['id'] not in claimed:
+                continue
+            
+            guild = self.bot.get_guild(punishment['guild_id'])
+            if not guild:
+                # Бота убрали с сервера — снимать нечего, запись остаётся как есть
+                continue
+            
             user = guild.get_member(punishment['user_id'])
             action = None
             
             try:
                 if punishment['name'] == 'temp_ban':
-                    await guild.unban(discord.Object(id=punishment['user_id']))
+                    try:
+                        await guild.unban(discord.Object(id=punishment['user_id']))
+                    except discord.NotFound:
+                        pass  # уже разбанен (например, повтор после сбоя реплики)
                     action = "автоматический разбан"
                 elif punishment['name'] in ['temp_mute', 'temp_voice_mute']:
                     role_name = "Muted" if punishment['name'] == 'temp_mute' else "Voice Muted"
-                    role = discord.utils.get(guild.roles, name=role_name)
+                    role = self.resolver.role(guild, role_name)
                     if role and user and role in user.roles:
                         await user.remove_roles(role)
                     action = f"автоматический размут ({'чат' if punishment['name'] == 'temp_mute' else 'голос'})"
                 
-                cursor.execute('''
-                UPDATE punishments 
-                SET revoked = TRUE, revoked_at = %s, revoked_by = %s
-                WHERE id = %s
-                ''', (now, self.bot.user.id, punishment['id']))
-                
-                if action:
-                    await self.log_action(
-                        user_id=punishment['user_id'],
-                        action_type="Автоснятие наказания",
-                        details=f"Тип: {punishment['name']}\nПричина: истек срок наказания"
-                    )
-                    
-                    if guild:
-                        log_channel = discord.utils.get(guild.channels, name="mod-logs")
-                        if log_channel and user:
-                            embed = discord.Embed(
-                                title=action.capitalize(),
-                                description=f"Пользователю {user.mention} снято наказание",
-                                color=discord.Color.green(),
-                                timestamp=now
-                            )
-                            embed.add_field(name="Тип наказания", value=punishment['name'])
-                            embed.add_field(name="Было назначено до", value=punishment['expires_at'])
-                            await log_channel.send(embed=embed)
-            
+                expired.append((punishment, guild, user, action))
             except Exception as e:
                 print(f"Ошибка при автоматическом снятии наказания: {e}")
+                # Повторная попытка через минуту, как раньше делал опрос
+                self.expiry_scheduler.schedule(punishment['id'], now + timedelta(minutes=1), punishment)
+        
+        if not expired:
+            return
+        
+        revoked = await self.expiry_leases.revoke(
+            [punishment['id'] for punishment, _, _, _ in expired], self.bot.user.id, now
+        )
+        for punishment, _, _, _ in expired:
+            self.active_punishments.discard(punishment['id'])
+        
+        for punishment, guild, user, action in expired:
+            # Аренда истекла посреди пачки: строку сняла другая реплика, она и пишет в лог
+            if not action or punishment['id'] not in revoked:
                 continue
+            
+            mention = user.mention if user else f"<@{punishment['user_id']}>"
+            embed = discord.Embed(
+                title=action.capitalize(),
+                description=f"Пользователю {mention} снято наказание",
+                color=discord.Color.green(),
+                timestamp=now
+            )
+            embed.add_field(name="Тип наказания", value=punishment['name'])
+            embed.add_field(name="Было назначено до", value=punishment['expires_at'])
+            
+            await self.log_action(
+                user_id=punishment['user_id'],
+                action_type="Автоснятие наказания",
+                details=f"Тип: {punishment['name']}\nПричина: истек срок наказания",
+                guild=guild,
+                embed=embed
+            )
+
+    @bridge.Cog.listener()
+    async def on_guild_join(self, guild):
+        if self.db_ready.is_set():
+            await self.load_expiry_schedule([guild.id])
+            await self.load_active_punishments([guild.id])
+
+    @bridge.Cog.listener()
+    async def on_member_join(self, member):
+        if member.bot:
+            return
+        guild = member.guild
+        # Перезаход не снимает мут: роли возвращаются из индекса без запроса в базу
+        role_names = self.active_punishments.roles_for(guild.id, member.id, datetime.utcnow())
+        if role_names:
+            self.spawn(self.restore_punishment_roles(member, role_names))
+        
+        now = discord.utils.utcnow()
+        signal = self.raid_detector.observe(
+            guild.id, member.id, member.name, member.avatar is not None, member.created_at, now
+        )
+        
+        if signal:
+            self.spawn(self.report_raid(guild, signal))
+        if MODERATOR["raid_action"] != "mute":
+            return
+        
+        if signal:
+            targets = signal.member_ids
+        elif self.raid_detector.in_raid(guild.id, now) and self.raid_detector.is_new_account(member.created_at, now):
+            targets = [member.id]
+        else:
+            return
+        
+        for user_id in targets:
+            target = guild.get_member(user_id)
+            if target:
+                self.spawn(self.auto_punish(
+                    target, 'temp_mute', "Автоматически: подозрение на рейд", MODERATOR["raid_mute_duration"]
+                ))
+
+    async def report_raid(self, guild, signal):
+        """Оповещение в mod-logs о начале рейда"""
+        if signal.kind == 'spike':
+            description = (
+                f"{signal.count} заходов за {MODERATOR['raid_join_window']} сек."
+            )
+        else:
+            feature = "похожие ники" if signal.key[0] == 'name' else "аккаунты созданы в один час"
+            description = f"{signal.count} новых аккаунтов: {feature}"
+        
+        embed = discord.Embed(
+            title="Подозрение на рейд",
+            description=description,
+            color=discord.Color.dark_red(),
+            timestamp=datetime.utcnow()
+        )
+        if signal.member_ids:
+            embed.add_field(name="Новые аккаунты", value=self._format_ids(signal.member_ids), inline=False)
+        embed.add_field(
+            name="Реакция",
+            value="Временный мут новых аккаунтов" if MODERATOR["raid_action"] == "mute" else "Только оповещение",
+            inline=False
+        )
+        await self.log_action(
+            user_id=self.bot.user.id,
+            action_type="Подозрение на рейд",
+            details=f"{description}\nID: {', '.join(map(str, signal.member_ids)) or '-'}",
+            guild=guild,
+            embed=embed
+        )
+
+    @bridge.Cog.listener()
+    async def on_message(self, message):
+        if not MODERATOR["automod_enabled"] or self.automod_filter is None or message.author.bot or not message.guild:
+            return
+        if not isinstance(message.author, discord.Member) or message.author.guild_permissions.manage_messages:
+            return
+        
+        key = (message.guild.id, message.author.id)
+        now = time.monotonic()
+        violation = self.automod_filter.match(message.content)
+        kind = violation[0] if violation else self.message_tracker.observe(key, message.content, now)
+        if kind:
+            strikes = self.message_tracker.strike(key, now)
+            self.spawn(self.handle_automod(message, kind, violation[1] if violation else None, strikes))
+
+    async def handle_automod(self, message, kind, fragment, strikes):
+        """Удаление сообщения и эскалация: предупреждения, затем временный мут"""
+        reasons = {
+            'word': "запрещённое слово",
+            'invite': "приглашение на другой сервер",
+            'link': "запрещённая ссылка",
+            'spam': "флуд",
+            'duplicate': "повтор сообщений"
+        }
+        reason = f"Автомодерация: {reasons[kind]}"
+        try:
+            await message.delete()
+        except (discord.Forbidden, discord.NotFound):
+            pass
+        except discord.HTTPException as e:
+            print(f"Ошибка при удалении сообщения {message.id}: {e}")
         
-        self.db.commit()
+        if strikes >= MODERATOR["automod_mute_after"]:
+            await self.auto_punish(message.author, 'temp_mute', reason, MODERATOR["automod_mute_duration"])
+        else:
+            await self.auto_punish(message.author, 'warn', f"{reason} ({strikes}/{MODERATOR['automod_mute_after']})")
 
     @bridge.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
         if before.channel != after.channel:
-            cursor = self.db.cursor()
             now = datetime.utcnow()
             
-            try:
-                if before.channel:
-                    cursor.execute('''
-                    UPDATE voice_activity 
-                    SET leave_time = %s, duration_seconds = TIMESTAMPDIFF(SECOND, join_time, %s)
-                    WHERE user_id = %s AND leave_time IS NULL
-                    ''', (now, now, member.id))
-                
-                if after.channel:
-                    cursor.execute('''
-                    INSERT INTO voice_activity 
-                    (user_id, channel_id, channel_name, join_time)
-                    VALUES (%s, %s, %s, %s)
-                    ''', (
-                        member.id,
-                        after.channel.id,
-                        after.channel.name,
-                        now
-                    ))
-                
-                self.db.commit()
-            except Exception as e:
-                print(f"Ошибка при обновлении голосовой активности: {e}")
+            if before.channel:
+                self.voice_cache.leave(member.guild.id, member.id, now)
+            if after.channel:
+                self.voice_cache.join(member.guild.id, member.id, member.name, after.channel.id, after.channel.name, now)
 
-    async def log_action(self, user_id: int, action_type: str, details: str, guild: Optional[discord.Guild] = None):
-        """Улучшенный метод логирования"""
-        cursor = self.db.cursor()
-        now = datetime.utcnow()
+    @bridge.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        self.resolver.channel_created(channel)
+
+    @bridge.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.resolver.channel_deleted(channel)
+
+    @bridge.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if before.name != after.name:
+            self.resolver.channel_created(after)
+
+    @bridge.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.resolver.role_created(role)
+
+    @bridge.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.resolver.role_deleted(role)
+
+    @bridge.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        if before.name != after.name:
+            self.resolver.role_created(after)
+
+    @bridge.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.resolver.forget_guild(guild.id)
+        self.raid_detector.forget_guild(guild.id)
+        self.active_punishments.forget_guild(guild.id)
+
+    @bridge.Cog.listener()
+    async def on_ready(self):
+        # Первый on_ready приходит до загрузки модуля, его обрабатывает startup()
+        if self.db_ready.is_set():
+            await self.reconcile_voice_sessions()
+
+    @bridge.Cog.listener()
+    async def on_disconnect(self):
+        # Момент разрыва — верхняя граница для сессий, закрывшихся без событий
+        self.voice_cache.disconnected(datetime.utcnow())
+
+    @bridge.Cog.listener()
+    async def on_resumed(self):
+        self.voice_cache.resumed()
+
+    async def reconcile_voice_sessions(self):
+        """Сверка открытых сессий в базе с guild.voice_states"""
+        voice_states = {}
+        for guild in self.bot.guilds:
+            for user_id, state in guild.voice_states.items():
+                if state.channel:
+                    member = guild.get_member(user_id)
+                    voice_states[(guild.id, user_id)] = (
+                        member.name if member else str(user_id),
+                        state.channel.id,
+                        state.channel.name
+                    )
         
         try:
-            cursor.execute('''
-            INSERT INTO logs (user_id, action_type, details, created_at)
-            VALUES (%s, %s, %s, %s)
-            ''', (user_id, action_type, details, now))
-            
-            if guild:
-                log_channel = discord.utils.get(guild.channels, name="mod-logs")
-                if log_channel:
-                    user = guild.get_member(user_id)
-                    embed = discord.Embed(
-                        title=f"Лог: {action_type}",
-                        description=f"**Пользователь:** {user.mention if user else user_id}",
-                        color=discord.Color.blue(),
-                        timestamp=now
-                    )
-                    embed.add_field(name="Детали", value=details, inline=False)
-                    await log_channel.send(embed=embed)
-            
-            self.db.commit()
+            stale, opened = await self.voice_cache.reconcile(
+                [guild.id for guild in self.bot.guilds], voice_states, datetime.utcnow()
+            )
+            print(f"Голосовые сессии сверены: закрыто {stale}, открыто {opened}")
         except Exception as e:
-            print(f"Ошибка при логировании: {e}")
+            print(f"Ошибка при сверке голосовых сессий: {e}")
+
+    async def log_action(
+        self,
+        user_id: int,
+        action_type: str,
+        details: str,
+        guild: Optional[discord.Guild] = None,
+        embed: Optional[discord.Embed] = None
+    ):
+        """Постановка записи в очередь мод-логов (запись и отправка идут пачками)"""
+        now = datetime.utcnow()
+        log_channel = None
+        
+        if guild:
+            log_channel = self.resolver.channel(guild, "mod-logs")
+            if log_channel and embed is None:
+                user = guild.get_member(user_id)
+                embed = discord.Embed(
+                    title=f"Лог: {action_type}",
+                    description=f"**Пользователь:** {user.mention if user else user_id}",
+                    color=discord.Color.blue(),
+                    timestamp=now
+                )
+                embed.add_field(name="Детали", value=details, inline=False)
+        
+        await self.mod_logs.put(
+            guild.id if guild else None, user_id, action_type, details, now,
+            channel=log_channel, embed=embed
+        )
 
     async def update_user_data(self, user: discord.User):
         """Обновление данных пользователя с обработкой ошибок"""
-        cursor = self.db.cursor()
+        avatar_url = str(user.avatar.url) if user.avatar else None
+        # Слепок профиля: upsert уходит в базу, только если что-то поменялось
+        fingerprint = (user.name, user.discriminator, user.avatar.key if user.avatar else None)
+        if self.user_cache.get(user.id) == fingerprint:
+            return
         
         try:
-            cursor.execute('''
+            await self.db.execute('''
             INSERT INTO users 
             (user_id, username, discriminator, avatar_url, created_at)
             VALUES (%s, %s, %s, %s, %s)
@@ -259,19 +584,22 @@ class Moderator(bridge.Cog):
                 user.id,
                 user.name,
                 user.discriminator,
-                str(user.avatar.url) if user.avatar else None,
+                avatar_url,
                 user.created_at
             ))
-            self.db.commit()
+            self.user_cache.put(user.id, fingerprint)
         except Exception as e:
             print(f"Ошибка при обновлении данных пользователя: {e}")
 
+    async def load_punishment_types(self):
+        """Справочник типов наказаний загружается в память один раз"""
+        rows = await self.db.fetchall('SELECT id, name, is_temporary FROM punishment_types')
+        self.punishment_types = {row['name']: row for row in rows}
+
     async def get_punishment_type_id(self, name: str) -> Optional[int]:
         """Получение ID типа наказания"""
-        cursor = self.db.cursor(dictionary=True)
-        cursor.execute('SELECT id FROM punishment_types WHERE name = %s', (name,))
-        result = cursor.fetchone()
-        return result['id'] if result else None
+        punishment_type = self.punishment_types.get(name)
+        return punishment_type['id'] if punishment_type else None
 
     async def apply_punishment(
         self,
@@ -289,56 +617,255 @@ class Moderator(bridge.Cog):
             if not guild:
                 raise ValueError("Действие должно выполняться на сервере")
             
-            await self.update_user_data(user)
-            await self.update_user_data(moderator)
-            
-            punishment_type_id = await self.get_punishment_type_id(action_type.lower())
-            if not punishment_type_id:
-                raise ValueError(f"Неизвестный тип наказания: {action_type}")
-            
-            duration_seconds = None
-            expires_at = None
-            
-            if duration:
-                duration_seconds = self.parse_duration(duration)
-                if not duration_seconds:
-                    raise ValueError("Неверный формат длительности. Используйте 1h, 2d, 30m")
-                
-                expires_at = datetime.utcnow() + timedelta(seconds=duration_seconds)
+            result, expires_at = await self.punish(guild, user, moderator, action_type, reason, duration)
             
-            cursor = self.db.cursor()
-            cursor.execute('''
-            INSERT INTO punishments 
-            (user_id, moderator_id, punishment_type_id, reason, duration_seconds, expires_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ''', (
-                user.id,
-                moderator.id,
-                punishment_type_id,
-                reason,
-                duration_seconds,
-                expires_at
-            ))
+            await self.handle_punishment_response(
+                interaction, user, moderator, action_type, reason, 
+                duration, result, expires_at
+            )
             
+        except Exception as e:
+            await self.handle_punishment_error(interaction, e)
+
+    async def punish(
+        self,
+        guild: discord.Guild,
+        user: Union[discord.Member, discord.User],
+        moderator: Union[discord.Member, discord.User],
+        action_type: str,
+        reason: str,
+        duration: Optional[str] = None
+    ) -> Tuple[str, Optional[datetime]]:
+        """Наказание без привязки к интеракции: действие в Discord, запись и планирование снятия"""
+        await asyncio.gather(
+            self.update_user_data(user),
+            self.update_user_data(moderator)
+        )
+        
+        if action_type.lower() in REVOKING_ACTIONS:
+            # Снятие наказания: действие в Discord и отметка revoked у снятых записей
             result = await self.execute_punishment_action(
                 guild=guild,
                 user=user,
                 moderator=moderator,
-                action_type=action_type,
-                punishment_type_id=punishment_type_id,
+                action_type=action_type.lower(),
+                punishment_type_id=None,
                 reason=reason,
-                expires_at=expires_at
-            )
-            
-            self.db.commit()
-            
-            await self.handle_punishment_response(
-                interaction, user, moderator, action_type, reason, 
-                duration, result, expires_at
+                expires_at=None
             )
+            return result, None
+        
+        punishment_type_id = await self.get_punishment_type_id(action_type.lower())
+        if not punishment_type_id:
+            raise ValueError(f"Неизвестный тип наказания: {action_type}")
+        
+        duration_seconds = None
+        expires_at = None
+        
+        if duration:
+            duration_seconds = self.parse_duration(duration)
+            if not duration_seconds:
+                raise ValueError("Неверный формат длительности. Используйте 1h, 2d, 30m")
             
+            expires_at = datetime.utcnow() + timedelta(seconds=duration_seconds)
+        
+        result = await self.execute_punishment_action(
+            guild=guild,
+            user=user,
+            moderator=moderator,
+            action_type=action_type,
+            punishment_type_id=punishment_type_id,
+            reason=reason,
+            expires_at=expires_at
+        )
+        
+        # Запись сохраняется только после успешного действия в Discord
+        punishment_id = await self.db.insert('''
+        INSERT INTO punishments 
+        (guild_id, user_id, moderator_id, punishment_type_id, reason, duration_seconds, expires_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ''', (
+            guild.id,
+            user.id,
+            moderator.id,
+            punishment_type_id,
+            reason,
+            duration_seconds,
+            expires_at
+        ))
+        
+        if expires_at:
+            self.expiry_scheduler.schedule(punishment_id, expires_at, {
+                'id': punishment_id,
+                'guild_id': guild.id,
+                'user_id': user.id,
+                'name': action_type.lower(),
+                'expires_at': expires_at
+            })
+        self.active_punishments.add(punishment_id, guild.id, user.id, action_type.lower(), expires_at)
+        
+        return result, expires_at
+
+    async def auto_punish(self, member: discord.Member, action_type: str, reason: str, duration: Optional[str] = None):
+        """Наказание от имени бота (антирейд, автомодерация): лог и уведомление без ответа модератору"""
+        await self.db_ready.wait()
+        guild = member.guild
+        try:
+            await self.punish(guild, member, guild.me, action_type, reason, duration)
         except Exception as e:
-            await self.handle_punishment_error(interaction, e)
+            print(f"Ошибка автоматического наказания {member.id}: {e}")
+            return
+        await asyncio.gather(
+            self.log_action(
+                user_id=member.id,
+                action_type=action_type.replace('_', ' ').title(),
+                details=(
+                    f"**Модератор:** {guild.me.mention}\n"
+                    f"**Причина:** {reason}\n"
+                    + (f"**Длительность:** {duration}\n" if duration else "")
+                ),
+                guild=guild
+            ),
+            self.notify_user(member, guild.me, action_type, reason, duration),
+            return_exceptions=True
+        )
+
+    async def apply_bulk_punishment(
+        self,
+        guild: discord.Guild,
+        moderator: discord.Member,
+        user_ids: List[int],
+        action_type: str,
+        reason: str,
+        duration: Optional[str] = None
+    ) -> discord.Embed:
+        """Массовое наказание: действия в Discord параллельно, запись одним INSERT, один отчёт"""
+        punishment_type_id = await self.get_punishment_type_id(action_type)
+        if not punishment_type_id:
+            raise ValueError(f"Неизвестный тип наказания: {action_type}")
+        
+        duration_seconds = None
+        expires_at = None
+        if action_type.startswith('temp'):
+            duration_seconds = self.parse_duration(duration or "")
+            if not duration_seconds:
+                raise ValueError("Неверный формат длительности. Используйте 1h, 2d, 30m")
+            expires_at = datetime.utcnow() + timedelta(seconds=duration_seconds)
+        
+        failed = {}
+        targets = []
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            if user_id in (moderator.id, self.bot.user.id, guild.owner_id):
+                failed[user_id] = "защищён"
+            elif member and moderator.id != guild.owner_id and member.top_role >= moderator.top_role:
+                failed[user_id] = "выше по иерархии"
+            elif not member and action_type != 'ban' and action_type != 'temp_ban':
+                failed[user_id] = "не на сервере"
+            else:
+                targets.append(user_id)
+        
+        mute_role = None
+        if action_type in ['mute', 'temp_mute'] and targets:
+            mute_role = await self.get_or_create_role(guild, "Muted")
+        audit_reason = f"{reason} | До: {expires_at}" if expires_at else reason
+        
+        async def punish(user_id):
+            member = guild.get_member(user_id)
+            if action_type in ['ban', 'temp_ban']:
+                # Бан по ID работает и для тех, кто уже вышел с сервера
+                await guild.ban(member or discord.Object(id=user_id), reason=audit_reason, delete_message_seconds=0)
+            elif member is None:
+                raise ValueError("не на сервере")
+            elif action_type == 'kick':
+                await member.kick(reason=reason)
+            else:
+                await member.add_roles(mute_role, reason=reason)
+        
+        succeeded, errors = await self.bulk_runner.run(targets, punish)
+        failed.update(errors)
+        
+        if succeeded:
+            await self.update_user_data(moderator)
+            await self.record_bulk_punishments(
+                guild, moderator, succeeded, action_type, punishment_type_id,
+                reason, duration_seconds, expires_at
+            )
+        
+        embed = discord.Embed(
+            title=f"Массовое действие: {action_type.replace('_', ' ').title()}",
+            description=(
+                f"**Модератор:** {moderator.mention}\n"
+                f"**Причина:** {reason}\n"
+                + (f"**Длительность:** {duration}\n" if duration_seconds else "")
+                + f"**Успешно:** {len(succeeded)} из {len(user_ids)}"
+            ),
+            color=discord.Color.red(),
+            timestamp=datetime.utcnow()
+        )
+        if succeeded:
+            embed.add_field(
+                name="Применено",
+                value=self._format_ids(succeeded),
+                inline=False
+            )
+        if failed:
+            embed.add_field(
+                name=f"Не удалось ({len(failed)})",
+                value=self._format_ids(failed, failed),
+                inline=False
+            )
+        
+        await self.log_action(
+            user_id=moderator.id,
+            action_type=f"Bulk {action_type.replace('_', ' ').title()}",
+            details=(
+                f"Причина: {reason}\n"
+                f"Успешно: {', '.join(map(str, succeeded)) or '-'}\n"
+                f"Ошибки: {', '.join(f'{i} ({e})' for i, e in failed.items()) or '-'}"
+            ),
+            guild=guild,
+            embed=embed
+        )
+        return embed
+
+    @staticmethod
+    def _format_ids(user_ids, reasons=None, limit=1024) -> str:
+        """Список упоминаний, обрезанный под лимит поля эмбеда"""
+        lines = []
+        size = 0
+        for i, user_id in enumerate(user_ids):
+            line = f"<@{user_id}>" + (f" — {reasons[user_id]}" if reasons else "")
+            tail = f"\n…и ещё {len(user_ids) - i}"
+            if size + len(line) + 1 + len(tail) > limit:
+                lines.append(tail.strip())
+                break
+            lines.append(line)
+            size += len(line) + 1
+        return "\n".join(lines)
+
+    async def record_bulk_punishments(self, guild, moderator, user_ids, action_type, punishment_type_id, reason, duration_seconds, expires_at):
+        """Запись массового наказания и постановка его в расписание и индекс"""
+        users = {}
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            users[user_id] = member.name if member else str(user_id)
+        inserted = await insert_bulk_punishments(
+            self.db, guild.id, moderator.id, users, punishment_type_id, reason, duration_seconds, expires_at
+        )
+        if not expires_at and action_type not in PUNISHMENT_ROLES:
+            return
+        
+        for row in inserted:
+            if expires_at:
+                self.expiry_scheduler.schedule(row['id'], expires_at, {
+                    'id': row['id'],
+                    'guild_id': guild.id,
+                    'user_id': row['user_id'],
+                    'name': action_type,
+                    'expires_at': expires_at
+                })
+            self.active_punishments.add(row['id'], guild.id, row['user_id'], action_type, expires_at)
 
     def parse_duration(self, duration_str: str) -> Optional[int]:
         """Парсинг строки длительности в секунды"""
@@ -363,7 +890,7 @@ class Moderator(bridge.Cog):
         user: Union[discord.Member, discord.User],
         moderator: discord.Member,
         action_type: str,
-        punishment_type_id: int,
+        punishment_type_id: Optional[int],
         reason: str,
         expires_at: Optional[datetime]
     ) -> str:
@@ -398,55 +925,65 @@ class Moderator(bridge.Cog):
         
         elif action_type == 'unban':
             await guild.unban(user, reason=reason)
+            await self.revoke_punishments(guild, user, moderator, reason, REVOKING_ACTIONS['unban'])
             result = f"Пользователь {user.mention} был разбанен."
         
         elif action_type == 'unmute':
-            mute_role = discord.utils.get(guild.roles, name="Muted")
-            vmute_role = discord.utils.get(guild.roles, name="Voice Muted")
+            mute_role = self.resolver.role(guild, "Muted")
+            vmute_role = self.resolver.role(guild, "Voice Muted")
             
             if mute_role and mute_role in user.roles:
                 await user.remove_roles(mute_role, reason=reason)
             if vmute_role and vmute_role in user.roles:
                 await user.remove_roles(vmute_role, reason=reason)
             
+            # Иначе при перезаходе мут вернулся бы из индекса
+            await self.revoke_punishments(guild, user, moderator, reason, REVOKING_ACTIONS['unmute'])
             result = f"Пользователь {user.mention} был размучен."
         
         elif action_type == 'warn':
-            cursor = self.db.cursor()
-            punishment_type_id = await self.get_punishment_type_id('warn')
-            
-            cursor.execute('''
-            INSERT INTO punishments 
-            (user_id, moderator_id, punishment_type_id, reason)
-            VALUES (%s, %s, %s, %s)
-            ''', (
-                user.id,
-                moderator.id,
-                punishment_type_id,
-                reason
-            ))
-            
+            # Запись о предупреждении вставляет punish() после этого вызова
             result = f"Пользователь {user.mention} получил предупреждение."
         
         return result
 
+    async def revoke_punishments(self, guild, user, moderator, reason: str, names) -> int:
+        """Снимает действующие наказания указанных типов: индекс, планировщик и отметка в базе"""
+        self.active_punishments.discard_member(guild.id, user.id, names)
+        type_ids = [self.punishment_types[name]['id'] for name in names if name in self.punishment_types]
+        revoked = await revoke_punishments(self.db, guild.id, user.id, type_ids, moderator.id, reason, datetime.utcnow())
+        for punishment_id in revoked:
+            self.expiry_scheduler.discard(punishment_id)
+        return len(revoked)
+
     async def get_or_create_role(self, guild, role_name):
         """Получает или создает роль с нужными правами"""
-        role = discord.utils.get(guild.roles, name=role_name)
+        role = self.resolver.role(guild, role_name)
         if not role:
             role = await guild.create_role(name=role_name)
-            
-            for channel in guild.channels:
-                try:
-                    if isinstance(channel, discord.TextChannel) and role_name == "Muted":
-                        await channel.set_permissions(role, send_messages=False)
-                    elif isinstance(channel, discord.VoiceChannel) and role_name == "Voice Muted":
-                        await channel.set_permissions(role, speak=False)
-                except discord.Forbidden:
-                    continue
+            self.resolver.remember_role(guild, role_name, role)
+            # Роль выдаётся сразу, права по каналам раскатываются в фоне
+            self.permission_rollout.start(guild, role, role_name)
         
         return role
 
+    async def report_rollout(self, guild, role, done, total):
+        """Прогресс раскатки прав роли наказания"""
+        print(f"Права роли {role.name} на {guild.name}: {done}/{total}")
+        if done == total:
+            await self.log_action(
+                user_id=self.bot.user.id,
+                action_type="Права роли наказания",
+                details=f"Роль {role.mention} настроена в {total} каналах",
+                guild=guild
+            )
+
+    async def resume_permission_rollouts(self):
+        """Доводит до конца раскатки, которые бот начал и не закончил до перезапуска"""
+        resumed = await self.permission_rollout.resume(self.bot.guilds)
+        if resumed:
+            print(f"Возобновлено раскаток прав: {resumed}")
+
     async def handle_punishment_response(self, interaction, user, moderator, action_type, reason, duration, result, expires_at):
         """Обработка ответа после применения наказания"""
         log_details = (
@@ -455,13 +992,6 @@ class Moderator(bridge.Cog):
             + (f"**Длительность:** {duration}\n" if duration else "")
         )
         
-        await self.log_action(
-            user_id=user.id,
-            action_type=action_type.replace('_', ' ').title(),
-            details=log_details,
-            guild=interaction.guild
-        )
-        
         embed = discord.Embed(
             title=f"Действие выполнено: {action_type.replace('_', ' ').title()}",
             description=result,
@@ -471,8 +1001,21 @@ class Moderator(bridge.Cog):
         if duration:
             embed.add_field(name="Длительность", value=duration, inline=False)
         
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        
+        # Ответ модератору, лог и уведомление пользователю идут параллельно
+        await asyncio.gather(
+            interaction.followup.send(embed=embed, ephemeral=True),
+            self.log_action(
+                user_id=user.id,
+                action_type=action_type.replace('_', ' ').title(),
+                details=log_details,
+                guild=interaction.guild
+            ),
+            self.notify_user(user, moderator, action_type, reason, duration),
+            return_exceptions=True
+        )
+
+    async def notify_user(self, user, moderator, action_type, reason, duration):
+        """Уведомление пользователя о наказании в ЛС"""
         try:
             notify_embed = discord.Embed(
                 title=f"К вам применено действие: {action_type.replace('_', ' ').title()}",
@@ -484,7 +1027,7 @@ class Moderator(bridge.Cog):
             notify_embed.add_field(name="Модератор", value=moderator.mention, inline=False)
             
             await user.send(embed=notify_embed)
-        except discord.Forbidden:
+        except (discord.Forbidden, discord.HTTPException):
             pass
 
     async def handle_punishment_error(self, interaction, error):
@@ -511,7 +1054,7 @@ class Moderator(bridge.Cog):
     async def mod_action(self, ctx, user: discord.member):
         """Действия с пользователем"""
         await self.update_user_data(user)
-        view = ModeratorActionsView(user)
+        view = ModeratorActionsView(self, user)
         embed = discord.Embed(
             title=f"Действия с пользователем {user.display_name}",
             description="Выберите действие из меню ниже:",
@@ -519,34 +1062,386 @@ class Moderator(bridge.Cog):
         )
         await ctx.respond(embed=embed, view=view)
 
+    @mod.sub_command(name="bulk", description="Массовое действие (например, при рейде)")
+    async def mod_bulk(
+        self,
+        ctx,
+        action: discord.Option(str, "Действие", choices=BULK_ACTIONS),
+        reason: discord.Option(str, "Причина"),
+        user_ids: discord.Option(str, "ID или упоминания через пробел", required=False, default=None),
+        attachment: discord.Option(discord.Attachment, "Файл со списком ID", required=False, default=None),
+        joined_minutes: discord.Option(int, "Все, кто зашёл за последние N минут", required=False, default=None, min_value=1, max_value=1440),
+        duration: discord.Option(str, "Длительность для temp_* (1h, 2d, 30m)", required=False, default=None)
+    ):
+        """Бан, кик или мут списка пользователей одним действием"""
+        if not getattr(ctx.author.guild_permissions, BULK_PERMISSIONS[action]):
+            return await ctx.respond("Недостаточно прав для этого действия", ephemeral=True)
+        
+        await ctx.defer(ephemeral=True)
+        try:
+            text = (await attachment.read()).decode('utf-8', errors='ignore') if attachment else None
+            ids = parse_user_ids(user_ids, text)
+            if joined_minutes:
+                known = set(ids)
+                ids += [i for i in recent_joins(ctx.guild, joined_minutes) if i not in known]
+            if not ids:
+                raise ValueError("Не найдено ни одного ID пользователя")
+            if len(ids) > MODERATOR["bulk_max_users"]:
+                raise ValueError(f"Слишком много пользователей: {len(ids)} (лимит {MODERATOR['bulk_max_users']})")
+            
+            embed = await self.apply_bulk_punishment(ctx.guild, ctx.author, ids, action, reason, duration)
+            await ctx.respond(embed=embed, ephemeral=True)
+        except Exception as e:
+            await ctx.respond(f"Не удалось выполнить массовое действие: {e}", ephemeral=True)
+
+    @mod.sub_command(name="automod", description="Перечитать правила автомодерации")
+    async def mod_automod(self, ctx):
+        """Загружает правила из файла без перезапуска модуля"""
+        if not ctx.author.guild_permissions.manage_guild:
+            return await ctx.respond("Недостаточно прав", ephemeral=True)
+        try:
+            self.automod_filter = AutoModFilter.from_file(MODERATOR["automod_rules"])
+        except (OSError, ValueError) as e:
+            return await ctx.respond(f"Не удалось загрузить правила: {e}", ephemeral=True)
+        
+        automod = self.automod_filter
+        if automod is None:
+            return await ctx.respond(
+                f"Файл правил {MODERATOR['automod_rules']} не найден — автомодерация выключена", ephemeral=True
+            )
+        await ctx.respond(
+            f"Запрещённых слов: {len(automod.words)}\n"
+            f"Разрешённых доменов: {len(automod.allowed_domains)}\n"
+            f"Приглашения: {'блокируются' if automod.block_invites else 'разрешены'}\n"
+            f"Ссылки: {'блокируются' if automod.block_links else 'разрешены'}",
+            ephemeral=True
+        )
+
+    @mod.sub_command(name="search", description="Полнотекстовый поиск по наказаниям и логам")
+    async def mod_search(
+        self,
+        ctx,
+        query: discord.Option(str, "Что искать"),
+        table: discord.Option(str, "Где искать", choices=['punishments', 'logs'], required=False, default='punishments'),
+        since: discord.Option(str, "С даты (ГГГГ-ММ-ДД)", required=False, default=None),
+        until: discord.Option(str, "По дату (ГГГГ-ММ-ДД)", required=False, default=None)
+    ):
+        """Поиск по причинам наказаний или деталям логов с ранжированием"""
+        if not ctx.author.guild_permissions.manage_guild:
+            return await ctx.respond("Недостаточно прав", ephemeral=True)
+        try:
+            since_dt = datetime.strptime(since, "%Y-%m-%d") if since else None
+            until_dt = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1) if until else None
+        except ValueError:
+            return await ctx.respond("Дата должна быть в формате ГГГГ-ММ-ДД", ephemeral=True)
+        
+        pager = search_pager(self.db, table, ctx.guild.id, query, since_dt, until_dt)
+        if pager is None:
+            return await ctx.respond("В запросе нет слов для поиска", ephemeral=True)
+        
+        view = SearchView(author_id=ctx.author.id, query=query, table=table, pager=pager)
+        await pager.first()
+        view.update_buttons()
+        await ctx.respond(embed=view.build_embed(), view=view, ephemeral=True)
+
+    @mod.sub_command(name="export", description="Выгрузка данных модерации файлом")
+    async def mod_export(
+        self,
+        ctx,
+        table: discord.Option(str, "Что выгрузить", choices=list(EXPORT_TABLES)),
+        fmt: discord.Option(str, "Формат", name="format", choices=['csv', 'jsonl'], required=False, default='csv'),
+        since: discord.Option(str, "С даты (ГГГГ-ММ-ДД)", required=False, default=None),
+        until: discord.Option(str, "По дату (ГГГГ-ММ-ДД)", required=False, default=None)
+    ):
+        """Потоковая выгрузка таблицы сервера в gzip-файлы под лимит вложений"""
+        if not ctx.author.guild_permissions.manage_guild:
+            return await ctx.respond("Недостаточно прав", ephemeral=True)
+        try:
+            since_dt = datetime.strptime(since, "%Y-%m-%d") if since else None
+            until_dt = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1) if until else None
+        except ValueError:
+            return await ctx.respond("Дата должна быть в формате ГГГГ-ММ-ДД", ephemeral=True)
+        
+        await ctx.defer(ephemeral=True)
+        directory = tempfile.mkdtemp(prefix="moderator-export-")
+        try:
+            writer = ExportWriter(
+                directory,
+                f"{table}-{ctx.guild.id}-{datetime.utcnow():%Y%m%d%H%M}",
+                fmt=fmt,
+                max_bytes=ctx.guild.filesize_limit
+            )
+            query, params = export_query(table, ctx.guild.id, since_dt, until_dt)
+            try:
+                # Чтение и запись файлов идут в потоке пула базы, не в event loop
+                await self.db.stream(
+                    query, params, writer.write,
+                    chunk_size=MODERATOR["export_chunk_size"],
+                    timeout=MODERATOR["export_timeout"]
+                )
+            finally:
+                paths = await asyncio.get_running_loop().run_in_executor(None, writer.close)
+            
+            if not writer.rows:
+                return await ctx.respond("Нет данных за выбранный период", ephemeral=True)
+            for number, path in enumerate(paths, start=1):
+                await ctx.respond(
+                    f"{table}: часть {number}/{len(paths)}, всего строк: {writer.rows}",
+                    file=discord.File(path),
+                    ephemeral=True
+                )
+        except Exception as e:
+            await ctx.respond(f"Не удалось выгрузить данные: {e}", ephemeral=True)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @mod.sub_command(name="archive", description="Поиск по архиву логов и голосовой активности")
+    async def mod_archive(
+        self,
+        ctx,
+        table: discord.Option(str, "Что искать", choices=list(ARCHIVE_TABLES)),
+        since: discord.Option(str, "С даты (ГГГГ-ММ-ДД)"),
+        until: discord.Option(str, "По дату (ГГГГ-ММ-ДД)"),
+        user: discord.Option(discord.User, "Пользователь", required=False, default=None)
+    ):
+        """Чтение архивных строк за период прямо из jsonl.gz"""
+        if not ctx.author.guild_permissions.manage_guild:
+            return await ctx.respond("Недостаточно прав", ephemeral=True)
+        try:
+            since_dt = datetime.strptime(since, "%Y-%m-%d")
+            until_dt = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            return await ctx.respond("Дата должна быть в формате ГГГГ-ММ-ДД", ephemeral=True)
+        
+        await ctx.defer(ephemeral=True)
+        rows = await self.archiver.query(table, ctx.guild.id, since_dt, until_dt, user.id if user else None)
+        if not rows:
+            return await ctx.respond("В архиве за этот период ничего нет", ephemeral=True)
+        
+        lines = []
+        for row in rows[:10]:
+            if table == 'logs':
+                lines.append(f"`{row['created_at'][:16]}` <@{row['user_id']}> **{row['action_type']}**")
+            else:
+                lines.append(f"`{row['join_time'][:16]}` <@{row['user_id']}> {row['channel_name']} ({row['duration_seconds']} сек.)")
+        embed = discord.Embed(
+            title=f"Архив {table}: {since} — {until}",
+            description="\n".join(lines)[:4096],
+            color=discord.Color.dark_grey()
+        )
+        embed.set_footer(text=f"Найдено строк: {len(rows)}; полный список во вложении")
+        
+        # До 10 тыс. строк: сериализация и сжатие не должны держать event loop
+        data = await asyncio.to_thread(self._gzip_jsonl, rows)
+        file = discord.File(io.BytesIO(data), filename=f"{table}-{since}-{until}.jsonl.gz")
+        await ctx.respond(embed=embed, file=file, ephemeral=True)
+
+    @staticmethod
+    def _gzip_jsonl(rows: List[dict]) -> bytes:
+        payload = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        return gzip.compress(payload.encode('utf-8'))
+
+    @mod.sub_command(name="cache", description="Статистика кэшей модерации")
+    async def mod_cache(self, ctx):
+        """Попадания в кэш пользователей, чтобы подобрать его размер"""
+        if not ctx.author.guild_permissions.manage_guild:
+            return await ctx.respond("Недостаточно прав", ephemeral=True)
+        stats = self.user_cache.stats()
+        embed = discord.Embed(title="Кэш модерации", color=discord.Color.blue())
+        embed.add_field(
+            name="Пользователи (LRU)",
+            value=(
+                f"Записей: {stats['size']}/{stats['capacity']}\n"
+                f"Попаданий: {stats['hits']}\n"
+                f"Промахов: {stats['misses']}\n"
+                f"Hit rate: {stats['hit_rate']:.1%}"
+            ),
+            inline=False
+        )
+        embed.add_field(name="Типы наказаний", value=f"В памяти: {len(self.punishment_types)}", inline=False)
+        embed.add_field(name="Действующие муты", value=f"В индексе: {len(self.active_punishments)}", inline=False)
+        await ctx.respond(embed=embed, ephemeral=True)
+
     @mod.sub_command(name="history", description="История пользователя")
-    async def mod_history(self, ctx, user: discord.member):
+    async def mod_history(
+        self,
+        ctx,
+        user: discord.Member,
+        punishment_type: discord.Option(
+            str, "Тип наказания", required=False, default=None,
+            choices=['kick', 'ban', 'temp_ban', 'mute', 'temp_mute', 'voice_mute', 'temp_voice_mute', 'warn']
+        ),
+        since: discord.Option(str, "С даты (ГГГГ-ММ-ДД)", required=False, default=None),
+        until: discord.Option(str, "По дату (ГГГГ-ММ-ДД)", required=False, default=None)
+    ):
         """Просмотр истории пользователя с пагинацией"""
+        try:
+            since_dt = datetime.strptime(since, "%Y-%m-%d") if since else None
+            until_dt = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1) if until else None
+        except ValueError:
+            return await ctx.respond("Дата должна быть в формате ГГГГ-ММ-ДД", ephemeral=True)
+        
         await self.update_user_data(user)
-        cursor = self.db.cursor(dictionary=True)
-        
-        cursor.execute('SELECT * FROM users WHERE user_id = %s', (user.id,))
-        user_data = cursor.fetchone()
-        
-        cursor.execute('''
-        SELECT pt.name, p.reason, p.expires_at, p.created_at 
-        FROM punishments p
-        JOIN punishment_types pt ON p.punishment_type_id = pt.id
-        WHERE p.user_id = %s 
-        ORDER BY p.created_at DESC
-        LIMIT 5
-        ''', (user.id,))
-        punishments = cursor.fetchall()
-        
-        cursor.execute('''
-        SELECT channel_name, join_time, leave_time 
-        FROM voice_activity 
-        WHERE user_id = %s 
-        ORDER BY join_time DESC 
-        LIMIT 5
-        ''', (user.id,))
-        voice_activity = cursor.fetchall()
+        type_id = await self.get_punishment_type_id(punishment_type) if punishment_type else None
+        
+        view = HistoryView(
+            author_id=ctx.author.id,
+            user=user,
+            punishments=punishments_pager(self.db, ctx.guild.id, user.id, type_id, since_dt, until_dt),
+            voice=voice_pager(self.db, ctx.guild.id, user.id, since_dt, until_dt)
+        )
+        await view.punishments.first()
+        await view.voice.first()
+        view.update_buttons()
+        await ctx.respond(embed=view.build_embed(), view=view)
+
+    @bridge.slash_command(name="voice", description="Статистика голосовых каналов")
+    async def voice(self, ctx):
+        """Группа команд голосовой статистики"""
+        pass
+
+    @staticmethod
+    def _format_seconds(seconds) -> str:
+        hours, rest = divmod(int(seconds), 3600)
+        return f"{hours} ч {rest // 60} мин" if hours else f"{rest // 60} мин"
+
+    @voice.sub_command(name="stats", description="Время пользователя в голосовых каналах")
+    async def voice_stats(
+        self,
+        ctx,
+        user: discord.Option(discord.Member, "Пользователь", required=False, default=None),
+        days: discord.Option(int, "За сколько дней", required=False, default=30, min_value=1, max_value=3650)
+    ):
+        """Сумма по каналам из суточных итогов"""
+        user = user or ctx.author
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        rows = await self.voice_rollup.user_stats(ctx.guild.id, user.id, since)
+        
+        total = sum(int(row['seconds']) for row in rows)
+        embed = discord.Embed(
+            title=f"Голосовая активность {user.display_name}",
+            description=f"За {days} дн.: **{self._format_seconds(total)}**, сессий: {sum(int(row['sessions']) for row in rows)}",
+            color=discord.Color.blue()
+        )
+        session = self.voice_cache.sessions.get((ctx.guild.id, user.id))
+        if session:
+            embed.add_field(
+                name="Сейчас",
+                value=f"<#{session['channel_id']}> — {self._format_seconds((datetime.utcnow() - session['join_time']).total_seconds())}",
+                inline=False
+            )
+        if rows:
+            embed.add_field(
+                name="По каналам",
+                value="\n".join(
+                    f"<#{row['channel_id']}>: {self._format_seconds(row['seconds'])}" for row in rows[:15]
+                ),
+                inline=False
+            )
+        await ctx.respond(embed=embed)
+
+    @voice.sub_command(name="top", description="Самые активные в голосовых каналах")
+    async def voice_top(
+        self,
+        ctx,
+        days: discord.Option(int, "За сколько дней", required=False, default=30, min_value=1, max_value=3650),
+        channel: discord.Option(discord.VoiceChannel, "Только этот канал", required=False, default=None)
+    ):
+        """Рейтинг пользователей из суточных итогов"""
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        rows = await self.voice_rollup.top(ctx.guild.id, since, channel.id if channel else None)
+        
+        embed = discord.Embed(
+            title=f"Топ голосовой активности за {days} дн." + (f" — {channel.name}" if channel else ""),
+            description="\n".join(
+                f"**{place}.** <@{row['user_id']}> — {self._format_seconds(row['seconds'])}"
+                for place, row in enumerate(rows, start=1)
+            ) or "Нет данных",
+            color=discord.Color.gold()
+        )
+        await ctx.respond(embed=embed)
+
+    @voice.sub_command(name="backfill", description="Пересчитать статистику из истории сессий")
+    async def voice_backfill(
+        self,
+        ctx,
+        days: discord.Option(int, "За сколько дней", required=False, default=30, min_value=1, max_value=3650)
+    ):
+        """Пересчёт суточных итогов сервера из voice_activity"""
+        if not ctx.author.guild_permissions.manage_guild:
+            return await ctx.respond("Недостаточно прав", ephemeral=True)
         
+        await ctx.defer(ephemeral=True)
+        end = datetime.utcnow().date() + timedelta(days=1)
+        start = end - timedelta(days=days)
+        # Сессии до срока хранения уже в архиве: их итоги пересчитывать не из чего
+        cutoff = self.archiver.cutoff_date('voice_activity')
+        if cutoff and start < cutoff:
+            start = cutoff
+        try:
+            read = await self.voice_cache.rebuild_rollup(ctx.guild.id, start, end)
+        except Exception as e:
+            return await ctx.respond(f"Не удалось пересчитать статистику: {e}", ephemeral=True)
+        await ctx.respond(f"Пересчитано {read} сессий с {start} по {end - timedelta(days=1)}", ephemeral=True)
+
+class SearchView(discord.ui.View):
+    def __init__(self, author_id, query, table, pager, *args, **kwargs):
+        super().__init__(*args, timeout=300, **kwargs)
+        self.author_id = author_id
+        self.query = query
+        self.table = table
+        self.pager = pager
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    def build_embed(self) -> discord.Embed:
+        embed = discord.Embed(
+            title=f"Поиск: {self.query}"[:256],
+            description=f"{'Наказания' if self.table == 'punishments' else 'Логи'}, стр. {self.pager.page_number}",
+            color=discord.Color.blue()
+        )
+        for row in self.pager.rows:
+            embed.add_field(
+                name=f"{row['title'].replace('_', ' ').title()} — {row['created_at'].strftime('%Y-%m-%d %H:%M')}"[:256],
+                value=f"<@{row['user_id']}>: {row['text'] or '-'}"[:1024],
+                inline=False
+            )
+        if not self.pager.rows:
+            embed.add_field(name="Результаты", value="Ничего не найдено", inline=False)
+        return embed
+
+    def update_buttons(self):
+        self.prev_page.disabled = not self.pager.has_prev
+        self.next_page.disabled = not self.pager.has_next
+
+    async def _show(self, interaction: discord.Interaction):
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, button, interaction):
+        await self.pager.prev()
+        await self._show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, button, interaction):
+        await self.pager.next()
+        await self._show(interaction)
+
+class HistoryView(discord.ui.View):
+    def __init__(self, author_id, user, punishments, voice, *args, **kwargs):
+        super().__init__(*args, timeout=300, **kwargs)
+        self.author_id = author_id
+        self.user = user
+        self.punishments = punishments
+        self.voice = voice
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    def build_embed(self) -> discord.Embed:
+        user = self.user
         embed = discord.Embed(
             title=f"История пользователя {user.display_name}",
             description=f"ID: {user.id}\nАккаунт создан: {user.created_at.strftime('%Y-%m-%d')}",
@@ -554,9 +1449,9 @@ class Moderator(bridge.Cog):
         )
         embed.set_thumbnail(url=user.display_avatar.url)
         
-        if punishments:
+        if self.punishments.rows:
             pun_text = []
-            for p in punishments:
+            for p in self.punishments.rows:
                 line = f"**{p['name'].replace('_', ' ').title()}**: {p['reason']}"
                 if p['expires_at']:
                     line += f" (до {p['expires_at'].strftime('%Y-%m-%d %H:%M')})"
@@ -564,23 +1459,23 @@ class Moderator(bridge.Cog):
                 pun_text.append(line)
             
             embed.add_field(
-                name=f"Последние наказания ({len(punishments)})",
-                value="\n\n".join(pun_text),
+                name=f"Наказания (стр. {self.punishments.page_number})",
+                value="\n\n".join(pun_text)[:1024],
                 inline=False
             )
         else:
             embed.add_field(name="Наказания", value="Нет данных", inline=False)
         
-        if voice_activity:
+        if self.voice.rows:
             voice_text = []
-            for v in voice_activity:
+            for v in self.voice.rows:
                 join_time = v['join_time'].strftime('%Y-%m-%d %H:%M')
                 leave_time = v['leave_time'].strftime('%Y-%m-%d %H:%M') if v['leave_time'] else "В канале"
                 voice_text.append(f"**{v['channel_name']}**: {join_time} - {leave_time}")
             
             embed.add_field(
-                name="Голосовая активность (последние 5)",
-                value="\n".join(voice_text),
+                name=f"Голосовая активность (стр. {self.voice.page_number})",
+                value="\n".join(voice_text)[:1024],
                 inline=False
             )
         else:
@@ -590,16 +1485,47 @@ class Moderator(bridge.Cog):
                 inline=False
             )
         
-        await ctx.respond(embed=embed)
+        return embed
+
+    def update_buttons(self):
+        self.prev_punishments.disabled = not self.punishments.has_prev
+        self.next_punishments.disabled = not self.punishments.has_next
+        self.prev_voice.disabled = not self.voice.has_prev
+        self.next_voice.disabled = not self.voice.has_next
+
+    async def _show(self, interaction: discord.Interaction):
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="◀ Наказания", style=discord.ButtonStyle.secondary, row=0)
+    async def prev_punishments(self, button, interaction):
+        await self.punishments.prev()
+        await self._show(interaction)
+
+    @discord.ui.button(label="Наказания ▶", style=discord.ButtonStyle.secondary, row=0)
+    async def next_punishments(self, button, interaction):
+        await self.punishments.next()
+        await self._show(interaction)
+
+    @discord.ui.button(label="◀ Голос", style=discord.ButtonStyle.secondary, row=1)
+    async def prev_voice(self, button, interaction):
+        await self.voice.prev()
+        await self._show(interaction)
+
+    @discord.ui.button(label="Голос ▶", style=discord.ButtonStyle.secondary, row=1)
+    async def next_voice(self, button, interaction):
+        await self.voice.next()
+        await self._show(interaction)
 
 class ModeratorActionsView(discord.ui.View):
-    def __init__(self, user, *args, **kwargs):
+    def __init__(self, cog, user, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.user = user
-        self.add_item(ModeratorActionSelect(user=self.user))
+        self.add_item(ModeratorActionSelect(cog=cog, user=self.user))
 
 class ModeratorActionSelect(discord.ui.Select):
-    def __init__(self, user):
+    def __init__(self, cog, user):
+        self.cog = cog
         self.user = user
         options = [
             discord.SelectOption(label="Kick", value="kick", description="Кикнуть пользователя"),
@@ -621,13 +1547,15 @@ class ModeratorActionSelect(discord.ui.Select):
 
     async def callback(self, interaction: discord.Interaction):
         modal = ModeratorActionModal(
+            cog=self.cog,
             user=self.user,
             action=self.values[0]
         )
         await interaction.response.send_modal(modal)
 
 class ModeratorActionModal(discord.ui.Modal):
-    def __init__(self, user, action, *args, **kwargs):
+    def __init__(self, cog, user, action, *args, **kwargs):
+        self.cog = cog
         self.user = user
         self.action = action
         super().__init__(
@@ -657,14 +1585,15 @@ class ModeratorActionModal(discord.ui.Modal):
         duration = getattr(self, 'duration', None)
         duration = duration.value if duration else None
         
-        await Moderator.apply_punishment(
-            self,
+        # Подтверждаем сразу, чтобы уложиться в 3 секунды; результат придёт followup'ом
+        await interaction.response.defer(ephemeral=True)
+        self.cog.spawn(self.cog.apply_punishment(
             interaction=interaction,
             user=self.user,
             action_type=self.action,
             reason=reason,
             duration=duration
-        )
+        ))
 
-async def setup(bot):
-    await bot.add_cog(Moderator(bot))
+def setup(bot):
+    bot.add_cog(Moderator(bot))
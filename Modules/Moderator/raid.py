@@ -0,0 +1,119 @@
+import re
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+# Цифры в нике схлопываются: raider01, raider777 и raider5 дают один ключ
+_DIGITS_RE = re.compile(r"\d+")
+
+
+class RaidSignal(NamedTuple):
+    kind: str                # 'spike' или 'cluster'
+    count: int               # сколько заходов дало срабатывание
+    key: Optional[tuple]     # общий признак кластера
+    member_ids: List[int]    # новые аккаунты из окна, попавшие под срабатывание
+
+
+class _GuildJoins:
+    __slots__ = ('times', 'recent', 'keys', 'raid_until')
+
+    def __init__(self, join_threshold: int):
+        # Последние join_threshold заходов: всплеск, если все они уложились в окно
+        self.times: Deque[datetime] = deque(maxlen=join_threshold)
+        # (время, id, признаки) новых аккаунтов за окно кластеров
+        self.recent: Deque[Tuple[datetime, int, Tuple[tuple, ...]]] = deque()
+        self.keys: Counter = Counter()
+        self.raid_until: Optional[datetime] = None
+
+
+class RaidDetector:
+    """Детектор рейдов по потоку заходов на сервер.
+
+    На каждый сервер хранится два кольцевых буфера фиксированного размера:
+    времена последних заходов для всплеска и новые аккаунты с признаками
+    (схлопнутый ник + аватар, час создания) для кластеров. Счётчики
+    признаков обновляются при добавлении и вытеснении, поэтому заход
+    обрабатывается за O(1), а память не растёт с числом участников.
+    """
+
+    def __init__(
+        self,
+        join_window: float = 10,
+        join_threshold: int = 10,
+        cluster_window: float = 300,
+        cluster_threshold: int = 5,
+        account_age: float = 7 * 86400,
+        buffer_size: int = 200,
+        cooldown: float = 300
+    ):
+        self.join_window = timedelta(seconds=join_window)
+        self.join_threshold = join_threshold
+        self.cluster_window = timedelta(seconds=cluster_window)
+        self.cluster_threshold = cluster_threshold
+        self.account_age = timedelta(seconds=account_age)
+        self.buffer_size = buffer_size
+        self.cooldown = timedelta(seconds=cooldown)
+        self._guilds: Dict[int, _GuildJoins] = {}
+
+    @staticmethod
+    def features(name: str, has_avatar: bool, created_at: datetime) -> Tuple[tuple, ...]:
+        return (
+            ('name', _DIGITS_RE.sub('#', name.lower()), has_avatar),
+            ('created', created_at.replace(minute=0, second=0, microsecond=0)),
+        )
+
+    def is_new_account(self, created_at: datetime, now: datetime) -> bool:
+        return now - created_at < self.account_age
+
+    def in_raid(self, guild_id: int, now: datetime) -> bool:
+        state = self._guilds.get(guild_id)
+        return bool(state and state.raid_until and now < state.raid_until)
+
+    def forget_guild(self, guild_id: int) -> None:
+        self._guilds.pop(guild_id, None)
+
+    def _evict(self, state: _GuildJoins) -> None:
+        _, _, keys = state.recent.popleft()
+        for key in keys:
+            state.keys[key] -= 1
+            if not state.keys[key]:
+                del state.keys[key]
+
+    def observe(self, guild_id: int, member_id: int, name: str, has_avatar: bool,
+                created_at: datetime, now: datetime) -> Optional[RaidSignal]:
+        """Учитывает заход; возвращает сигнал, только когда рейд начинается"""
+        state = self._guilds.get(guild_id)
+        if state is None:
+            state = self._guilds[guild_id] = _GuildJoins(self.join_threshold)
+
+        state.times.append(now)
+        while state.recent and now - state.recent[0][0] > self.cluster_window:
+            self._evict(state)
+
+        hit = None
+        if self.is_new_account(created_at, now):
+            if len(state.recent) >= self.buffer_size:
+                self._evict(state)
+            keys = self.features(name, has_avatar, created_at)
+            state.recent.append((now, member_id, keys))
+            for key in keys:
+                state.keys[key] += 1
+                if state.keys[key] >= self.cluster_threshold and hit is None:
+                    hit = key
+
+        spike = len(state.times) == state.times.maxlen and now - state.times[0] <= self.join_window
+        if not spike and hit is None:
+            return None
+        if self.in_raid(guild_id, now):
+            # Пока рейд продолжается, режим продлевается без повторного сигнала
+            state.raid_until = now + self.cooldown
+            return None
+
+        state.raid_until = now + self.cooldown
+        if spike:
+            return RaidSignal('spike', len(state.times), None, [
+                m for t, m, _ in state.recent if now - t <= self.join_window
+            ])
+        return RaidSignal('cluster', state.keys[hit], hit, [
+            m for _, m, keys in state.recent if hit in keys
+        ])
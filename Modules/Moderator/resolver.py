@@ -0,0 +1,67 @@
+from typing import Dict, Optional
+
+import discord
+
+_MISSING = object()
+
+
+class GuildResolver:
+    """Кэш ID канала mod-logs и ролей наказаний для каждого сервера.
+
+    Поиск по имени выполняется один раз, дальше объект берётся по ID за O(1),
+    поэтому переименование уже найденного канала или роли ничего не ломает.
+    Записи сбрасываются событиями on_guild_channel_*/on_guild_role_*.
+    """
+
+    def __init__(self):
+        # guild_id -> {имя: id или None, если такого объекта нет}
+        self._channels: Dict[int, Dict[str, Optional[int]]] = {}
+        self._roles: Dict[int, Dict[str, Optional[int]]] = {}
+
+    def channel(self, guild: discord.Guild, name: str) -> Optional[discord.abc.GuildChannel]:
+        cache = self._channels.setdefault(guild.id, {})
+        channel_id = cache.get(name, _MISSING)
+        if channel_id is _MISSING:
+            channel = discord.utils.get(guild.channels, name=name)
+            cache[name] = channel.id if channel else None
+            return channel
+        return guild.get_channel(channel_id) if channel_id else None
+
+    def role(self, guild: discord.Guild, name: str) -> Optional[discord.Role]:
+        cache = self._roles.setdefault(guild.id, {})
+        role_id = cache.get(name, _MISSING)
+        if role_id is _MISSING:
+            role = discord.utils.get(guild.roles, name=name)
+            cache[name] = role.id if role else None
+            return role
+        return guild.get_role(role_id) if role_id else None
+
+    def remember_role(self, guild: discord.Guild, name: str, role: discord.Role) -> None:
+        self._roles.setdefault(guild.id, {})[name] = role.id
+
+    @staticmethod
+    def _appeared(cache: Dict[str, Optional[int]], name: str) -> None:
+        # Объект с нужным именем появился там, где раньше его не было
+        if name in cache and cache[name] is None:
+            del cache[name]
+
+    @staticmethod
+    def _removed(cache: Dict[str, Optional[int]], object_id: int) -> None:
+        for name in [n for n, v in cache.items() if v == object_id]:
+            del cache[name]
+
+    def channel_created(self, channel: discord.abc.GuildChannel) -> None:
+        self._appeared(self._channels.get(channel.guild.id, {}), channel.name)
+
+    def channel_deleted(self, channel: discord.abc.GuildChannel) -> None:
+        self._removed(self._channels.get(channel.guild.id, {}), channel.id)
+
+    def role_created(self, role: discord.Role) -> None:
+        self._appeared(self._roles.get(role.guild.id, {}), role.name)
+
+    def role_deleted(self, role: discord.Role) -> None:
+        self._removed(self._roles.get(role.guild.id, {}), role.id)
+
+    def forget_guild(self, guild_id: int) -> None:
+        self._channels.pop(guild_id, None)
+        self._roles.pop(guild_id, None)
@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from Modules.Moderator.database import Database
+
+# Какие каналы и какие права закрывает каждая роль наказания.
+# Категории тоже закрываются, чтобы новые синхронизированные каналы сразу наследовали оверрайт.
+ROLE_OVERWRITES = {
+    "Muted": ((discord.CategoryChannel, discord.TextChannel), {"send_messages": False}),
+    "Voice Muted": ((discord.CategoryChannel, discord.VoiceChannel), {"speak": False}),
+}
+
+ProgressCallback = Callable[[discord.Guild, discord.Role, int, int], Awaitable[None]]
+
+
+class PermissionRollout:
+    """Фоновая раскатка оверрайтов роли по каналам сервера.
+
+    Запросы идут с ограниченной параллельностью и не чаще rate в секунду,
+    остальное (бакеты, 429) берёт на себя HTTP-клиент py-cord. Уже
+    выставленные оверрайты пропускаются, поэтому прерванную раскатку
+    можно просто запустить заново. Раскатки, начатые ботом, записываются
+    в permission_rollouts; после перезапуска возобновляются только
+    незавершённые из них, а ручные исключения админов в остальных
+    каналах и ролях не трогаются.
+    """
+
+    def __init__(self, concurrency: int = 5, rate: float = 10.0, progress: Optional[ProgressCallback] = None, report_every: int = 25,
+                 db: Optional[Database] = None):
+        self.db = db
+        self.concurrency = concurrency
+        self.interval = 1.0 / rate if rate else 0.0
+        self.progress = progress
+        self.report_every = report_every
+        self._tasks: Dict[Tuple[int, int], asyncio.Task] = {}
+        self._status: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self._throttle_lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    @staticmethod
+    def pending(guild: discord.Guild, role: discord.Role, role_name: str) -> List[discord.abc.GuildChannel]:
+        """Каналы, где оверрайт роли ещё не выставлен"""
+        channel_types, permissions = ROLE_OVERWRITES[role_name]
+        channels = [c for c in guild.channels if isinstance(c, channel_types)]
+        channels.sort(key=lambda c: not isinstance(c, discord.CategoryChannel))
+        result = []
+        for channel in channels:
+            overwrite = channel.overwrites_for(role)
+            if any(getattr(overwrite, name) != value for name, value in permissions.items()):
+                result.append(channel)
+        return result
+
+    def status(self, guild_id: int, role_id: int) -> Optional[Tuple[int, int]]:
+        """(сделано, всего) для текущей или последней раскатки"""
+        return self._status.get((guild_id, role_id))
+
+    def start(self, guild: discord.Guild, role: discord.Role, role_name: str) -> asyncio.Task:
+        """Запускает раскатку, если она ещё не идёт"""
+        key = (guild.id, role.id)
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            task = asyncio.get_running_loop().create_task(self._run(guild, role, role_name))
+            self._tasks[key] = task
+        return task
+
+    async def _save(self, guild_id: int, role_id: int, role_name: str, status: str) -> None:
+        if self.db is None:
+            return
+        try:
+            await self.db.execute('''
+            INSERT INTO permission_rollouts (guild_id, role_id, role_name, status, updated_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+            role_name = VALUES(role_name),
+            status = VALUES(status),
+            updated_at = VALUES(updated_at)
+            ''', (guild_id, role_id, role_name, status, datetime.utcnow()))
+        except Exception as e:
+            # Раскатка важнее учёта: без записи она просто не возобновится после перезапуска
+            print(f"Ошибка при сохранении раскатки прав: {e}")
+
+    async def unfinished(self, guild_ids: List[int]) -> List[dict]:
+        """Раскатки своих серверов, прерванные до завершения"""
+        if self.db is None:
+            return []
+        rows = []
+        for i in range(0, len(guild_ids), 500):
+            chunk = guild_ids[i:i + 500]
+            rows += await self.db.fetchall(f'''
+            SELECT guild_id, role_id, role_name FROM permission_rollouts
+            WHERE guild_id IN ({", ".join(["%s"] * len(chunk))}) AND status = 'running'
+            ''', chunk)
+        return rows
+
+    async def resume(self, guilds: Iterable[discord.Guild]) -> int:
+        """Перезапускает незавершённые раскатки; возвращает их количество"""
+        by_id = {guild.id: guild for guild in guilds}
+        resumed = 0
+        for row in await self.unfinished(list(by_id)):
+            guild = by_id[row['guild_id']]
+            role = guild.get_role(row['role_id'])
+            if role is None or row['role_name'] not in ROLE_OVERWRITES:
+                # Роль удалили, пока бот лежал, — раскатывать некуда
+                await self._save(row['guild_id'], row['role_id'], row['role_name'], 'abandoned')
+                continue
+            self.start(guild, role, row['role_name'])
+            resumed += 1
+        return resumed
+
+    def cancel_all(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    async def _throttle(self) -> None:
+        async with self._throttle_lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_slot - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_slot = max(loop.time(), self._next_slot) + self.interval
+
+    async def _run(self, guild: discord.Guild, role: discord.Role, role_name: str) -> None:
+        key = (guild.id, role.id)
+        await self._save(guild.id, role.id, role_name, 'running')
+        channels = self.pending(guild, role, role_name)
+        total = len(channels)
+        self._status[key] = (0, total)
+        if not total:
+            await self._save(guild.id, role.id, role_name, 'done')
+            return
+
+        _, permissions = ROLE_OVERWRITES[role_name]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done = 0
+
+        async def apply(channel):
+            nonlocal done
+            async with semaphore:
+                await self._throttle()
+                try:
+                    await channel.set_permissions(role, reason="Права роли наказания", **permissions)
+                except (discord.Forbidden, discord.NotFound):
+                    pass
+                except discord.HTTPException as e:
+                    print(f"Ошибка при выставлении прав в канале {channel.id}: {e}")
+            done += 1
+            self._status[key] = (done, total)
+            if self.progress and (done % self.report_every == 0 or done == total):
+                try:
+                    await self.progress(guild, role, done, total)
+                except Exception as e:
+                    print(f"Ошибка при отчёте о раскатке прав: {e}")
+
+        await asyncio.gather(*(apply(channel) for channel in channels))
+        await self._save(guild.id, role.id, role_name, 'done')
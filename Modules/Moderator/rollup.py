@@ -0,0 +1,129 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from Modules.Moderator.database import Database
+
+RollupKey = Tuple[int, date, int, int]  # (guild_id, day, user_id, channel_id)
+
+
+def split_by_day(join_time: datetime, leave_time: datetime) -> Iterator[Tuple[date, int]]:
+    """Делит сессию по суткам (UTC): (день, секунд в этот день)"""
+    start = join_time
+    while start < leave_time:
+        midnight = datetime.combine(start.date() + timedelta(days=1), time.min)
+        end = min(midnight, leave_time)
+        yield start.date(), int((end - start).total_seconds())
+        start = end
+
+
+def aggregate(sessions: Iterable[dict], start: Optional[date] = None, end: Optional[date] = None) -> Dict[RollupKey, List[int]]:
+    """Суммы [секунд, сессий] по (сервер, день, пользователь, канал).
+
+    Сессия засчитывается в день входа; если задан [start, end), дни вне
+    диапазона отбрасываются.
+    """
+    totals: Dict[RollupKey, List[int]] = {}
+    for s in sessions:
+        if s['leave_time'] is None or s['join_time'] is None:
+            continue
+        first = True
+        for day, seconds in split_by_day(s['join_time'], s['leave_time']):
+            if (start is None or day >= start) and (end is None or day < end):
+                total = totals.setdefault((s['guild_id'], day, s['user_id'], s['channel_id']), [0, 0])
+                total[0] += seconds
+                total[1] += 1 if first else 0
+            first = False
+    return totals
+
+
+class VoiceRollup:
+    """Суточные итоги голосовой активности в voice_daily.
+
+    Итоги пополняются в той же транзакции, что закрывает сессии, поэтому
+    каждая закрытая сессия учитывается ровно один раз. Отчёты читают
+    только voice_daily, размер которой не зависит от числа сессий.
+    """
+
+    def __init__(self, db: Database, chunk_size: int = 500):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    async def _upsert(self, cursor, totals: Dict[RollupKey, List[int]]) -> None:
+        items = list(totals.items())
+        for i in range(0, len(items), self.chunk_size):
+            chunk = items[i:i + self.chunk_size]
+            await cursor.execute(f'''
+            INSERT INTO voice_daily (guild_id, day, user_id, channel_id, seconds, sessions)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))}
+            ON DUPLICATE KEY UPDATE
+            seconds = seconds + VALUES(seconds),
+            sessions = sessions + VALUES(sessions)
+            ''', [value for key, total in chunk for value in (*key, *total)])
+
+    async def apply(self, cursor, sessions: Iterable[dict]) -> None:
+        """Добавляет закрытые сессии в итоги внутри транзакции вызывающего"""
+        totals = aggregate(sessions)
+        if totals:
+            await self._upsert(cursor, totals)
+
+    async def backfill(self, guild_id: int, start: date, end: date, page_size: int = 5000) -> int:
+        """Пересчитывает дни [start, end) сервера из закрытых сессий voice_activity.
+
+        Вызывать, пока сброс буфера голосовой активности не идёт, иначе
+        сессия, закрытая между чтением и записью, попадёт в итоги дважды.
+        Возвращает число прочитанных сессий.
+        """
+        since = datetime.combine(start, time.min)
+        until = datetime.combine(end, time.min)
+        totals: Dict[RollupKey, List[int]] = {}
+        last_id = 0
+        read = 0
+        while True:
+            rows = await self.db.fetchall('''
+            SELECT id, guild_id, user_id, channel_id, join_time, leave_time
+            FROM voice_activity
+            WHERE guild_id = %s AND leave_time >= %s AND join_time < %s AND id > %s
+            ORDER BY id
+            LIMIT %s
+            ''', (guild_id, since, until, last_id, page_size))
+            if not rows:
+                break
+            for key, (seconds, sessions) in aggregate(rows, start, end).items():
+                total = totals.setdefault(key, [0, 0])
+                total[0] += seconds
+                total[1] += sessions
+            last_id = rows[-1]['id']
+            read += len(rows)
+
+        async with self.db.transaction() as cursor:
+            await cursor.execute('''
+            DELETE FROM voice_daily WHERE guild_id = %s AND day >= %s AND day < %s
+            ''', (guild_id, start, end))
+            await self._upsert(cursor, totals)
+        return read
+
+    async def user_stats(self, guild_id: int, user_id: int, since: date) -> List[dict]:
+        """Секунды и сессии пользователя по каналам с даты since"""
+        return await self.db.fetchall('''
+        SELECT channel_id, SUM(seconds) AS seconds, SUM(sessions) AS sessions
+        FROM voice_daily
+        WHERE guild_id = %s AND user_id = %s AND day >= %s
+        GROUP BY channel_id
+        ORDER BY seconds DESC
+        ''', (guild_id, user_id, since))
+
+    async def top(self, guild_id: int, since: date, channel_id: Optional[int] = None, limit: int = 10) -> List[dict]:
+        """Самые активные пользователи сервера (или одного канала) с даты since"""
+        where = "guild_id = %s AND day >= %s"
+        params = [guild_id, since]
+        if channel_id is not None:
+            where += " AND channel_id = %s"
+            params.append(channel_id)
+        return await self.db.fetchall(f'''
+        SELECT user_id, SUM(seconds) AS seconds, SUM(sessions) AS sessions
+        FROM voice_daily
+        WHERE {where}
+        GROUP BY user_id
+        ORDER BY seconds DESC
+        LIMIT %s
+        ''', (*params, limit))
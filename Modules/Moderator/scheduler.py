@@ -0,0 +1,100 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class ExpiryScheduler:
+    """Планировщик снятия временных наказаний на min-heap.
+
+    Сроки округляются вверх до целой секунды, поэтому всё, что истекает
+    в одну секунду, приходит в callback одной пачкой.
+    """
+
+    def __init__(self, callback: Callable[[List[Any]], Awaitable[None]], max_sleep: float = 3600.0):
+        self.callback = callback
+        self.max_sleep = max_sleep
+        self._heap = []
+        self._entries: Dict[int, tuple] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _deadline(expires_at: datetime) -> datetime:
+        if expires_at.microsecond:
+            expires_at = expires_at.replace(microsecond=0) + timedelta(seconds=1)
+        return expires_at
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._entries
+
+    def schedule(self, key: int, expires_at: datetime, payload: Any = None) -> None:
+        """Добавляет (или переносит) наказание в расписание"""
+        deadline = self._deadline(expires_at)
+        entry = (deadline, key, payload)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (deadline, key))
+        if self._heap[0][1] == key:
+            self._wakeup.set()
+
+    def discard(self, key: int) -> None:
+        """Убирает наказание из расписания (запись в куче удаляется лениво)"""
+        self._entries.pop(key, None)
+
+    def next_deadline(self) -> Optional[datetime]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self) -> None:
+        while self._heap:
+            deadline, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == deadline:
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now: datetime) -> List[Any]:
+        """Извлекает все наказания со сроком не позже now"""
+        due = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, key = heapq.heappop(self._heap)
+            due.append(self._entries.pop(key)[2])
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            deadline = self.next_deadline()
+            if deadline is None:
+                await self._wakeup.wait()
+                continue
+
+            delay = (deadline - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, self.max_sleep))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            batch = self.pop_due(datetime.utcnow())
+            if batch:
+                try:
+                    await self.callback(batch)
+                except Exception as e:
+                    print(f"Ошибка при обработке истёкших наказаний: {e}")
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,169 @@
+from config import SETTINGS
+from Modules.Moderator.search import ensure_fulltext
+
+
+async def create_schema(cursor) -> None:
+    """Таблицы, миграции и индексы модерации в одной транзакции.
+
+    Вызывается при каждом запуске и ничего не ломает на уже созданной
+    базе; cursor — Transaction из Database.transaction().
+    """
+    # Улучшенная структура базы данных для MySQL
+    await cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        username VARCHAR(32) NOT NULL,
+        discriminator VARCHAR(4),
+        avatar_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    await cursor.execute('''
+    CREATE TABLE IF NOT EXISTS punishment_types (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(32) UNIQUE NOT NULL,
+        is_temporary BOOLEAN DEFAULT FALSE
+    )
+    ''')
+    
+    await cursor.execute('''
+    CREATE TABLE IF NOT EXISTS punishments (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        guild_id BIGINT,
+        user_id BIGINT NOT NULL,
+        moderator_id BIGINT NOT NULL,
+        punishment_type_id INT NOT NULL,
+        reason TEXT,
+        duration_seconds INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NULL,
+        revoked BOOLEAN DEFAULT FALSE,
+        revoked_at TIMESTAMP NULL,
+        revoked_by BIGINT,
+        revoked_reason TEXT,
+        lease_owner VARCHAR(64) NULL,
+        lease_until TIMESTAMP NULL,
+        batch_id VARCHAR(32) NULL,
+        FOREIGN KEY(user_id) REFERENCES users(user_id),
+        FOREIGN KEY(punishment_type_id) REFERENCES punishment_types(id),
+        FOREIGN KEY(moderator_id) REFERENCES users(user_id),
+        FOREIGN KEY(revoked_by) REFERENCES users(user_id)
+    )
+    ''')
+    
+    await cursor.execute('''
+    CREATE TABLE IF NOT EXISTS voice_activity (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        guild_id BIGINT,
+        user_id BIGINT NOT NULL,
+        channel_id BIGINT NOT NULL,
+        channel_name VARCHAR(100),
+        join_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        leave_time TIMESTAMP NULL,
+        duration_seconds INT,
+        FOREIGN KEY(user_id) REFERENCES users(user_id)
+    )
+    ''')
+    
+    await cursor.execute('''
+    CREATE TABLE IF NOT EXISTS logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        guild_id BIGINT,
+        user_id BIGINT,
+        action_type VARCHAR(50) NOT NULL,
+        details TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(user_id)
+    )
+    ''')
+    
+    # Суточные итоги голосовой активности для /voice stats и /voice top
+    await cursor.execute('''
+    CREATE TABLE IF NOT EXISTS voice_daily (
+        guild_id BIGINT NOT NULL,
+        day DATE NOT NULL,
+        user_id BIGINT NOT NULL,
+        channel_id BIGINT NOT NULL,
+        seconds BIGINT NOT NULL DEFAULT 0,
+        sessions INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, day, user_id, channel_id)
+    )
+    ''')
+    
+    # До какого момента бот видел сервер: им закрываются сессии, оборванные простоем
+    await cursor.execute('''
+    CREATE TABLE IF NOT EXISTS voice_heartbeat (
+        guild_id BIGINT PRIMARY KEY,
+        seen_at TIMESTAMP NOT NULL
+    )
+    ''')
+    
+    # Раскатки прав ролей наказаний, начатые ботом: после перезапуска доводятся только незавершённые
+    await cursor.execute('''
+    CREATE TABLE IF NOT EXISTS permission_rollouts (
+        guild_id BIGINT NOT NULL,
+        role_id BIGINT NOT NULL,
+        role_name VARCHAR(32) NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        updated_at TIMESTAMP NULL,
+        PRIMARY KEY (guild_id, role_id)
+    )
+    ''')
+    
+    # Столбцы, добавленные после первого выпуска, докатываются миграцией
+    migrations = [
+        ('punishments', 'guild_id', 'BIGINT NULL'),
+        ('voice_activity', 'guild_id', 'BIGINT NULL'),
+        ('logs', 'guild_id', 'BIGINT NULL'),
+        ('punishments', 'lease_owner', 'VARCHAR(64) NULL'),
+        ('punishments', 'lease_until', 'TIMESTAMP NULL'),
+        ('punishments', 'batch_id', 'VARCHAR(32) NULL'),
+    ]
+    for table, column, definition in migrations:
+        if column in await cursor.columns(table):
+            continue
+        await cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        # Старые записи принадлежат серверу из настроек, если он задан
+        if column == 'guild_id' and SETTINGS["GUILD"]:
+            await cursor.execute(
+                f'UPDATE {table} SET guild_id = %s WHERE guild_id IS NULL',
+                (int(SETTINGS["GUILD"]),)
+            )
+    
+    indexes = [
+        ('punishments', 'idx_punishments_user', ('user_id',)),
+        ('punishments', 'idx_punishments_expires', ('expires_at',)),
+        ('voice_activity', 'idx_voice_activity_user', ('user_id',)),
+        # Составные индексы под keyset-пагинацию /mod history
+        ('punishments', 'idx_punishments_guild_user_created', ('guild_id', 'user_id', 'created_at', 'id')),
+        ('punishments', 'idx_punishments_guild_user_type_created', ('guild_id', 'user_id', 'punishment_type_id', 'created_at', 'id')),
+        ('voice_activity', 'idx_voice_activity_guild_user_join', ('guild_id', 'user_id', 'join_time', 'id')),
+        ('voice_activity', 'idx_voice_activity_guild_open', ('guild_id', 'leave_time')),
+        ('punishments', 'idx_punishments_guild_expires', ('guild_id', 'revoked', 'expires_at')),
+        ('logs', 'idx_logs_guild_created', ('guild_id', 'created_at')),
+        # Архивация выбирает старые строки сервера по времени
+        ('voice_activity', 'idx_voice_activity_guild_join', ('guild_id', 'join_time', 'id')),
+        ('voice_daily', 'idx_voice_daily_guild_user_day', ('guild_id', 'user_id', 'day', 'channel_id', 'seconds', 'sessions')),
+    ]
+    for table, name, columns in indexes:
+        await cursor.ensure_index(table, name, columns)
+    
+    # Полнотекстовый поиск /mod search по причинам и деталям логов
+    await ensure_fulltext(cursor)
+    
+    punishment_types = [
+        ('kick', False),
+        ('ban', False),
+        ('temp_ban', True),
+        ('mute', False),
+        ('temp_mute', True),
+        ('voice_mute', False),
+        ('temp_voice_mute', True),
+        ('warn', False)
+    ]
+    
+    await cursor.executemany('''
+    INSERT IGNORE INTO punishment_types (name, is_temporary) 
+    VALUES (%s, %s)
+    ''', punishment_types)
@@ -0,0 +1,185 @@
+import re
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from Modules.Moderator.database import Database
+
+# Полнотекстовые индексы: таблица -> (имя индекса, столбцы)
+FULLTEXT_INDEXES = {
+    'punishments': ('ft_punishments_reason', ('reason',)),
+    'logs': ('ft_logs_details', ('action_type', 'details')),
+}
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+async def ensure_fulltext(cursor) -> None:
+    """Создаёт полнотекстовые индексы в диалекте текущей базы.
+
+    MySQL — FULLTEXT-индексы InnoDB. SQLite — внешние таблицы FTS5 поверх
+    исходных с триггерами синхронизации; при первом создании индекс
+    заполняется из уже существующих строк. Если SQLite собран без FTS5,
+    индексы не создаются и поиск переходит на LIKE.
+    """
+    dialect = cursor.db.dialect
+    for table, (name, columns) in FULLTEXT_INDEXES.items():
+        if dialect == "mysql":
+            query, params = cursor.db._index_query(table, name)
+            if not await cursor.fetchone(query, params):
+                await cursor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({", ".join(columns)})')
+        elif dialect == "sqlite":
+            fts = f"{table}_fts"
+            exists = await cursor.fetchone(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", (fts,)
+            )
+            if exists:
+                continue
+            cols = ", ".join(columns)
+            new_cols = ", ".join(f"new.{c}" for c in columns)
+            old_cols = ", ".join(f"old.{c}" for c in columns)
+            try:
+                await cursor.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id')")
+            except sqlite3.OperationalError as e:
+                if "fts5" not in str(e):
+                    raise
+                cursor.db.fulltext = False
+                return
+            await cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+            ''')
+            await cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            END
+            ''')
+            await cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+            ''')
+            await cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def _fts5_query(text: str) -> str:
+    """Каждое слово в кавычках: синтаксис FTS5 из ввода пользователя не интерпретируется"""
+    return " ".join(f'"{term}"' for term in _TERM_RE.findall(text))
+
+
+def _like_pattern(term: str) -> str:
+    return "%" + term.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+
+
+class SearchPager:
+    """Постраничная выдача по релевантности.
+
+    Порядок задаёт оценка полнотекстового поиска, а не столбец таблицы,
+    поэтому страницы идут по смещению; интерфейс тот же, что у KeysetPager.
+    """
+
+    def __init__(self, db: Database, query: str, params: Sequence, page_size: int = 5):
+        self.db = db
+        self.query = query
+        self.params = tuple(params)
+        self.page_size = page_size
+        self.page = 0
+        self.rows: List[Dict[str, Any]] = []
+        self.has_next = False
+
+    @property
+    def page_number(self) -> int:
+        return self.page + 1
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 0
+
+    async def _load(self) -> None:
+        rows = await self.db.fetchall(
+            f"{self.query}\nLIMIT %s OFFSET %s",
+            self.params + (self.page_size + 1, self.page * self.page_size)
+        )
+        self.has_next = len(rows) > self.page_size
+        self.rows = rows[:self.page_size]
+
+    async def first(self) -> List[Dict[str, Any]]:
+        self.page = 0
+        await self._load()
+        return self.rows
+
+    async def next(self) -> List[Dict[str, Any]]:
+        if self.has_next:
+            self.page += 1
+            await self._load()
+        return self.rows
+
+    async def prev(self) -> List[Dict[str, Any]]:
+        if self.has_prev:
+            self.page -= 1
+            await self._load()
+        return self.rows
+
+
+def search_pager(db: Database, table: str, guild_id: int, text: str, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None, page_size: int = 5) -> Optional[SearchPager]:
+    """Поиск по punishments.reason или logs.details; None, если в запросе нет слов"""
+    _, columns = FULLTEXT_INDEXES[table]
+    if table == 'punishments':
+        select = "t.id AS _id, t.user_id, pt.name AS title, t.reason AS text, t.created_at"
+        join = "JOIN punishment_types pt ON t.punishment_type_id = pt.id"
+    else:
+        select = "t.id AS _id, t.user_id, t.action_type AS title, t.details AS text, t.created_at"
+        join = ""
+
+    where = "t.guild_id = %s"
+    filters = [guild_id]
+    if since is not None:
+        where += " AND t.created_at >= %s"
+        filters.append(since)
+    if until is not None:
+        where += " AND t.created_at < %s"
+        filters.append(until)
+
+    if not db.fulltext:
+        # Без полнотекстового индекса: каждое слово должно встретиться в одном из столбцов
+        terms = _TERM_RE.findall(text)
+        if not terms:
+            return None
+        term_filter = " OR ".join(f"t.{c} LIKE %s ESCAPE '!'" for c in columns)
+        query = f'''
+        SELECT {select}, 0 AS _score
+        FROM {table} t
+        {join}
+        WHERE {" AND ".join(f"({term_filter})" for _ in terms)} AND {where}
+        ORDER BY t.id DESC
+        '''
+        params = [_like_pattern(term) for term in terms for _ in columns] + filters
+    elif db.dialect == "sqlite":
+        match = _fts5_query(text)
+        if not match:
+            return None
+        query = f'''
+        SELECT {select}, bm25({table}_fts) AS _score
+        FROM {table}_fts
+        JOIN {table} t ON t.id = {table}_fts.rowid
+        {join}
+        WHERE {table}_fts MATCH %s AND {where}
+        ORDER BY _score, t.id DESC
+        '''
+        params = [match, *filters]
+    else:
+        if not _TERM_RE.search(text):
+            return None
+        against = f"MATCH({', '.join(f't.{c}' for c in columns)}) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        query = f'''
+        SELECT {select}, {against} AS _score
+        FROM {table} t
+        {join}
+        WHERE {against} AND {where}
+        ORDER BY _score DESC, t.id DESC
+        '''
+        params = [text, text, *filters]
+    return SearchPager(db, query, params, page_size)
@@ -0,0 +1,298 @@
+import asyncio
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from Modules.Moderator.database import Database
+from Modules.Moderator.rollup import VoiceRollup
+
+SessionKey = Tuple[int, int]  # (guild_id, user_id)
+
+
+class VoiceActivityBuffer:
+    """Write-behind буфер голосовой активности.
+
+    Открытые сессии живут в памяти и индексируются по (guild_id, user_id)
+    вместе с id строки в базе, поэтому закрытие — это UPDATE по первичному
+    ключу. В базу изменения уходят пачкой по размеру или по таймеру.
+    Закрытые сессии в той же транзакции добавляются в суточные итоги.
+    Каждый сброс отмечает в voice_heartbeat, до какого момента бот видел
+    серверы с открытыми сессиями: этим моментом сверка закрывает сессии,
+    оборванные простоем или разрывом соединения, чтобы простой не
+    засчитывался в голосовое время.
+    """
+
+    def __init__(self, db: Database, flush_size: int = 500, flush_interval: float = 30.0, chunk_size: int = 500,
+                 rollup: Optional[VoiceRollup] = None):
+        self.db = db
+        self.rollup = rollup
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self.sessions: Dict[SessionKey, dict] = {}
+        self._closed: List[dict] = []
+        self._pending = 0
+        self.disconnected_at: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._pending
+
+    @staticmethod
+    def _session(guild_id: int, user_id: int, username: str, channel_id: int, channel_name: str, now: datetime) -> dict:
+        return {
+            'guild_id': guild_id,
+            'user_id': user_id,
+            'username': username,
+            'channel_id': channel_id,
+            'channel_name': channel_name,
+            # TIMESTAMP в MySQL хранит целые секунды, а по join_time ищется id новой строки
+            'join_time': now.replace(microsecond=0),
+            'leave_time': None,
+            'duration_seconds': None,
+            'id': None,
+            'persisted': False
+        }
+
+    def join(self, guild_id: int, user_id: int, username: str, channel_id: int, channel_name: str, now: datetime) -> None:
+        previous = self.sessions.get((guild_id, user_id))
+        if previous is not None:
+            # Выход из прежнего канала не пришёл — закрываем его сессию, а не теряем
+            self._close(previous, now)
+        self.sessions[(guild_id, user_id)] = self._session(guild_id, user_id, username, channel_id, channel_name, now)
+        self._touch()
+
+    def leave(self, guild_id: int, user_id: int, now: datetime) -> None:
+        session = self.sessions.pop((guild_id, user_id), None)
+        if session is None:
+            return
+        self._close(session, now)
+        self._touch()
+
+    @staticmethod
+    def _duration(session: dict, now: datetime) -> int:
+        return max(0, int((now - session['join_time']).total_seconds()))
+
+    def disconnected(self, now: datetime) -> None:
+        """Разрыв с gateway: дальше события могут теряться до следующей сверки"""
+        if self.disconnected_at is None:
+            self.disconnected_at = now
+
+    def resumed(self) -> None:
+        """Сессия gateway возобновлена: пропущенные события доставлены повторно"""
+        self.disconnected_at = None
+
+    def _close(self, session: dict, now: datetime) -> None:
+        now = max(now, session['join_time'])
+        session['leave_time'] = now
+        session['duration_seconds'] = self._duration(session, now)
+        self._closed.append(session)
+
+    def _touch(self) -> None:
+        self._pending += 1
+        if self._pending >= self.flush_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self._safe_flush())
+
+    async def reconcile(
+        self,
+        guild_ids: List[int],
+        voice_states: Dict[SessionKey, Tuple[str, int, str]],
+        now: datetime
+    ) -> Tuple[int, int]:
+        """Сверяет сессии в памяти и открытые строки в базе с голосовыми состояниями.
+
+        Сверяются только серверы из guild_ids (свои для текущего шарда).
+        voice_states — {(guild_id, user_id): (username, channel_id, channel_name)}
+        для всех, кто сейчас в голосовых каналах. Сессии, которых больше
+        нет, закрываются моментом разрыва соединения или последнего сброса
+        (voice_heartbeat), а не моментом сверки. Возвращает количество
+        закрытых и открытых сессий.
+        """
+        rows = []
+        heartbeats = {}
+        for i in range(0, len(guild_ids), self.chunk_size):
+            chunk = guild_ids[i:i + self.chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            rows += await self.db.fetchall(f'''
+            SELECT id, guild_id, user_id, channel_id, channel_name, join_time
+            FROM voice_activity
+            WHERE guild_id IN ({placeholders}) AND leave_time IS NULL
+            ''', chunk)
+            for row in await self.db.fetchall(f'''
+            SELECT guild_id, seen_at FROM voice_heartbeat WHERE guild_id IN ({placeholders})
+            ''', chunk):
+                heartbeats[row['guild_id']] = row['seen_at']
+
+        # Дальше без await: события, пришедшие во время запроса, уже лежат в sessions
+        def last_seen(guild_id: int) -> datetime:
+            seen = self.disconnected_at or heartbeats.get(guild_id) or now
+            return min(seen, now)
+
+        guilds = set(guild_ids)
+        tracked = {s['id'] for s in self.sessions.values() if s['id'] is not None}
+        # Записанные строки, id которых ещё не прочитан, узнаются по времени входа
+        tracked_rows = {
+            (s['guild_id'], s['user_id'], s['channel_id'], s['join_time'])
+            for s in self.sessions.values() if s['persisted'] and s['id'] is None
+        }
+        stale = 0
+        for key, session in list(self.sessions.items()):
+            if key[0] not in guilds:
+                continue
+            state = voice_states.get(key)
+            if state and state[1] == session['channel_id']:
+                continue
+            # Вышел или сменил канал, пока событий не было
+            del self.sessions[key]
+            self._close(session, last_seen(key[0]))
+            stale += 1
+
+        for row in rows:
+            if row['id'] in tracked or (row['guild_id'], row['user_id'], row['channel_id'], row['join_time']) in tracked_rows:
+                continue
+            key = (row['guild_id'], row['user_id'])
+            state = voice_states.get(key)
+            if key not in self.sessions and state and state[1] == row['channel_id']:
+                session = self._session(key[0], row['user_id'], state[0], row['channel_id'], row['channel_name'], row['join_time'])
+                session.update(id=row['id'], persisted=True)
+                self.sessions[key] = session
+            else:
+                session = self._session(key[0], row['user_id'], None, row['channel_id'], row['channel_name'], row['join_time'])
+                session.update(id=row['id'], persisted=True)
+                self._close(session, last_seen(key[0]))
+                stale += 1
+
+        opened = 0
+        for key, (username, channel_id, channel_name) in voice_states.items():
+            if key[0] in guilds and key not in self.sessions:
+                self.sessions[key] = self._session(key[0], key[1], username, channel_id, channel_name, now)
+                opened += 1
+
+        self.disconnected_at = None
+        # Закрытия и новые сессии уходят одной транзакцией
+        await self.flush()
+        return stale, opened
+
+    async def flush(self) -> None:
+        """Сбрасывает накопленные изменения в базу одной транзакцией"""
+        async with self._lock:
+            closed, self._closed = self._closed, []
+            opened = [s for s in self.sessions.values() if not s['persisted']]
+            self._pending = 0
+            if not closed and not opened and not self.sessions:
+                return
+            # Пока соединения нет, отметка не сдвигается дальше момента разрыва
+            seen_at = (self.disconnected_at or datetime.utcnow()).replace(microsecond=0)
+            guild_ids = {s['guild_id'] for s in closed} | {key[0] for key in self.sessions}
+
+            # Помечаем заранее: если сессия закроется во время записи, её закроет UPDATE
+            for session in opened:
+                session['persisted'] = True
+            updates = [s for s in closed if s['persisted']]
+            inserts = [s for s in closed if not s['persisted']]
+
+            try:
+                async with self.db.transaction() as cursor:
+                    # voice_activity ссылается на users, а на вход в канал их никто не заводил
+                    users = {s['user_id']: s['username'] for s in inserts + opened}
+                    if users:
+                        await cursor.execute(f'''
+                        INSERT IGNORE INTO users (user_id, username)
+                        VALUES {", ".join(["(%s, %s)"] * len(users))}
+                        ''', [value for item in users.items() for value in item])
+
+                    by_id = [s for s in updates if s['id'] is not None]
+                    if by_id:
+                        await cursor.executemany('''
+                        UPDATE voice_activity
+                        SET leave_time = %s, duration_seconds = %s
+                        WHERE id = %s
+                        ''', [(s['leave_time'], s['duration_seconds'], s['id']) for s in by_id])
+
+                    # Строка ещё без id (не нашлась после вставки) — закрываем по пользователю
+                    by_user = [s for s in updates if s['id'] is None]
+                    if by_user:
+                        await cursor.executemany('''
+                        UPDATE voice_activity
+                        SET leave_time = %s, duration_seconds = %s
+                        WHERE guild_id = %s AND user_id = %s AND channel_id = %s AND leave_time IS NULL
+                        ''', [(s['leave_time'], s['duration_seconds'], s['guild_id'], s['user_id'], s['channel_id']) for s in by_user])
+
+                    await self._insert(cursor, inserts + opened)
+                    if opened:
+                        await self._fetch_ids(cursor, opened)
+                    if self.rollup is not None:
+                        await self.rollup.apply(cursor, closed)
+
+                    heartbeat = sorted(guild_ids)
+                    for i in range(0, len(heartbeat), self.chunk_size):
+                        chunk = heartbeat[i:i + self.chunk_size]
+                        await cursor.execute(f'''
+                        INSERT INTO voice_heartbeat (guild_id, seen_at)
+                        VALUES {", ".join(["(%s, %s)"] * len(chunk))}
+                        ON DUPLICATE KEY UPDATE seen_at = VALUES(seen_at)
+                        ''', [value for guild_id in chunk for value in (guild_id, seen_at)])
+            except Exception:
+                for session in opened:
+                    session['persisted'] = False
+                self._closed = closed + self._closed
+                self._pending += len(closed) + len(opened)
+                raise
+
+    async def _insert(self, cursor, sessions: List[dict]) -> None:
+        for i in range(0, len(sessions), self.chunk_size):
+            chunk = sessions[i:i + self.chunk_size]
+            await cursor.execute(f'''
+            INSERT INTO voice_activity
+            (guild_id, user_id, channel_id, channel_name, join_time, leave_time, duration_seconds)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(chunk))}
+            ''', [
+                value
+                for s in chunk
+                for value in (s['guild_id'], s['user_id'], s['channel_id'], s['channel_name'],
+                              s['join_time'], s['leave_time'], s['duration_seconds'])
+            ])
+
+    async def _fetch_ids(self, cursor, sessions: List[dict]) -> None:
+        """Заполняет id только что вставленных открытых сессий"""
+        lookup = {(s['guild_id'], s['user_id'], s['channel_id'], s['join_time']): s for s in sessions}
+        user_ids = list({s['user_id'] for s in sessions})
+        for i in range(0, len(user_ids), self.chunk_size):
+            chunk = user_ids[i:i + self.chunk_size]
+            rows = await cursor.fetchall(f'''
+            SELECT id, guild_id, user_id, channel_id, join_time
+            FROM voice_activity
+            WHERE leave_time IS NULL AND user_id IN ({", ".join(["%s"] * len(chunk))})
+            ''', chunk)
+            for row in rows:
+                session = lookup.get((row['guild_id'], row['user_id'], row['channel_id'], row['join_time']))
+                if session is not None:
+                    session['id'] = row['id']
+
+    async def rebuild_rollup(self, guild_id: int, start: date, end: date) -> int:
+        """Пересчёт суточных итогов; сброс буфера на это время приостанавливается"""
+        async with self._lock:
+            return await self.rollup.backfill(guild_id, start, end)
+
+    async def _safe_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Ошибка при сохранении голосовой активности: {e}")
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._safe_flush()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def close(self) -> None:
+        """Останавливает таймер и сбрасывает всё, что ещё не записано"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
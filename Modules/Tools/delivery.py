@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from Modules.Tools.webhook import WebhookClient, WebhookResult
+
+
+class WebhookQueue:
+    """Надёжная очередь доставки вебхуков со спулом на диске.
+
+    Каждое сообщение сначала дописывается в append-only JSONL-спул
+    (запись "put" с fsync), и только потом ставится в очередь; после
+    доставки или окончательной ошибки дописывается "done". При запуске
+    спул перечитывается, и всё без "done" отправляется снова — доставка
+    "хотя бы один раз". В памяти хранится только ключ -> смещение записи,
+    сам payload читается с диска перед отправкой; put ждёт, пока в очереди
+    больше max_pending сообщений. Лимиты Discord и пауза между попытками
+    берутся из общего WebhookClient, повторы — с экспоненциальной паузой.
+    """
+
+    def __init__(self, client: WebhookClient, path: str, workers: int = 4, max_pending: int = 10000,
+                 max_attempts: int = 8, backoff: float = 2.0, max_backoff: float = 600.0,
+                 compact_after: int = 1000, recent_keys: int = 10000):
+        self.client = client
+        self.path = path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.compact_after = compact_after
+        self.recent_keys = recent_keys
+        self.delivered = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+        self._offsets: Dict[str, int] = {}  # ключ -> смещение записи "put"; -1, пока запись пишется
+        self._attempts: Dict[str, int] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self._recent: "OrderedDict[str, None]" = OrderedDict()  # доставленные ключи для дедупликации
+        self._done_since_compact = 0
+        self._writer = None
+        self._reader = None
+        self._io_lock = asyncio.Lock()
+        self._space = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def dedup_key(url: str, payload: Dict[str, Any]) -> str:
+        """Ключ по содержимому: один и тот же payload на тот же URL не уйдёт дважды"""
+        raw = json.dumps([WebhookClient.bucket_key(url), payload], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @property
+    def pending(self) -> int:
+        return len(self._offsets)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pending': self.pending,
+            'retrying': sum(1 for attempts in self._attempts.values() if attempts),
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'last_error': self.last_error,
+        }
+
+    # --- Спул (вызывается в потоке пула, под _io_lock) ---
+
+    def _open_sync(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        offsets: Dict[str, int] = {}
+        good = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                while True:
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line:
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # оборванная последняя запись после падения
+                    if not line.endswith(b"\n"):
+                        break
+                    good = f.tell()
+                    if record['op'] == 'put':
+                        offsets[record['key']] = offset
+                        self._recent.pop(record['key'], None)
+                    elif record['op'] == 'done':
+                        offsets.pop(record['key'], None)
+                        self._remember(record['key'])
+            if good < os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(good)
+        self._writer = open(self.path, 'ab')
+        self._reader = open(self.path, 'rb')
+        self._offsets = offsets
+        self._done_since_compact = 0
+
+    def _append_sync(self, lines: List[bytes]) -> List[int]:
+        offsets = []
+        for line in lines:
+            offsets.append(self._writer.tell())
+            self._writer.write(line)
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+        return offsets
+
+    def _read_sync(self, offset: int) -> Dict[str, Any]:
+        self._reader.seek(offset)
+        return json.loads(self._reader.readline())
+
+    def _compact_sync(self, offsets: Dict[str, int], recent: List[str]) -> Dict[str, int]:
+        """Переписывает спул, оставляя недоставленные "put"; заменяет файл атомарно.
+
+        Ключи из recent сохраняются записями "done" без payload: иначе после
+        перезапуска дедупликация забыла бы всё доставленное до сжатия.
+        """
+        tmp = self.path + '.tmp'
+        moved = {}
+        with open(tmp, 'wb') as dst:
+            for key in recent:
+                dst.write(json.dumps({'op': 'done', 'key': key}).encode('utf-8') + b"\n")
+            for key, offset in offsets.items():
+                if offset < 0:
+                    continue
+                self._reader.seek(offset)
+                moved[key] = dst.tell()
+                dst.write(self._reader.readline())
+            dst.flush()
+            os.fsync(dst.fileno())
+        self._writer.close()
+        self._reader.close()
+        os.replace(tmp, self.path)
+        self._writer = open(self.path, 'ab')
+        self._reader = open(self.path, 'rb')
+        return moved
+
+    def _close_sync(self) -> None:
+        for f in (self._writer, self._reader):
+            if f is not None:
+                f.close()
+        self._writer = self._reader = None
+
+    async def _io(self, func, *args):
+        async with self._io_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    # --- Очередь ---
+
+    def _remember(self, key: str) -> None:
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.recent_keys:
+            self._recent.popitem(last=False)
+
+    def _schedule(self, key: str, delay: float = 0.0) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (asyncio.get_running_loop().time() + delay, self._seq, key))
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        """Перечитывает спул и запускает обработчики; повторный вызов ничего не делает"""
+        if self._tasks:
+            return
+        await self._io(self._open_sync)
+        for key in self._offsets:
+            self._attempts[key] = 0
+            self._schedule(key)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        """Останавливает обработчики; недоставленное остаётся в спуле до следующего запуска"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._heap.clear()
+        await self._io(self._close_sync)
+
+    async def _commit(self, accepted: List[Tuple[str, bytes]]) -> None:
+        try:
+            offsets = await self._io(self._append_sync, [line for _, line in accepted])
+        except BaseException:
+            for key, _ in accepted:
+                self._offsets.pop(key, None)
+            raise
+        for (key, _), offset in zip(accepted, offsets):
+            self._offsets[key] = offset
+            self._attempts[key] = 0
+            self._schedule(key)
+
+    async def put_many(self, items: Iterable[Tuple[str, Dict[str, Any], Optional[str]]]) -> int:
+        """Ставит в очередь (url, payload, ключ), записывая на диск пачками.
+
+        Ключ None вычисляется по содержимому. Повторы уже стоящих в очереди
+        или недавно доставленных ключей пропускаются. Если очередь полна,
+        накопленное записывается и put ждёт, пока обработчики освободят
+        место. Возвращает число принятых сообщений.
+        """
+        accepted: List[Tuple[str, bytes]] = []
+        total = 0
+        for url, payload, key in items:
+            key = key or self.dedup_key(url, payload)
+            if key in self._offsets or key in self._recent:
+                continue
+            if len(self._offsets) >= self.max_pending:
+                if accepted:
+                    await self._commit(accepted)
+                    total += len(accepted)
+                    accepted = []
+                async with self._space:
+                    await self._space.wait_for(lambda: len(self._offsets) < self.max_pending)
+                if key in self._offsets or key in self._recent:
+                    continue
+            self._offsets[key] = -1
+            record = {'op': 'put', 'key': key, 'url': url, 'payload': payload, 'ts': time.time()}
+            accepted.append((key, json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n"))
+        if accepted:
+            await self._commit(accepted)
+            total += len(accepted)
+        return total
+
+    async def put(self, url: str, payload: Dict[str, Any], key: Optional[str] = None) -> bool:
+        return await self.put_many([(url, payload, key)]) == 1
+
+    async def _next_due(self) -> str:
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = None
+            if self._heap:
+                delay = self._heap[0][0] - loop.time()
+                if delay <= 0:
+                    return heapq.heappop(self._heap)[2]
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _finish(self, key: str, ok: bool) -> None:
+        record = {'op': 'done', 'key': key, 'ok': ok}
+        await self._io(self._append_sync, [json.dumps(record).encode('utf-8') + b"\n"])
+        self._offsets.pop(key, None)
+        self._attempts.pop(key, None)
+        self._remember(key)
+        if ok:
+            self.delivered += 1
+        else:
+            self.failed += 1
+        async with self._space:
+            self._space.notify_all()
+        self._done_since_compact += 1
+        if self._done_since_compact >= self.compact_after:
+            self._done_since_compact = 0
+            async with self._io_lock:
+                moved = await asyncio.get_running_loop().run_in_executor(
+                    None, self._compact_sync, dict(self._offsets), list(self._recent)
+                )
+                # Запись могла завершиться, пока спул переписывался
+                self._offsets = {k: moved.get(k, v) for k, v in self._offsets.items()}
+
+    async def _deliver(self, key: str) -> None:
+        offset = self._offsets.get(key, -1)
+        if offset < 0:
+            return
+        async with self._io_lock:
+            record = await asyncio.get_running_loop().run_in_executor(None, self._read_sync, self._offsets[key])
+        # Повторы здесь, а не в клиенте: между попытками очередь обслуживает другие вебхуки
+        result: WebhookResult = await self.client.send(record['url'], record['payload'], max_retries=0)
+        if result.ok:
+            return await self._finish(key, True)
+        self.last_error = result.error
+        attempts = self._attempts.get(key, 0) + 1
+        permanent = result.status is not None and 400 <= result.status < 500 and result.status != 429
+        if permanent or attempts >= self.max_attempts:
+            return await self._finish(key, False)
+        self._attempts[key] = attempts
+        self._schedule(key, min(self.backoff * 2 ** (attempts - 1), self.max_backoff))
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._next_due()
+            try:
+                await self._deliver(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Сбой диска или клиента: сообщение остаётся в спуле и ждёт повтора
+                self.last_error = str(e) or type(e).__name__
+                if key in self._offsets:
+                    self._schedule(key, self.max_backoff)
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from Modules.Tools.rcon import RCONError, RCONPools
+
+
+class FleetServer(NamedTuple):
+    id: str
+    host: str
+    port: int
+    password: str
+    groups: tuple
+
+
+class FleetResult(NamedTuple):
+    server: FleetServer
+    ok: bool
+    output: str
+    elapsed: float
+
+
+def parse_servers(data: dict, default_port: int, default_password: Optional[str]) -> Dict[str, FleetServer]:
+    """Серверы из Saves/Minecraft/data.json.
+
+    Используются поля записи address ("host" или "host:port" игрового
+    порта), rcon_port, rcon_password и groups; без пароля (ни в записи, ни
+    по умолчанию) сервер в рассылку не попадает. Группа "all" есть у всех.
+    """
+    servers = {}
+    for server_id, entry in data.items():
+        if not isinstance(entry, dict) or not entry.get('address'):
+            continue
+        password = entry.get('rcon_password') or default_password
+        if not password:
+            continue
+        host = str(entry['address']).rsplit(':', 1)[0]
+        groups = ('all', *entry.get('groups', ()))
+        servers[server_id] = FleetServer(
+            server_id, host, int(entry.get('rcon_port') or default_port), password, groups
+        )
+    return servers
+
+
+class RCONFleet:
+    """Одна команда на группу серверов.
+
+    Серверы опрашиваются параллельно, не больше concurrency одновременно;
+    на каждый сервер (подключение + команда) даётся timeout секунд, и
+    недоступный сервер не задерживает остальные. Соединения остаются в
+    общих пулах между вызовами. Список серверов перечитывается, только
+    если файл изменился.
+    """
+
+    def __init__(self, path: str, pools: RCONPools, concurrency: int = 10, timeout: float = 5.0,
+                 default_port: int = 25575, default_password: Optional[str] = None):
+        self.path = path
+        self.pools = pools
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.default_port = default_port
+        self.default_password = default_password
+        self._servers: Dict[str, FleetServer] = {}
+        self._mtime: Optional[float] = None
+
+    def servers(self, group: str = 'all') -> List[FleetServer]:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return []
+        if mtime != self._mtime:
+            with open(self.path, encoding='utf-8') as f:
+                self._servers = parse_servers(json.load(f), self.default_port, self.default_password)
+            self._mtime = mtime
+        return [server for server in self._servers.values() if group in server.groups]
+
+    def groups(self) -> List[str]:
+        return sorted({group for server in self.servers() for group in server.groups})
+
+    async def _run(self, server: FleetServer, command: str, semaphore: asyncio.Semaphore) -> FleetResult:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                pool = await self.pools.get(server.host, server.port, server.password)
+                output = await asyncio.wait_for(pool.send_command(command), timeout=self.timeout)
+                return FleetResult(server, True, output, time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                return FleetResult(server, False, "Таймаут", time.perf_counter() - started)
+            except (RCONError, OSError) as e:
+                return FleetResult(server, False, str(e) or type(e).__name__, time.perf_counter() - started)
+
+    async def broadcast(self, group: str, command: str) -> List[FleetResult]:
+        """Выполняет команду на всех серверах группы; результаты в порядке списка"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self._run(server, command, semaphore) for server in self.servers(group)))
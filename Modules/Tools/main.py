@@ -1,10 +1,46 @@
 import discord
 from discord.ext import bridge, commands
-import requests, json
+import json
+from config import TOOLS
+from Modules.Tools.delivery import WebhookQueue
+from Modules.Tools.fleet import RCONFleet
+from Modules.Tools.rcon import RCONPools
+from Modules.Tools.webhook import WebhookClient
 
 class Tools(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # Общая сессия создаётся в on_ready, поэтому берётся при каждом запросе
+        self.webhooks = WebhookClient(lambda: self.bot.http_session)
+        self.webhook_queue = WebhookQueue(
+            self.webhooks,
+            TOOLS["webhook_spool"],
+            workers=TOOLS["webhook_workers"],
+            max_pending=TOOLS["webhook_max_pending"],
+            max_attempts=TOOLS["webhook_max_attempts"],
+            backoff=TOOLS["webhook_backoff"],
+            max_backoff=TOOLS["webhook_max_backoff"],
+            compact_after=TOOLS["webhook_compact_after"]
+        )
+        self.bot.loop.create_task(self.webhook_queue.start())
+        # Соединения с серверами живут между вызовами /rcon
+        self.rcon_pools = RCONPools(
+            size=TOOLS["rcon_pool_size"],
+            timeout=TOOLS["rcon_timeout"],
+            keepalive=TOOLS["rcon_keepalive"]
+        )
+        self.fleet = RCONFleet(
+            TOOLS["rcon_fleet"],
+            self.rcon_pools,
+            concurrency=TOOLS["rcon_concurrency"],
+            timeout=TOOLS["rcon_timeout"],
+            default_port=TOOLS["rcon_port"],
+            default_password=TOOLS["rcon_password"]
+        )
+
+    def cog_unload(self):
+        self.bot.loop.create_task(self.webhook_queue.close())
+        self.bot.loop.create_task(self.rcon_pools.close())
     
     @staticmethod
     async def get_color(color_name: str) -> int:
@@ -28,36 +64,103 @@ class Tools(commands.Cog):
             return await ctx.respond(embed=embed, view=view)
 
     @bridge.bridge_command()
-    async def webhook(self, ctx: bridge.BridgeContext, url: str = None):
-        """Отправляет вебхук с прикреплённым JSON-файлом"""
+    async def webhook(self, ctx: bridge.BridgeContext, url: str = None, queued: bool = False):
+        """Отправляет вебхук с прикреплённым JSON-файлом (или несколькими)"""
         if not url:
             embed = discord.Embed(
                 title="Webhook Help",
                 description="Использование:\n"
-                           "`/webhook <url>` с прикреплённым JSON-файлом\n\n"
+                           "`/webhook <url>` с прикреплённым JSON-файлом\n"
+                           "Несколько файлов или JSON-массив отправляются пачкой\n"
+                           "`/webhook <url> true` — через очередь с повторами (переживает перезапуск)\n\n"
                            "[Гайд по вебхукам](https://birdie0.github.io/discord-webhooks-guide/)",
                 color=await self.get_color("blue")
             )
             return await ctx.respond(embed=embed)
         
-        if not ctx.message.attachments:
+        message = getattr(ctx, 'message', None)
+        attachments = message.attachments if message else []
+        if not attachments:
             return await ctx.respond("Прикрепите JSON-файл!", ephemeral=True)
-        
-        attachment = ctx.message.attachments[0]
-        if not attachment.filename.endswith('.json'):
+        if not all(attachment.filename.endswith('.json') for attachment in attachments):
             return await ctx.respond("Файл должен быть в формате JSON!", ephemeral=True)
         
+        payloads = []
         try:
-            file_content = await attachment.read()
-            data = json.loads(file_content.decode('utf-8'))
-            
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(url, json=data, headers=headers)
-            response.raise_for_status()
-            
-            await ctx.respond("Вебхук успешно отправлен!", ephemeral=True)
-        except Exception as e:
-            await ctx.respond(f"Ошибка: {str(e)}", ephemeral=True)
+            for attachment in attachments:
+                data = json.loads((await attachment.read()).decode('utf-8'))
+                payloads.extend(data if isinstance(data, list) else [data])
+        except ValueError as e:
+            return await ctx.respond(f"Ошибка в JSON: {str(e)}", ephemeral=True)
+        
+        if queued:
+            # Ключ от сообщения: повторный вызов той же команды не задвоит отправку
+            accepted = await self.webhook_queue.put_many(
+                (url, payload, f"{message.id}:{number}") for number, payload in enumerate(payloads)
+            )
+            stats = self.webhook_queue.stats()
+            return await ctx.respond(
+                f"В очередь поставлено {accepted} из {len(payloads)}, ожидают отправки: {stats['pending']}",
+                ephemeral=True
+            )
+        
+        if len(payloads) == 1:
+            result = await self.webhooks.send(url, payloads[0])
+            if result.ok:
+                return await ctx.respond("Вебхук успешно отправлен!", ephemeral=True)
+            return await ctx.respond(f"Ошибка: {result.error}", ephemeral=True)
+        
+        results = await self.webhooks.send_many(url, payloads)
+        sent = sum(1 for result in results if result.ok)
+        lines = [
+            f"`#{number}` " + (f"✅ {result.status}" if result.ok else f"❌ {result.error}")
+            + (f" (попыток: {result.attempts})" if result.attempts > 1 else "")
+            for number, result in enumerate(results, start=1)
+        ]
+        embed = discord.Embed(
+            title=f"Отправлено {sent} из {len(results)}",
+            description="\n".join(lines)[:4096],
+            color=await self.get_color("green" if sent == len(results) else "red")
+        )
+        await ctx.respond(embed=embed, ephemeral=True)
+
+    @bridge.bridge_command()
+    async def webhookqueue(self, ctx: bridge.BridgeContext):
+        """Состояние очереди вебхуков"""
+        stats = self.webhook_queue.stats()
+        embed = discord.Embed(
+            title="Очередь вебхуков",
+            description=f"Ожидают: {stats['pending']} (из них на повторе: {stats['retrying']})\n"
+                        f"Доставлено: {stats['delivered']}\n"
+                        f"Отброшено: {stats['failed']}",
+            color=await self.get_color("blue")
+        )
+        if stats['last_error']:
+            embed.add_field(name="Последняя ошибка", value=stats['last_error'][:1024], inline=False)
+        await ctx.respond(embed=embed)
+
+    rcon = discord.SlashCommandGroup("rcon", "Команды игровым серверам по RCON")
+
+    @rcon.command(name="broadcast", description="Выполнить команду на группе серверов")
+    async def rcon_broadcast(
+        self,
+        ctx,
+        command: discord.Option(str, "Команда без /"),
+        group: discord.Option(str, "Группа серверов", required=False, default="all")
+    ):
+        """Одна команда параллельно на всех серверах группы"""
+        if not ctx.author.guild_permissions.administrator:
+            return await ctx.respond("Недостаточно прав", ephemeral=True)
+        servers = self.fleet.servers(group)
+        if not servers:
+            groups = ", ".join(self.fleet.groups()) or "нет"
+            return await ctx.respond(f"В группе `{group}` нет серверов. Группы: {groups}", ephemeral=True)
+
+        await ctx.defer(ephemeral=True)
+        results = await self.fleet.broadcast(group, command)
+        view = FleetView(ctx.author.id, command, group, results)
+        view.update_buttons()
+        await ctx.respond(embed=view.build_embed(), view=view, ephemeral=True)
 
     @bridge.bridge_command()
     async def color(self, ctx: bridge.BridgeContext, color_name: str):
@@ -70,5 +173,58 @@ class Tools(commands.Cog):
         )
         await ctx.respond(embed=embed)
 
+class FleetView(discord.ui.View):
+    PAGE_SIZE = 5
+
+    def __init__(self, author_id, command, group, results, *args, **kwargs):
+        super().__init__(*args, timeout=300, **kwargs)
+        self.author_id = author_id
+        self.command = command
+        self.group = group
+        self.results = results
+        self.page = 0
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-len(self.results) // self.PAGE_SIZE))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    def build_embed(self) -> discord.Embed:
+        ok = sum(1 for result in self.results if result.ok)
+        embed = discord.Embed(
+            title=f"RCON: {self.command}"[:256],
+            description=f"Группа `{self.group}`: успешно {ok} из {len(self.results)}, стр. {self.page + 1}/{self.pages}",
+            color=discord.Color.green() if ok == len(self.results) else discord.Color.red()
+        )
+        start = self.page * self.PAGE_SIZE
+        for result in self.results[start:start + self.PAGE_SIZE]:
+            output = result.output.strip() or "(пустой ответ)"
+            embed.add_field(
+                name=f"{'✅' if result.ok else '❌'} {result.server.host}:{result.server.port} ({result.elapsed:.2f} с)"[:256],
+                value=f"```\n{output[:1000]}\n```",
+                inline=False
+            )
+        return embed
+
+    def update_buttons(self):
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def _show(self, interaction: discord.Interaction):
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, button, interaction):
+        self.page = max(0, self.page - 1)
+        await self._show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, button, interaction):
+        self.page = min(self.pages - 1, self.page + 1)
+        await self._show(interaction)
+
 def setup(bot):
     bot.add_cog(Tools(bot))
\ No newline at end of file
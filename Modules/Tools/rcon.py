@@ -1,11 +1,49 @@
 import asyncio
+import codecs
+import socket
 import struct
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+# Типы пакетов протокола Source RCON (Minecraft использует тот же)
+SERVERDATA_RESPONSE_VALUE = 0
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_AUTH = 3
+
+# Предел размера входящего пакета: защита от мусора вместо заголовка
+MAX_PACKET_SIZE = 1 << 20
+
+_INT = struct.Struct('<i')
+
 
 class RCONError(Exception):
     pass
 
+
+class _Response:
+    """Ответ на одну команду: тело копится байтами, либо отдаётся кусками в очередь"""
+    __slots__ = ('future', 'data', 'chunks', 'sentinel_id')
+
+    def __init__(self, future: asyncio.Future, sentinel_id: int, stream: bool = False):
+        self.future = future
+        self.sentinel_id = sentinel_id
+        self.data = bytearray()
+        self.chunks: Optional[asyncio.Queue] = asyncio.Queue() if stream else None
+
+
 class RCONClient:
+    """Одно RCON-соединение с конвейерной отправкой команд.
+
+    Ответы разбирает отдельная задача-читатель и раздаёт их ожидающим
+    командам по id запроса, поэтому на соединении может быть сколько
+    угодно команд в полёте одновременно.
+
+    Конец ответа определяется сторожевым пакетом: сразу за командой уходит
+    пустой RESPONSE_VALUE со своим id. Сервер отвечает на пакеты по порядку,
+    поэтому эхо сторожа приходит строго после последнего куска ответа —
+    независимо от того, сколько пакетов в ответе и какой они длины.
+    """
+
     def __init__(self, host: str, port: int, password: str, timeout: float = 5.0):
         self.host = host
         self.port = port
@@ -14,6 +52,23 @@ class RCONClient:
         self.reader: Optional[asyncio.StreamReader] = None
         self.writer: Optional[asyncio.StreamWriter] = None
         self._request_id = 0
+        self._pending: Dict[int, _Response] = {}
+        self._sentinels: Dict[int, int] = {}  # id сторожа -> id команды
+        self._reader_task: Optional[asyncio.Task] = None
+        self.last_used = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and self._reader_task is not None and not self._reader_task.done()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def _next_id(self) -> int:
+        # id -1 сервер возвращает при неверном пароле, поэтому идём только по положительным
+        self._request_id = self._request_id % 0x7FFFFFFF + 1
+        return self._request_id
 
     async def connect(self) -> None:
         """Установка соединения с RCON-сервером"""
@@ -22,96 +77,236 @@ class RCONClient:
                 asyncio.open_connection(self.host, self.port),
                 timeout=self.timeout
             )
-            await self._authenticate()
-        except (asyncio.TimeoutError, ConnectionRefusedError) as e:
-            raise RCONError(f"Connection failed: {str(e)}") from e
+            sock = self.writer.get_extra_info('socket')
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            await asyncio.wait_for(self._authenticate(), timeout=self.timeout)
+        except (asyncio.TimeoutError, OSError) as e:
+            await self.close()
+            raise RCONError(f"Connection failed: {str(e) or type(e).__name__}") from e
+        except asyncio.CancelledError:
+            # Таймаут вызывающего посреди подключения: сокет не должен остаться висеть
+            if self.writer:
+                self.writer.close()
+            raise
+        self.last_used = asyncio.get_running_loop().time()
+        self._reader_task = asyncio.create_task(self._read_loop())
 
     async def close(self) -> None:
         """Закрытие соединения"""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+        self._fail_pending(RCONError("Connection closed"))
         if self.writer:
             self.writer.close()
-            await self.writer.wait_closed()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
             self.writer = None
             self.reader = None
 
-    async def send_command(self, command: str) -> str:
-        """Отправка команды на сервер"""
-        if not self.writer or not self.reader:
+    def _fail_pending(self, error: Exception) -> None:
+        pending, self._pending = self._pending, {}
+        self._sentinels.clear()
+        for response in pending.values():
+            if not response.future.done():
+                response.future.set_exception(error)
+            if response.chunks is not None:
+                response.chunks.put_nowait(error)
+
+    def _submit(self, command: str, ptype: int = SERVERDATA_EXECCOMMAND, stream: bool = False) -> Tuple[int, _Response]:
+        if not self.connected:
             raise RCONError("Not connected")
+        request_id = self._next_id()
+        future = asyncio.get_running_loop().create_future()
+        if ptype == SERVERDATA_RESPONSE_VALUE:
+            # Пустой RESPONSE_VALUE сам себе сторож: ответ на него — один пакет
+            sentinel_id = request_id
+            packet = self._create_packet(ptype, command, request_id)
+        else:
+            sentinel_id = self._next_id()
+            packet = (self._create_packet(ptype, command, request_id)
+                      + self._create_packet(SERVERDATA_RESPONSE_VALUE, "", sentinel_id))
+        response = self._pending[request_id] = _Response(future, sentinel_id, stream)
+        self._sentinels[sentinel_id] = request_id
+        self.writer.write(packet)
+        return request_id, response
 
-        self._request_id += 1
-        packet = self._create_packet(2, command)
-        
+    def _forget(self, request_id: int) -> None:
+        response = self._pending.pop(request_id, None)
+        if response is not None:
+            self._sentinels.pop(response.sentinel_id, None)
+
+    async def _drain(self, request_ids: List[int]) -> None:
         try:
-            self.writer.write(packet)
             await asyncio.wait_for(self.writer.drain(), timeout=self.timeout)
-            
-            response = await self._read_response(self._request_id)
-            return response.strip('\x00')
+        except (asyncio.TimeoutError, OSError) as e:
+            for request_id in request_ids:
+                self._forget(request_id)
+            raise RCONError("Command timed out" if isinstance(e, asyncio.TimeoutError) else "Connection lost") from e
+
+    async def _wait(self, request_id: int, response: _Response) -> str:
+        try:
+            return await asyncio.wait_for(asyncio.shield(response.future), timeout=self.timeout)
         except asyncio.TimeoutError as e:
             raise RCONError("Command timed out") from e
+        finally:
+            # Ответ, пришедший после таймаута, читатель просто отбросит
+            self._forget(request_id)
+            self.last_used = asyncio.get_running_loop().time()
+
+    async def send_command(self, command: str) -> str:
+        """Отправка команды на сервер"""
+        request_id, response = self._submit(command)
+        await self._drain([request_id])
+        return (await self._wait(request_id, response)).strip('\x00')
+
+    async def send_many(self, commands: List[str]) -> List[str]:
+        """Отправляет команды одним пакетом записи; ответы в порядке команд"""
+        submitted = [self._submit(command) for command in commands]
+        await self._drain([request_id for request_id, _ in submitted])
+        results = await asyncio.gather(*(self._wait(request_id, response) for request_id, response in submitted))
+        return [result.strip('\x00') for result in results]
+
+    async def stream(self, command: str) -> AsyncIterator[str]:
+        """Ответ по кускам, по мере прихода пакетов.
+
+        Таймаут считается между кусками, поэтому длинный вывод не упирается
+        в общий предел. Многобайтовый символ на стыке пакетов не рвётся.
+        """
+        request_id, response = self._submit(command, stream=True)
+        await self._drain([request_id])
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(response.chunks.get(), timeout=self.timeout)
+                except asyncio.TimeoutError as e:
+                    raise RCONError("Command timed out") from e
+                if isinstance(chunk, Exception):
+                    raise chunk
+                text = decoder.decode(chunk or b"", final=chunk is None)
+                if text:
+                    yield text
+                if chunk is None:
+                    return
+        finally:
+            self._forget(request_id)
+            self.last_used = asyncio.get_running_loop().time()
+
+    async def ping(self) -> None:
+        """Проверка соединения пустым пакетом RESPONSE_VALUE.
+
+        Source возвращает его зеркально, Minecraft — ответом "Unknown request"
+        с тем же id; в обоих случаях приходит один пакет.
+        """
+        request_id, response = self._submit("", SERVERDATA_RESPONSE_VALUE)
+        await self._drain([request_id])
+        await self._wait(request_id, response)
 
     async def _authenticate(self) -> None:
         """Аутентификация на сервере"""
-        auth_packet = self._create_packet(3, self.password)
-        self.writer.write(auth_packet)
+        request_id = self._next_id()
+        self.writer.write(self._create_packet(SERVERDATA_AUTH, self.password, request_id))
         await self.writer.drain()
 
-        response = await self._read_packet()
-        if response['id'] == -1 or response['type'] != 2:
-            await self.close()
+        while True:
+            response = await self._read_packet()
+            # Source перед AUTH_RESPONSE присылает пустой RESPONSE_VALUE
+            if response['type'] == SERVERDATA_AUTH_RESPONSE:
+                break
+        if response['id'] == -1 or response['id'] != request_id:
             raise RCONError("Authentication failed")
 
-    def _create_packet(self, ptype: int, body: str) -> bytes:
+    async def _read_loop(self) -> None:
+        """Разбор пакетов из одного растущего буфера без копии на каждый пакет"""
+        buffer = bytearray()
+        try:
+            while True:
+                data = await self.reader.read(65536)
+                if not data:
+                    raise RCONError("Connection lost")
+                buffer += data
+                consumed = self._parse_frames(buffer)
+                if consumed:
+                    del buffer[:consumed]
+        except asyncio.CancelledError:
+            raise
+        except (RCONError, OSError) as e:
+            self._fail_pending(e if isinstance(e, RCONError) else RCONError("Connection lost"))
+            if self.writer:
+                self.writer.close()
+
+    def _parse_frames(self, buffer: bytearray) -> int:
+        """Раздаёт все целые пакеты из буфера; возвращает число разобранных байт"""
+        offset = 0
+        end = len(buffer)
+        # memoryview должен быть отпущен до того, как буфер укоротят
+        with memoryview(buffer) as view:
+            while end - offset >= 4:
+                size = _INT.unpack_from(view, offset)[0]
+                if not 10 <= size <= MAX_PACKET_SIZE:
+                    raise RCONError(f"Invalid packet size: {size}")
+                if end - offset - 4 < size:
+                    break
+                # Пакет: длина, id, тип, тело, два нулевых байта
+                packet_id = _INT.unpack_from(view, offset + 4)[0]
+                self._dispatch(packet_id, view[offset + 12:offset + 4 + size - 2])
+                offset += 4 + size
+        return offset
+
+    def _dispatch(self, packet_id: int, body: memoryview) -> None:
+        request_id = self._sentinels.pop(packet_id, None)
+        if request_id is not None:
+            # Эхо сторожа: все пакеты ответа уже пришли
+            response = self._pending.pop(request_id, None)
+            if response is None:
+                return
+            if response.chunks is not None:
+                response.chunks.put_nowait(None)
+            if not response.future.done():
+                response.future.set_result(response.data.decode('utf-8', errors='replace'))
+            return
+        response = self._pending.get(packet_id)
+        if response is None:
+            return  # опоздавший ответ или второй пакет эха сторожа у Source
+        if response.chunks is not None:
+            response.chunks.put_nowait(bytes(body))
+        else:
+            response.data += body
+
+    @staticmethod
+    def _create_packet(ptype: int, body: str, packet_id: int) -> bytes:
         """Создание RCON-пакета"""
         body_bytes = body.encode('utf-8') + b'\x00\x00'
-        packet_id = self._request_id
-        packet = struct.pack('<3i', 
-                            len(body_bytes) + 10,  # Длина пакета
-                            packet_id,              # ID запроса
-                            ptype)                  # Тип пакета
+        packet = struct.pack('<3i',
+                            len(body_bytes) + 8,  # Длина пакета (id + тип + тело)
+                            packet_id,            # ID запроса
+                            ptype)                # Тип пакета
         packet += body_bytes
         return packet
 
-    async def _read_response(self, expected_id: int) -> str:
-        """Чтение ответа от сервера (с обработкой многопакетных ответов)"""
-        response = []
-        while True:
-            packet = await self._read_packet()
-            
-            if packet['id'] != expected_id:
-                raise RCONError("Invalid response ID")
-            
-            response.append(packet['body'])
-            
-            # Проверка на завершение пакета (для Source Engine)
-            if len(packet['body']) < 4096:
-                break
-                
-        return ''.join(response)
-
     async def _read_packet(self) -> dict:
-        """Чтение и парсинг одного RCON-пакета"""
+        """Чтение одного пакета до запуска читателя (при аутентификации)"""
         try:
             # Чтение длины пакета (4 байта, little-endian)
-            size_data = await asyncio.wait_for(
-                self.reader.readexactly(4),
-                timeout=self.timeout
-            )
+            size_data = await self.reader.readexactly(4)
             size = struct.unpack('<i', size_data)[0]
+            if not 10 <= size <= MAX_PACKET_SIZE:
+                raise RCONError(f"Invalid packet size: {size}")
 
             # Чтение остальных данных пакета
-            packet_data = await asyncio.wait_for(
-                self.reader.readexactly(size),
-                timeout=self.timeout
-            )
+            packet_data = await self.reader.readexactly(size)
         except asyncio.IncompleteReadError as e:
             raise RCONError("Connection lost") from e
 
         # Распаковка заголовка пакета
         packet_id, ptype = struct.unpack('<2i', packet_data[:8])
         body = packet_data[8:-2].decode('utf-8', errors='replace')
-        
+
         return {
             'id': packet_id,
             'type': ptype,
@@ -123,4 +318,98 @@ class RCONClient:
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.close()
\ No newline at end of file
+        await self.close()
+
+
+class RCONPool:
+    """Пул RCON-соединений к одному серверу (host, port).
+
+    Соединения открываются лениво, до size штук; команда уходит в наименее
+    загруженное живое соединение. Разорванные соединения заменяются новыми
+    с повторной аутентификацией, простаивающие раз в keepalive секунд
+    проверяются ping и закрываются, если сервер не ответил.
+    """
+
+    def __init__(self, host: str, port: int, password: str, size: int = 2,
+                 timeout: float = 5.0, keepalive: float = 30.0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self._clients: List[RCONClient] = []
+        self._connecting = asyncio.Lock()
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    async def _acquire(self) -> RCONClient:
+        self._clients = [client for client in self._clients if client.connected]
+        idle = [client for client in self._clients if not client.in_flight]
+        if idle or len(self._clients) >= self.size:
+            return min(idle or self._clients, key=lambda client: client.in_flight)
+        async with self._connecting:
+            # Пока ждали блокировку, соединение мог открыть кто-то другой
+            self._clients = [client for client in self._clients if client.connected]
+            if len(self._clients) < self.size:
+                client = RCONClient(self.host, self.port, self.password, self.timeout)
+                await client.connect()
+                self._clients.append(client)
+                if self._keepalive_task is None and self.keepalive:
+                    self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+                return client
+        return min(self._clients, key=lambda client: client.in_flight)
+
+    async def send_command(self, command: str) -> str:
+        return await (await self._acquire()).send_command(command)
+
+    async def send_many(self, commands: List[str]) -> List[str]:
+        """Все команды конвейером по одному соединению; ответы в порядке команд"""
+        return await (await self._acquire()).send_many(commands)
+
+    async def _keepalive_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.keepalive)
+            for client in list(self._clients):
+                if not client.connected:
+                    continue
+                if client.in_flight or loop.time() - client.last_used < self.keepalive:
+                    continue
+                try:
+                    await client.ping()
+                except (RCONError, OSError):
+                    await client.close()
+            self._clients = [client for client in self._clients if client.connected]
+
+    async def close(self) -> None:
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            await asyncio.gather(self._keepalive_task, return_exceptions=True)
+            self._keepalive_task = None
+        clients, self._clients = self._clients, []
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+
+class RCONPools:
+    """Пулы по (host, port); смена пароля пересоздаёт пул"""
+
+    def __init__(self, size: int = 2, timeout: float = 5.0, keepalive: float = 30.0):
+        self.size = size
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self._pools: Dict[Tuple[str, int], RCONPool] = {}
+
+    async def get(self, host: str, port: int, password: str) -> RCONPool:
+        pool = self._pools.get((host, port))
+        if pool is not None and pool.password != password:
+            await pool.close()
+            pool = None
+        if pool is None:
+            pool = self._pools[(host, port)] = RCONPool(
+                host, port, password, self.size, self.timeout, self.keepalive
+            )
+        return pool
+
+    async def close(self) -> None:
+        pools, self._pools = list(self._pools.values()), {}
+        await asyncio.gather(*(pool.close() for pool in pools), return_exceptions=True)
@@ -1,9 +1,138 @@
-import requests, json
+import asyncio
+import json
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
 
-with open('webhook.json') as json_file:
-    data = json.load(json_file)
+import aiohttp
 
-url = 'https://discord.com/api/webhooks/1327708083836686456/zv2mXeZ76aVruKIgSYKOh7x6_6IgBKYSwkfWKXwFKLe_bQw57JoSzzKaUbbR6ES7UQap'
-headers={"Content-Type": "application/json"}
+# Вебхук определяется id и токеном; query-параметры (wait, thread_id) на лимиты не влияют
+_WEBHOOK_RE = re.compile(r"/webhooks/(\d+)/([\w-]+)")
 
-requests.post(url, data=json.dumps(data), headers=headers)
\ No newline at end of file
+
+class WebhookResult(NamedTuple):
+    ok: bool
+    status: Optional[int]
+    attempts: int
+    error: Optional[str] = None
+
+
+class _Bucket:
+    __slots__ = ('remaining', 'reset_at', 'lock')
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.lock = asyncio.Lock()
+
+
+class WebhookClient:
+    """Отправка вебхуков через общую aiohttp-сессию бота.
+
+    Лимиты Discord учитываются отдельно для каждого вебхука: по заголовкам
+    X-RateLimit-Remaining / X-RateLimit-Reset-After запрос ждёт сброса окна,
+    а на 429 — retry_after из ответа (глобальный лимит останавливает все
+    вебхуки). 5xx и сетевые ошибки повторяются с экспоненциальной паузой.
+    """
+
+    def __init__(self, session: Callable[[], aiohttp.ClientSession], max_retries: int = 3,
+                 backoff: float = 1.0, timeout: float = 15.0):
+        self._session = session
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._buckets: Dict[str, _Bucket] = {}
+        self._global_until = 0.0
+
+    @staticmethod
+    def bucket_key(url: str) -> str:
+        match = _WEBHOOK_RE.search(url)
+        return f"{match.group(1)}/{match.group(2)}" if match else url.split('?', 1)[0]
+
+    def _bucket(self, url: str) -> _Bucket:
+        key = self.bucket_key(url)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket()
+        return bucket
+
+    async def _wait_turn(self, bucket: _Bucket) -> None:
+        loop = asyncio.get_running_loop()
+        async with bucket.lock:
+            delay = max(self._global_until, bucket.reset_at if bucket.remaining == 0 else 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if bucket.remaining == 0:
+                bucket.remaining = None  # окно сброшено, точное значение придёт с ответом
+            elif bucket.remaining is not None:
+                bucket.remaining -= 1
+
+    def _update(self, bucket: _Bucket, headers) -> None:
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        if remaining is not None and reset_after is not None:
+            bucket.remaining = int(remaining)
+            bucket.reset_at = asyncio.get_running_loop().time() + float(reset_after)
+
+    async def send(self, url: str, payload: Dict[str, Any], max_retries: Optional[int] = None) -> WebhookResult:
+        """Отправляет один payload, выдерживая лимиты и повторяя временные ошибки"""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        bucket = self._bucket(url)
+        loop = asyncio.get_running_loop()
+        attempts = 0
+        error = None
+        status = None
+        while attempts <= max_retries:
+            attempts += 1
+            await self._wait_turn(bucket)
+            try:
+                async with self._session().post(url, json=payload, timeout=self.timeout) as response:
+                    status = response.status
+                    self._update(bucket, response.headers)
+                    if response.status < 300:
+                        return WebhookResult(True, status, attempts)
+                    body = await response.text()
+                    if response.status == 429:
+                        try:
+                            data = json.loads(body)
+                        except ValueError:
+                            data = {}
+                        retry_after = float(data.get('retry_after') or response.headers.get('Retry-After') or 1)
+                        if data.get('global') or response.headers.get('X-RateLimit-Global'):
+                            self._global_until = loop.time() + retry_after
+                        else:
+                            bucket.remaining = 0
+                            bucket.reset_at = loop.time() + retry_after
+                        error = f"429: повтор через {retry_after:.1f} с"
+                        continue
+                    error = f"{response.status}: {body[:200]}"
+                    if response.status < 500:
+                        # Неверный payload или удалённый вебхук — повтор не поможет
+                        return WebhookResult(False, status, attempts, error)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            if attempts <= max_retries:
+                await asyncio.sleep(self.backoff * 2 ** (attempts - 1))
+        return WebhookResult(False, status, attempts, error)
+
+    async def send_many(self, url: str, payloads: List[Dict[str, Any]], concurrency: int = 5) -> List[WebhookResult]:
+        """Параллельная отправка нескольких payload; результаты в исходном порядке"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def deliver(payload):
+            async with semaphore:
+                return await self.send(url, payload)
+
+        return await asyncio.gather(*(deliver(payload) for payload in payloads))
+
+
+if __name__ == "__main__":
+    with open('webhook.json') as json_file:
+        data = json.load(json_file)
+
+    url = 'https://discord.com/api/webhooks/1327708083836686456/zv2mXeZ76aVruKIgSYKOh7x6_6IgBKYSwkfWKXwFKLe_bQw57JoSzzKaUbbR6ES7UQap'
+
+    async def main():
+        async with aiohttp.ClientSession() as session:
+            print(await WebhookClient(lambda: session).send(url, data))
+
+    asyncio.run(main())
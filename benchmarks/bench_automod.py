@@ -0,0 +1,53 @@
+"""Замер пропускной способности автомодерации на одном ядре.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_automod [сообщений] [запрещённых слов]
+"""
+import random
+import string
+import sys
+import time
+
+from Modules.Moderator.automod import AutoModFilter, MessageRateTracker
+
+
+def _word(rng: random.Random, low: int = 4, high: int = 10) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def main(messages: int = 200000, words: int = 2000) -> None:
+    rng = random.Random(0)
+    banned = [_word(rng) for _ in range(words)]
+    vocabulary = [_word(rng, 2, 8) for _ in range(5000)]
+    samples = []
+    for i in range(1000):
+        text = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 30)))
+        if i % 50 == 0:
+            text += " " + rng.choice(banned)
+        elif i % 70 == 0:
+            text += " https://discord.gg/abcdef"
+        elif i % 90 == 0:
+            text += " https://example.com/page?x=1"
+        samples.append(text)
+
+    started = time.perf_counter()
+    automod = AutoModFilter(banned, allowed_domains=["example.com"], block_invites=True, block_links=True)
+    compiled = time.perf_counter() - started
+
+    tracker = MessageRateTracker(capacity=10000)
+    flagged = 0
+    started = time.perf_counter()
+    for i in range(messages):
+        text = samples[i % len(samples)]
+        now = i / 5000.0
+        if automod.match(text) or tracker.observe(i % 20000, text, now):
+            flagged += 1
+    elapsed = time.perf_counter() - started
+
+    print(f"Правил: {words} слов, компиляция {compiled * 1000:.1f} мс")
+    print(f"Сообщений: {messages}, нарушений: {flagged}")
+    print(f"Время: {elapsed:.2f} с, {messages / elapsed:,.0f} сообщений/с")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -7,13 +7,84 @@ SETTINGS = {
     "command_role": 1336046637901938740,
     "hasntRole_embed_color": 0xff1100,
     "GUILD": os.getenv('Guild'),
-    "TOKEN": os.getenv("BOT_TOKEN")
+    "TOKEN": os.getenv("BOT_TOKEN"),
+    # Шардинг: SHARDED=1 включает AutoShardedBot; без SHARD_COUNT/SHARD_IDS их подберёт Discord.
+    # SHARD_IDS (шарды этого процесса) задаётся только вместе с SHARD_COUNT (общим числом шардов)
+    "SHARDED": os.getenv("SHARDED", "0") == "1",
+    "SHARD_COUNT": int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None,
+    "SHARD_IDS": [int(i) for i in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
 }
+if SETTINGS["SHARDED"] and SETTINGS["SHARD_IDS"]:
+    if not SETTINGS["SHARD_COUNT"]:
+        raise ValueError("SHARD_IDS задан без SHARD_COUNT: укажите общее число шардов всех процессов")
+    if any(not 0 <= i < SETTINGS["SHARD_COUNT"] for i in SETTINGS["SHARD_IDS"]):
+        raise ValueError(f"SHARD_IDS должны быть в диапазоне 0..{SETTINGS['SHARD_COUNT'] - 1}")
 DATABASE = {
     "host": os.getenv("DB_HOST"),
     "user": os.getenv("DB_USER"),
     "password": os.getenv("DB_PASSWORD"),
-    "database": os.getenv("DB_NAME")
+    "database": os.getenv("DB_NAME"),
+    "backend": os.getenv("DB_BACKEND", "mysql"),  # mysql | sqlite (локальная замена без сервера)
+    "sqlite_path": os.getenv("DB_SQLITE_PATH", "Saves/Moderator/data.db"),
+    "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+    "query_timeout": float(os.getenv("DB_QUERY_TIMEOUT", 10))
+}
+MODERATOR = {
+    "voice_flush_size": 500,      # сколько изменений копит буфер голосовой активности
+    "voice_flush_interval": 30,   # секунд между принудительными сбросами
+    "log_queue_size": 1000,       # лимит очереди мод-логов (дальше действия ждут)
+    "log_batch_window": 1.0,      # секунд на сбор пачки мод-логов
+    "rollout_concurrency": 5,     # параллельных запросов при раскатке прав роли мута
+    "rollout_rate": 10,           # запросов в секунду при раскатке прав
+    "user_cache_size": 10000,     # LRU слепков профилей для пропуска лишних upsert
+    "replica_id": os.getenv("REPLICA_ID"),  # имя реплики для аренды наказаний (по умолчанию host:pid)
+    "expiry_lease_seconds": 60,   # через сколько аренду упавшей реплики можно перехватить
+    "expiry_sweep_interval": 60,  # как часто искать наказания других реплик
+    "bulk_concurrency": 5,        # параллельных запросов при массовых наказаниях
+    "bulk_rate": 10,              # запросов в секунду при массовых наказаниях
+    "bulk_max_users": 1000,       # лимит пользователей в одном /mod bulk
+    "raid_join_window": 10,       # окно всплеска заходов, секунд
+    "raid_join_threshold": 10,    # столько заходов в окне считаются всплеском
+    "raid_cluster_window": 300,   # окно поиска похожих новых аккаунтов, секунд
+    "raid_cluster_threshold": 5,  # столько похожих новых аккаунтов считаются кластером
+    "raid_account_age": 7 * 86400,  # аккаунт моложе этого (секунд) считается новым
+    "raid_buffer_size": 200,      # новых аккаунтов в буфере на сервер
+    "raid_cooldown": 300,         # сколько длится режим рейда после последнего срабатывания
+    "raid_action": os.getenv("RAID_ACTION", "alert"),  # alert — только оповещение, mute — ещё и temp_mute
+    "raid_mute_duration": "1h",   # длительность автоматического мута при рейде
+    "automod_enabled": os.getenv("AUTOMOD", "0") == "1",  # фильтр сообщений on_message; работает только с файлом правил
+    "automod_rules": "Saves/Moderator/automod.json",  # words, allowed_domains, block_invites, block_links
+    "automod_spam_count": 5,      # столько сообщений ...
+    "automod_spam_window": 5,     # ... за столько секунд считаются флудом
+    "automod_duplicate_count": 3,  # столько одинаковых сообщений подряд ...
+    "automod_duplicate_window": 30,  # ... за столько секунд считаются повтором
+    "automod_strike_window": 3600,  # окно подсчёта нарушений для эскалации, секунд
+    "automod_mute_after": 3,      # с какого нарушения в окне warn сменяется temp_mute
+    "automod_mute_duration": "30m",  # длительность мута автомодерации
+    "retention_logs_days": 90,    # сколько дней logs хранятся в базе (0 — бессрочно)
+    "retention_voice_days": 180,  # сколько дней voice_activity хранится в базе (0 — бессрочно)
+    "archive_dir": "Saves/Moderator/archive",  # куда уходят старые строки (jsonl.gz по месяцам)
+    "archive_interval": 3600,     # секунд между проходами архивации
+    "archive_chunk_size": 1000,   # строк в одной пачке архивации
+    "archive_prune_batch": 500,   # строк в одном DELETE при очистке
+    "export_chunk_size": 2000,    # строк в пачке при /mod export
+    "export_timeout": 1800        # предел длительности одной выгрузки, секунд
+}
+TOOLS = {
+    "webhook_spool": "Saves/Tools/webhooks.jsonl",  # спул очереди вебхуков (append-only JSONL)
+    "webhook_workers": 4,         # параллельных отправок из очереди
+    "webhook_max_pending": 10000,  # дальше постановка в очередь ждёт освобождения места
+    "webhook_max_attempts": 8,    # после стольких неудач сообщение отбрасывается
+    "webhook_backoff": 2.0,       # пауза перед первым повтором, дальше удваивается
+    "webhook_max_backoff": 600,   # потолок паузы между повторами, секунд
+    "webhook_compact_after": 1000,  # доставок между сжатиями спула
+    "rcon_fleet": "Saves/Minecraft/data.json",  # серверы: address, rcon_port, rcon_password, groups
+    "rcon_password": os.getenv("RCON_PASSWORD"),  # пароль для серверов без rcon_password
+    "rcon_port": 25575,           # порт для серверов без rcon_port
+    "rcon_pool_size": 2,          # соединений на сервер
+    "rcon_keepalive": 30,         # секунд простоя до проверки соединения
+    "rcon_concurrency": 10,       # серверов, опрашиваемых одновременно
+    "rcon_timeout": 5             # секунд на сервер (подключение + команда)
 }
 LANG = {
     "name": "Discord SukaBot 3000",
@@ -10,12 +10,23 @@ import logging
 from dotenv import load_dotenv
 
 load_dotenv()
-bot = bridge.Bot(command_prefix="!", intents=discord.Intents.all())
+if config.SETTINGS["SHARDED"]:
+    # Каждый процесс получает только серверы своих шардов (SHARD_IDS)
+    bot = bridge.AutoShardedBot(
+        command_prefix="!",
+        intents=discord.Intents.all(),
+        shard_count=config.SETTINGS["SHARD_COUNT"],
+        shard_ids=config.SETTINGS["SHARD_IDS"]
+    )
+else:
+    bot = bridge.Bot(command_prefix="!", intents=discord.Intents.all())
 
 @bot.event
 async def on_ready():
     """Событие запуска бота."""
-    bot.http_session = aiohttp.ClientSession()
+    # on_ready приходит и после переподключений — сессия создаётся один раз
+    if getattr(bot, "http_session", None) is None or bot.http_session.closed:
+        bot.http_session = aiohttp.ClientSession()
     print(f"Бот {bot.user} запущен!")
     logging.debug(f"Bot {bot.user} is running!")
     
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+
+# Модули бота импортируются от корня репозитория, как при запуске main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from Modules.Moderator.database import SQLiteDatabase
+from Modules.Moderator.schema import create_schema
+
+
+@pytest.fixture
+def moderation_db(tmp_path):
+    """Фабрика SQLite-базы со схемой модерации; вызывается внутри цикла событий теста"""
+    async def make(name: str = "moderation.db") -> SQLiteDatabase:
+        db = SQLiteDatabase(str(tmp_path / name))
+        async with db.transaction() as cursor:
+            await create_schema(cursor)
+        return db
+    return make
+
+
+class FakeWebhookServer:
+    """Локальная замена Discord для вебхуков.
+
+    Ответы задаются сценарием: script[id вебхука] — список (статус,
+    заголовки, тело) по очереди, после его конца отвечает 204. Все
+    принятые запросы копятся в received как (id вебхука, payload, время).
+    """
+
+    def __init__(self):
+        self.script = {}
+        self.received = []
+        app = web.Application()
+        app.router.add_post('/api/webhooks/{id}/{token}', self.handle)
+        self.server = TestServer(app)
+
+    async def handle(self, request):
+        webhook_id = request.match_info['id']
+        self.received.append((webhook_id, await request.json(), asyncio.get_running_loop().time()))
+        script = self.script.get(webhook_id)
+        if script:
+            status, headers, body = script.pop(0)
+            return web.Response(status=status, headers=headers, text=body)
+        return web.Response(status=204)
+
+    def url(self, webhook_id='1') -> str:
+        return str(self.server.make_url(f'/api/webhooks/{webhook_id}/token'))
+
+    def payloads(self, webhook_id='1'):
+        return [payload for wid, payload, _ in self.received if wid == webhook_id]
+
+    async def start(self) -> None:
+        await self.server.start_server()
+
+    async def stop(self) -> None:
+        await self.server.close()
+
+
+@pytest.fixture
+def webhook_server():
+    """Фабрика FakeWebhookServer; start/stop вызываются внутри цикла событий теста"""
+    return FakeWebhookServer
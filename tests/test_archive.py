@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from Modules.Moderator.archive import RetentionArchiver
+
+GUILD = 1
+NOW = datetime(2024, 3, 15, 12, 0, 0)
+
+
+async def add_logs(db, times):
+    await db.execute('INSERT IGNORE INTO users (user_id, username) VALUES (%s, %s)', (10, "alice"))
+    for i, created_at in enumerate(times):
+        await db.execute('''
+        INSERT INTO logs (guild_id, user_id, action_type, details, created_at) VALUES (%s, %s, %s, %s, %s)
+        ''', (GUILD, 10, "warn", f"запись {i}", created_at))
+
+
+def test_old_rows_move_to_archive_and_read_back(moderation_db, tmp_path):
+    async def scenario():
+        db = await moderation_db()
+        old = [NOW - timedelta(days=100 + i * 20) for i in range(3)]
+        fresh = [NOW - timedelta(days=1)]
+        await add_logs(db, old + fresh)
+
+        archiver = RetentionArchiver(db, str(tmp_path / "archive"), {'logs': 30}, chunk_size=2, pause=0)
+        assert await archiver.run_once([GUILD], NOW) == {'logs': 3}
+
+        live = await db.fetchall('SELECT details FROM logs')
+        assert [row['details'] for row in live] == ["запись 3"]
+
+        rows = await archiver.query('logs', GUILD, NOW - timedelta(days=365), NOW)
+        assert sorted(row['details'] for row in rows) == ["запись 0", "запись 1", "запись 2"]
+        only_first = await archiver.query('logs', GUILD, old[0] - timedelta(days=1), old[0] + timedelta(days=1))
+        assert [row['details'] for row in only_first] == ["запись 0"]
+
+        # Повторный проход ничего не находит и не дублирует архив
+        assert await archiver.run_once([GUILD], NOW) == {'logs': 0}
+        assert len(await archiver.query('logs', GUILD, NOW - timedelta(days=365), NOW)) == 3
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_open_voice_sessions_stay_live(moderation_db, tmp_path):
+    async def scenario():
+        db = await moderation_db()
+        await db.execute('INSERT IGNORE INTO users (user_id, username) VALUES (%s, %s)', (10, "alice"))
+        join = NOW - timedelta(days=60)
+        await db.executemany('''
+        INSERT INTO voice_activity (guild_id, user_id, channel_id, channel_name, join_time, leave_time, duration_seconds)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ''', [
+            (GUILD, 10, 100, "general", join, join + timedelta(minutes=5), 300),
+            (GUILD, 10, 100, "general", join, None, None),
+        ])
+
+        archiver = RetentionArchiver(db, str(tmp_path / "archive"), {'voice_activity': 30}, pause=0)
+        assert await archiver.run_once([GUILD], NOW) == {'voice_activity': 1}
+        live = await db.fetchall('SELECT leave_time FROM voice_activity')
+        assert [row['leave_time'] for row in live] == [None]
+        (row,) = await archiver.query('voice_activity', GUILD, join - timedelta(days=1), NOW)
+        assert row['duration_seconds'] == 300
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+import json
+
+from Modules.Moderator.automod import AutoModFilter, MessageRateTracker
+from tests.test_config import import_config
+
+
+def test_automod_is_off_unless_enabled():
+    assert "False" in import_config(code="print(config.MODERATOR['automod_enabled'])").stdout
+    assert "True" in import_config(AUTOMOD="1", code="print(config.MODERATOR['automod_enabled'])").stdout
+
+
+def test_missing_rules_file_disables_the_filter(tmp_path):
+    assert AutoModFilter.from_file(str(tmp_path / "automod.json")) is None
+
+
+def test_rules_file_enables_only_what_it_lists(tmp_path):
+    path = tmp_path / "automod.json"
+    path.write_text(json.dumps({'words': ["scam", "scammer"]}), encoding='utf-8')
+    automod = AutoModFilter.from_file(str(path))
+
+    assert automod.match("free SCAM here") == ('word', "SCAM")
+    assert automod.match("scams") is None
+    # Приглашения и ссылки блокируются только по явной настройке
+    assert automod.match("join https://discord.gg/abc") is None
+
+    path.write_text(json.dumps({'block_invites': True, 'block_links': True, 'allowed_domains': ["example.com"]}), encoding='utf-8')
+    automod = AutoModFilter.from_file(str(path))
+    assert automod.match("join discord.gg/abc")[0] == 'invite'
+    assert automod.match("see https://docs.example.com/x") is None
+    assert automod.match("see https://evil.test/x") == ('link', "https://evil.test/x")
+
+
+def test_spam_duplicates_and_strikes():
+    tracker = MessageRateTracker(spam_count=3, spam_window=5, duplicate_count=2, duplicate_window=30, strike_window=60)
+    assert [tracker.observe('a', f"message {i}", i) for i in range(3)] == [None, None, 'spam']
+    assert tracker.observe('b', "buy cheap stuff", 0) is None
+    assert tracker.observe('b', "Buy  cheap stuff", 20) == 'duplicate'
+    assert [tracker.strike('a', t) for t in (0, 30, 100)] == [1, 2, 1]
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import discord
+
+from Modules.Moderator.bulk import BulkRunner, insert_bulk_punishments, parse_user_ids
+
+GUILD = 1
+MODERATOR = 100000000000000001
+
+
+def test_parse_user_ids_keeps_order_and_drops_duplicates():
+    text = "<@123456789012345678>, 223456789012345678\n123456789012345678 12345 9123456789012345678901"
+    assert parse_user_ids(text, "323456789012345678") == [123456789012345678, 223456789012345678, 323456789012345678]
+
+
+def test_runner_collects_failures_without_stopping():
+    async def scenario():
+        running = 0
+        peak = 0
+
+        async def worker(user_id):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if user_id == 2:
+                raise ValueError("не на сервере")
+
+        succeeded, failed = await BulkRunner(concurrency=3, rate=0).run(range(10), worker)
+        assert sorted(succeeded) == [0, 1, 3, 4, 5, 6, 7, 8, 9]
+        assert failed == {2: "не на сервере"}
+        assert peak <= 3
+
+    asyncio.run(scenario())
+
+
+def test_forbidden_is_reported_per_user():
+    class FakeResponse:
+        status = 403
+        reason = "Forbidden"
+
+    async def worker(user_id):
+        raise discord.Forbidden(FakeResponse(), "Missing Permissions")
+
+    succeeded, failed = asyncio.run(BulkRunner(rate=0).run([1], worker))
+    assert succeeded == [] and failed == {1: "нет прав"}
+
+
+def test_concurrent_batches_in_the_same_second_keep_their_own_ids(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        await db.execute("INSERT INTO users (user_id, username) VALUES (%s, %s)", (MODERATOR, "mod"))
+        type_id = (await db.fetchone("SELECT id FROM punishment_types WHERE name = %s", ("temp_mute",)))['id']
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+
+        # Один и тот же пользователь в обеих пачках, обе пишутся в одну секунду
+        first_users = {10: "a", 11: "b", 12: "c"}
+        second_users = {12: "c", 13: "d"}
+        first, second = await asyncio.gather(
+            insert_bulk_punishments(db, GUILD, MODERATOR, first_users, type_id, "raid", 3600, expires_at),
+            insert_bulk_punishments(db, GUILD, MODERATOR, second_users, type_id, "raid", 3600, expires_at),
+        )
+
+        assert sorted(row['user_id'] for row in first) == [10, 11, 12]
+        assert sorted(row['user_id'] for row in second) == [12, 13]
+        assert not {row['id'] for row in first} & {row['id'] for row in second}
+        total = await db.fetchone("SELECT COUNT(*) AS n FROM punishments")
+        assert total['n'] == 5
+        await db.close()
+
+    asyncio.run(scenario())
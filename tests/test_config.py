@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_config(code="print(config.SETTINGS['SHARD_COUNT'], config.SETTINGS['SHARD_IDS'])", **env):
+    """Импортирует config в отдельном процессе с заданным окружением"""
+    environ = {k: v for k, v in os.environ.items() if not k.startswith(("SHARD", "AUTOMOD"))}
+    environ.update(env)
+    return subprocess.run(
+        [sys.executable, "-c", f"import config; {code}"],
+        cwd=ROOT, env=environ, capture_output=True, text=True
+    )
+
+
+def test_shard_ids_without_shard_count_is_a_config_error():
+    result = import_config(SHARDED="1", SHARD_IDS="0,1")
+    assert result.returncode != 0
+    assert "SHARD_IDS задан без SHARD_COUNT" in result.stderr
+
+
+def test_shard_ids_must_fit_shard_count():
+    result = import_config(SHARDED="1", SHARD_IDS="2,3", SHARD_COUNT="3")
+    assert result.returncode != 0
+    assert "0..2" in result.stderr
+
+
+def test_valid_sharding_settings():
+    assert import_config(SHARDED="1", SHARD_IDS="0,1", SHARD_COUNT="4").stdout.split() == ["4", "[0,", "1]"]
+    assert import_config(SHARDED="1").stdout.split() == ["None", "None"]
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from Modules.Moderator.database import Database, DatabaseError, MySQLDatabase, SQLiteDatabase
+
+
+def test_ensure_index_is_idempotent():
+    async def scenario():
+        db = SQLiteDatabase()
+        async with db.transaction() as cursor:
+            await cursor.execute("CREATE TABLE logs (id INT AUTO_INCREMENT PRIMARY KEY, guild_id BIGINT, created_at TIMESTAMP)")
+            assert await cursor.ensure_index('logs', 'idx_logs_guild_created', ('guild_id', 'created_at'))
+            assert not await cursor.ensure_index('logs', 'idx_logs_guild_created', ('guild_id', 'created_at'))
+        rows = await db.fetchall("SELECT name FROM pragma_index_info('idx_logs_guild_created')")
+        assert [row['name'] for row in rows] == ['guild_id', 'created_at']
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_query_keeps_its_slot_until_the_thread_finishes():
+    async def scenario():
+        db = SQLiteDatabase(pool_size=1)
+        with pytest.raises(DatabaseError):
+            await db._submit(time.sleep, 0.3, timeout=0.05, slot=True)
+        # Поток ещё спит: новый запрос не должен встать в очередь executor'а
+        assert db._slots.locked()
+        started = time.perf_counter()
+        assert await db.fetchone("SELECT 1 AS one") == {'one': 1}
+        assert time.perf_counter() - started > 0.15
+        assert not db._slots.locked()
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+class FakeMySQLCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        self.conn.statements.append((query.strip(), tuple(params)))
+        self.rows = [{'id': i} for i in range(3)] if query.lstrip().startswith("SELECT") else []
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeMySQLConnection:
+    def __init__(self):
+        self.statements = []
+
+    def ping(self, **kwargs):
+        pass
+
+    def cursor(self, **kwargs):
+        return FakeMySQLCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeMySQLConnection()
+
+    def get_connection(self):
+        return self.conn
+
+
+def make_mysql(query_timeout):
+    db = MySQLDatabase.__new__(MySQLDatabase)
+    Database.__init__(db, pool_size=1, query_timeout=query_timeout)
+    db._pool = FakePool()
+    db._session_limits = True
+    return db
+
+
+def session_limits(conn):
+    return [params for query, params in conn.statements if query.startswith("SET SESSION")]
+
+
+def test_stream_is_limited_by_its_own_timeout_not_query_timeout():
+    async def scenario():
+        db = make_mysql(query_timeout=0.2)
+        chunks = []
+
+        def consume(rows):
+            time.sleep(0.15)  # выгрузка дольше query_timeout
+            chunks.append(rows)
+
+        assert await db.stream("SELECT id FROM logs", (), consume, chunk_size=1, timeout=1800) == 3
+        assert len(chunks) == 3
+        assert session_limits(db._pool.conn) == [(1800000, 1800)]
+
+        await db.fetchone("SELECT id FROM logs")
+        assert session_limits(db._pool.conn)[-1] == (200, 1)
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,168 @@
+import asyncio
+
+import aiohttp
+
+from Modules.Tools.delivery import WebhookQueue
+from Modules.Tools.webhook import WebhookClient
+
+
+def make_queue(session, path, **kwargs):
+    kwargs.setdefault('backoff', 0.01)
+    return WebhookQueue(WebhookClient(lambda: session, backoff=0.01), str(path), **kwargs)
+
+
+async def settled(queue, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while queue.pending:
+        assert loop.time() < deadline, queue.stats()
+        await asyncio.sleep(0.01)
+
+
+def test_dedup_survives_compaction_and_restart(webhook_server, tmp_path):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        path = tmp_path / "spool.jsonl"
+        async with aiohttp.ClientSession() as session:
+            queue = make_queue(session, path, compact_after=3)
+            await queue.start()
+            assert await queue.put_many([(server.url(), {'n': i}, None) for i in range(5)]) == 5
+            await settled(queue)
+            await queue.close()
+            # Спул сжимался: payload части доставленных сообщений из него уже удалены
+            assert path.read_bytes().count(b'"op": "put"') < 5
+
+            queue = make_queue(session, path)
+            await queue.start()
+            assert await queue.put_many([(server.url(), {'n': i}, None) for i in range(6)]) == 1
+            await settled(queue)
+            await queue.close()
+        assert sorted(p['n'] for p in server.payloads()) == list(range(6))
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_transient_errors_are_retried(webhook_server, tmp_path):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        server.script['1'] = [(503, {}, "unavailable"), (429, {}, '{"retry_after": 0.02}')]
+        async with aiohttp.ClientSession() as session:
+            queue = make_queue(session, tmp_path / "spool.jsonl")
+            await queue.start()
+            assert await queue.put(server.url(), {'content': "x"})
+            await settled(queue)
+            await queue.close()
+        assert queue.stats()['delivered'] == 1 and queue.stats()['failed'] == 0
+        assert server.payloads() == [{'content': "x"}] * 3
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_client_error_fails_permanently(webhook_server, tmp_path):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        server.script['1'] = [(400, {}, '{"message": "Cannot send an empty message"}')]
+        async with aiohttp.ClientSession() as session:
+            queue = make_queue(session, tmp_path / "spool.jsonl")
+            await queue.start()
+            await queue.put(server.url(), {'content': ""})
+            await settled(queue)
+            await queue.close()
+        assert queue.stats()['failed'] == 1 and queue.stats()['delivered'] == 0
+        assert "400" in queue.last_error
+        assert len(server.received) == 1
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_spooled_messages_are_sent_after_restart(webhook_server, tmp_path):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        path = tmp_path / "spool.jsonl"
+        async with aiohttp.ClientSession() as session:
+            # Без обработчиков сообщения только записываются в спул, как перед падением
+            queue = make_queue(session, path, workers=0)
+            await queue.start()
+            assert await queue.put_many([(server.url(), {'n': i}, None) for i in range(20)]) == 20
+            await queue.close()
+            assert server.received == []
+
+            queue = make_queue(session, path)
+            await queue.start()
+            assert queue.pending == 20
+            await settled(queue)
+            await queue.close()
+
+            # Доставленное не отправляется повторно при следующем запуске
+            queue = make_queue(session, path)
+            await queue.start()
+            assert queue.pending == 0
+            await queue.close()
+        assert sorted(p['n'] for p in server.payloads()) == list(range(20))
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_truncated_tail_is_dropped_on_start(webhook_server, tmp_path):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        path = tmp_path / "spool.jsonl"
+        async with aiohttp.ClientSession() as session:
+            queue = make_queue(session, path, workers=0)
+            await queue.start()
+            await queue.put(server.url(), {'n': 1})
+            await queue.close()
+            intact = path.stat().st_size
+            # Запись, оборванная падением процесса посреди строки
+            with open(path, 'ab') as f:
+                f.write(b'{"op": "put", "key": "k2", "url": "')
+
+            queue = make_queue(session, path)
+            await queue.start()
+            assert path.stat().st_size == intact
+            assert await queue.put(server.url(), {'n': 2})
+            await settled(queue)
+            await queue.close()
+
+            queue = make_queue(session, path)
+            await queue.start()
+            assert queue.pending == 0
+            await queue.close()
+        assert sorted(p['n'] for p in server.payloads()) == [1, 2]
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_payloads_and_keys_are_skipped(webhook_server, tmp_path):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        async with aiohttp.ClientSession() as session:
+            queue = make_queue(session, tmp_path / "spool.jsonl")
+            await queue.start()
+            url = server.url()
+            accepted = await queue.put_many([
+                (url, {'n': 1}, None),
+                (url + '?wait=true', {'n': 1}, None),  # тот же вебхук
+                (url, {'n': 2}, "order-2"),
+                (url, {'n': 3}, "order-2"),
+            ])
+            assert accepted == 2
+            await settled(queue)
+            assert not await queue.put(url, {'n': 1})
+            assert not await queue.put(url, {'n': 4}, key="order-2")
+            await queue.close()
+        assert sorted(p['n'] for p in server.payloads()) == [1, 2]
+        await server.stop()
+
+    asyncio.run(scenario())
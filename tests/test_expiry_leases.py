@@ -0,0 +1,163 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from Modules.Moderator.database import SQLiteDatabase
+from Modules.Moderator.leases import ExpiryLeases
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        username VARCHAR(32) NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS punishment_types (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(32) UNIQUE NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS punishments (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        guild_id BIGINT,
+        user_id BIGINT NOT NULL,
+        moderator_id BIGINT NOT NULL,
+        punishment_type_id INT NOT NULL,
+        expires_at TIMESTAMP NULL,
+        revoked BOOLEAN DEFAULT FALSE,
+        revoked_at TIMESTAMP NULL,
+        revoked_by BIGINT,
+        lease_owner VARCHAR(64) NULL,
+        lease_until TIMESTAMP NULL,
+        FOREIGN KEY(user_id) REFERENCES users(user_id),
+        FOREIGN KEY(punishment_type_id) REFERENCES punishment_types(id)
+    )
+    ''',
+]
+
+
+async def seed(path, count):
+    db = SQLiteDatabase(path)
+    async with db.transaction() as cursor:
+        for statement in SCHEMA:
+            await cursor.execute(statement)
+        await cursor.execute("INSERT INTO users (user_id, username) VALUES (%s, %s)", (1, "bot"))
+        await cursor.execute("INSERT INTO punishment_types (name) VALUES (%s)", ("temp_mute",))
+        await cursor.executemany('''
+        INSERT INTO punishments (guild_id, user_id, moderator_id, punishment_type_id, expires_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ''', [(1, 1, 1, 1, datetime(2024, 1, 1)) for _ in range(count)])
+    ids = [row['id'] for row in await db.fetchall("SELECT id FROM punishments ORDER BY id")]
+    await db.close()
+    return ids
+
+
+def test_each_row_is_revoked_by_exactly_one_owner(tmp_path):
+    path = str(tmp_path / "leases.db")
+
+    async def scenario():
+        ids = await seed(path, 300)
+        # У каждой реплики свой пул соединений к общей базе, как у отдельных процессов
+        replicas = [ExpiryLeases(SQLiteDatabase(path), owner=f"replica-{n}", ttl=60) for n in range(4)]
+        claimed = {leases.owner: set() for leases in replicas}
+        revoked = {leases.owner: set() for leases in replicas}
+
+        async def worker(leases, seed_value):
+            rng = random.Random(seed_value)
+            now = datetime.utcnow()
+            for _ in range(20):
+                # Пачки пересекаются: одни и те же строки пытаются взять все реплики
+                batch = rng.sample(ids, 40)
+                got = await leases.claim(batch, now)
+                claimed[leases.owner] |= got
+                revoked[leases.owner] |= await leases.revoke(sorted(got), 1, now)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(worker(leases, n) for n, leases in enumerate(replicas)))
+
+        owners = list(claimed.values())
+        for i, first in enumerate(owners):
+            for second in owners[i + 1:]:
+                assert not first & second
+        rows = await replicas[0].db.fetchall("SELECT id, revoked, lease_owner FROM punishments")
+        revoked_ids = {row['id'] for row in rows if row['revoked']}
+        assert revoked_ids == set().union(*owners)
+        assert sum(len(ids) for ids in revoked.values()) == len(revoked_ids)
+        assert all(row['lease_owner'] is None for row in rows if row['revoked'])
+        for leases in replicas:
+            await leases.db.close()
+
+    asyncio.run(scenario())
+
+
+def test_expired_lease_is_taken_over_by_another_owner(tmp_path):
+    path = str(tmp_path / "leases.db")
+
+    async def scenario():
+        ids = await seed(path, 5)
+        crashed = ExpiryLeases(SQLiteDatabase(path), owner="crashed", ttl=30)
+        survivor = ExpiryLeases(SQLiteDatabase(path), owner="survivor", ttl=30)
+        now = datetime.utcnow()
+
+        assert await crashed.claim(ids, now) == set(ids)
+        # Пока аренда действует, чужая реплика ничего не получает
+        assert await survivor.claim(ids, now + timedelta(seconds=10)) == set()
+
+        later = now + timedelta(seconds=31)
+        assert await survivor.claim(ids, later) == set(ids)
+        assert await survivor.revoke(ids, 1, later) == set(ids)
+        # Очнувшаяся реплика уже ничего не снимет повторно
+        assert await crashed.revoke(ids, 1, later) == set()
+        assert await crashed.claim(ids, later) == set()
+
+        await crashed.db.close()
+        await survivor.db.close()
+
+    asyncio.run(scenario())
+
+
+def test_release_returns_rows_to_other_owners(tmp_path):
+    path = str(tmp_path / "leases.db")
+
+    async def scenario():
+        ids = await seed(path, 3)
+        first = ExpiryLeases(SQLiteDatabase(path), owner="first", ttl=60)
+        second = ExpiryLeases(SQLiteDatabase(path), owner="second", ttl=60)
+        now = datetime.utcnow()
+
+        assert await first.claim(ids, now) == set(ids)
+        await first.release(ids)
+        assert await second.claim(ids, now) == set(ids)
+
+        await first.db.close()
+        await second.db.close()
+
+    asyncio.run(scenario())
+
+
+def test_revoke_reports_only_rows_this_replica_updated(tmp_path):
+    path = str(tmp_path / "leases.db")
+
+    async def scenario():
+        ids = await seed(path, 4)
+        slow = ExpiryLeases(SQLiteDatabase(path), owner="slow", ttl=30)
+        fast = ExpiryLeases(SQLiteDatabase(path), owner="fast", ttl=30)
+        now = datetime.utcnow()
+
+        assert await slow.claim(ids, now) == set(ids)
+        # slow застряла на снятии ролей, аренда истекла, и часть пачки забрала fast
+        later = now + timedelta(seconds=31)
+        assert await fast.claim(ids[:2], later) == set(ids[:2])
+        assert await fast.revoke(ids[:2], 1, later) == set(ids[:2])
+
+        # В мод-лог slow пишет только то, что сняла сама, — без дублей
+        assert await slow.revoke(ids, 1, later) == set(ids[2:])
+        rows = await slow.db.fetchall("SELECT id, revoked, lease_owner FROM punishments")
+        assert all(row['revoked'] and row['lease_owner'] is None for row in rows)
+
+        await slow.db.close()
+        await fast.db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from Modules.Moderator.export import ExportWriter, export_query
+
+GUILD = 1
+T0 = datetime(2024, 1, 1)
+
+
+async def add_logs(db, count, guild_id=GUILD):
+    await db.execute('INSERT IGNORE INTO users (user_id, username) VALUES (%s, %s)', (10, "alice"))
+    await db.executemany('''
+    INSERT INTO logs (guild_id, user_id, action_type, details, created_at) VALUES (%s, %s, %s, %s, %s)
+    ''', [
+        (guild_id, 10, "warn", f"{i}: {os.urandom(48).hex()}", T0 + timedelta(minutes=i))
+        for i in range(count)
+    ])
+
+
+async def export(db, directory, fmt, max_bytes, since=None, until=None):
+    writer = ExportWriter(str(directory), "logs", fmt=fmt, max_bytes=max_bytes)
+    query, params = export_query('logs', GUILD, since, until)
+    try:
+        streamed = await db.stream(query, params, writer.write, chunk_size=100)
+    finally:
+        paths = writer.close()
+    return writer, streamed, paths
+
+
+def test_csv_export_splits_into_valid_gzip_parts(moderation_db, tmp_path):
+    async def scenario():
+        db = await moderation_db()
+        await add_logs(db, 2000)
+        await add_logs(db, 10, guild_id=2)
+
+        writer, streamed, paths = await export(db, tmp_path, 'csv', max_bytes=64 * 1024)
+        assert streamed == writer.rows == 2000
+        assert len(paths) > 1
+        exported = []
+        for path in paths:
+            assert os.path.getsize(path) <= 64 * 1024
+            with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+                header, *rows = list(csv.reader(f))
+            # Каждая часть читается отдельно и начинается с заголовка
+            assert header == ['id', 'guild_id', 'user_id', 'action_type', 'details', 'created_at']
+            exported += rows
+        assert len(exported) == 2000
+        assert [int(row[0]) for row in exported] == sorted(int(row[0]) for row in exported)
+        assert {row[1] for row in exported} == {str(GUILD)}
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_jsonl_export_respects_period(moderation_db, tmp_path):
+    async def scenario():
+        db = await moderation_db()
+        await add_logs(db, 100)
+
+        since, until = T0 + timedelta(minutes=10), T0 + timedelta(minutes=30)
+        writer, streamed, paths = await export(db, tmp_path, 'jsonl', max_bytes=25 * 1024 * 1024, since=since, until=until)
+        assert streamed == writer.rows == 20
+        (path,) = paths
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        assert len(rows) == 20
+        assert rows[0]['created_at'] == "2024-01-01 00:10:00"
+        assert rows[-1]['details'].startswith("29: ")
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_empty_export_writes_no_files(moderation_db, tmp_path):
+    async def scenario():
+        db = await moderation_db()
+        writer, streamed, paths = await export(db, tmp_path, 'csv', max_bytes=1024 * 1024)
+        assert streamed == writer.rows == 0
+        assert paths == []
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("discord")
+
+from Modules.Moderator.database import SQLiteDatabase
+from Modules.Moderator.logs import ModLogQueue
+
+
+async def make_db():
+    db = SQLiteDatabase()
+    async with db.transaction() as cursor:
+        await cursor.execute('''
+        CREATE TABLE users (user_id BIGINT PRIMARY KEY, username VARCHAR(32) NOT NULL)
+        ''')
+        await cursor.execute('''
+        CREATE TABLE logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            guild_id BIGINT,
+            user_id BIGINT,
+            action_type VARCHAR(50) NOT NULL,
+            details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )
+        ''')
+        await cursor.execute("INSERT INTO users (user_id, username) VALUES (%s, %s)", (1, "user"))
+    return db
+
+
+def test_bad_row_does_not_drop_the_batch():
+    async def scenario():
+        db = await make_db()
+        queue = ModLogQueue(db, window=0.05)
+        queue.start()
+        now = datetime.utcnow()
+        for i in range(50):
+            # Строка 25 нарушает внешний ключ на users
+            await queue.put(1, 999 if i == 25 else 1, f"action-{i}", "details", now)
+        await queue.close()
+
+        rows = await db.fetchall("SELECT action_type FROM logs ORDER BY id")
+        assert [row['action_type'] for row in rows] == [f"action-{i}" for i in range(50) if i != 25]
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_batch_is_written_with_one_insert():
+    async def scenario():
+        db = await make_db()
+        calls = []
+        execute = db.execute
+
+        async def counting_execute(query, params=(), timeout=None):
+            calls.append(query)
+            return await execute(query, params, timeout)
+
+        db.execute = counting_execute
+        queue = ModLogQueue(db, window=0.05)
+        queue.start()
+        for i in range(20):
+            await queue.put(1, 1, f"action-{i}", None, datetime.utcnow())
+        await queue.close()
+
+        assert len(calls) == 1
+        assert len(await db.fetchall("SELECT id FROM logs")) == 20
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_surfaces_a_dead_worker_instead_of_hanging():
+    async def scenario():
+        db = await make_db()
+        queue = ModLogQueue(db, batch_size=1, window=0)
+
+        async def broken_write(batch):
+            raise RuntimeError("worker died")
+
+        queue._write = broken_write
+        queue.start()
+        for i in range(3):
+            await queue.put(1, 1, f"action-{i}", None, datetime.utcnow())
+
+        with pytest.raises(RuntimeError, match="worker died"):
+            await asyncio.wait_for(queue.close(), timeout=2)
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_gives_up_after_timeout():
+    async def scenario():
+        db = await make_db()
+        queue = ModLogQueue(db, window=0)
+        started = asyncio.Event()
+
+        async def stuck_write(batch):
+            started.set()
+            await asyncio.sleep(3600)
+
+        queue._write = stuck_write
+        queue.start()
+        await queue.put(1, 1, "action", None, datetime.utcnow())
+        await started.wait()
+        await asyncio.wait_for(queue.close(timeout=0.1), timeout=2)
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from Modules.Moderator.active import ActivePunishments, REVOKING_ACTIONS, revoke_punishments
+
+GUILD_ID = 1
+USER_ID = 100
+MODERATOR_ID = 200
+
+
+async def punishment_type_ids(db):
+    rows = await db.fetchall('SELECT id, name FROM punishment_types')
+    return {row['name']: row['id'] for row in rows}
+
+
+async def add_punishment(db, type_id, user_id=USER_ID):
+    for uid in (user_id, MODERATOR_ID):
+        await db.execute('INSERT IGNORE INTO users (user_id, username) VALUES (%s, %s)', (uid, str(uid)))
+    await db.execute('''
+    INSERT INTO punishments (guild_id, user_id, moderator_id, punishment_type_id, reason, expires_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ''', (GUILD_ID, user_id, MODERATOR_ID, type_id, "-", datetime.utcnow() + timedelta(days=1)))
+    (row,) = await db.fetchall('SELECT MAX(id) AS id FROM punishments')
+    return row['id']
+
+
+async def punishment_rows(db):
+    return {
+        row['id']: row
+        for row in await db.fetchall('SELECT id, user_id, revoked, revoked_by, revoked_reason FROM punishments')
+    }
+
+
+def test_unmute_revokes_mute_rows_and_clears_index(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        types = await punishment_type_ids(db)
+        mute_id = await add_punishment(db, types['temp_mute'])
+        warn_id = await add_punishment(db, types['warn'])
+        other_id = await add_punishment(db, types['temp_mute'], user_id=101)
+
+        active = ActivePunishments()
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+        active.add(mute_id, GUILD_ID, USER_ID, 'temp_mute', expires_at)
+        active.add(other_id, GUILD_ID, 101, 'temp_mute', expires_at)
+
+        names = REVOKING_ACTIONS['unmute']
+        active.discard_member(GUILD_ID, USER_ID, names)
+        revoked = await revoke_punishments(
+            db, GUILD_ID, USER_ID, [types[name] for name in names], MODERATOR_ID, "разобрались", datetime.utcnow()
+        )
+
+        assert revoked == [mute_id]
+        assert active.roles_for(GUILD_ID, USER_ID, datetime.utcnow()) == set()
+        assert active.roles_for(GUILD_ID, 101, datetime.utcnow()) == {"Muted"}
+        rows = await punishment_rows(db)
+        assert rows[mute_id]['revoked'] and rows[mute_id]['revoked_by'] == MODERATOR_ID
+        assert rows[mute_id]['revoked_reason'] == "разобрались"
+        assert not rows[warn_id]['revoked']
+        assert not rows[other_id]['revoked']
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_unban_revokes_ban_rows_only_once(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        types = await punishment_type_ids(db)
+        ban_id = await add_punishment(db, types['temp_ban'])
+        warn_id = await add_punishment(db, types['warn'])
+        type_ids = [types[name] for name in REVOKING_ACTIONS['unban']]
+
+        first = await revoke_punishments(db, GUILD_ID, USER_ID, type_ids, MODERATOR_ID, "апелляция", datetime.utcnow())
+        second = await revoke_punishments(db, GUILD_ID, USER_ID, type_ids, MODERATOR_ID, "повтор", datetime.utcnow())
+
+        assert first == [ban_id]
+        assert second == []
+        rows = await punishment_rows(db)
+        assert rows[ban_id]['revoked'] and rows[ban_id]['revoked_reason'] == "апелляция"
+        assert not rows[warn_id]['revoked']
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_revoke_without_known_types_is_noop(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        assert await revoke_punishments(db, GUILD_ID, USER_ID, [], MODERATOR_ID, None, datetime.utcnow()) == []
+        await db.close()
+
+    asyncio.run(scenario())
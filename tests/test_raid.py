@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from Modules.Moderator.raid import RaidDetector
+
+GUILD = 1
+NOW = datetime(2024, 1, 1, 12, 0, 0)
+OLD = NOW - timedelta(days=365)
+
+
+def test_join_spike_fires_once_and_extends_the_raid():
+    detector = RaidDetector(join_window=10, join_threshold=5, cooldown=60)
+    signals = []
+    for i in range(5):
+        created = NOW - timedelta(hours=i + 1) if i < 2 else OLD
+        signals.append(detector.observe(GUILD, i, f"user{i}", True, created, NOW + timedelta(seconds=i)))
+
+    assert signals[:4] == [None] * 4
+    spike = signals[4]
+    assert spike.kind == 'spike' and spike.count == 5
+    # Под действие попадают только новые аккаунты
+    assert spike.member_ids == [0, 1]
+
+    # Продолжение рейда не даёт второго сигнала, но продлевает режим
+    assert detector.observe(GUILD, 5, "late", True, OLD, NOW + timedelta(seconds=5)) is None
+    assert detector.in_raid(GUILD, NOW + timedelta(seconds=64.5))
+    assert not detector.in_raid(GUILD, NOW + timedelta(seconds=66))
+
+
+def test_slow_joins_are_not_a_spike():
+    detector = RaidDetector(join_window=10, join_threshold=5)
+    for i in range(20):
+        assert detector.observe(GUILD, i, f"member{i}", True, OLD, NOW + timedelta(seconds=5 * i)) is None
+
+
+def test_cluster_of_similar_new_accounts():
+    detector = RaidDetector(join_threshold=100, cluster_window=300, cluster_threshold=3, cooldown=60)
+    created = NOW - timedelta(hours=2, minutes=10)
+    assert detector.observe(GUILD, 1, "Raider01", False, created, NOW) is None
+    assert detector.observe(GUILD, 2, "legit", True, OLD, NOW + timedelta(seconds=10)) is None
+    assert detector.observe(GUILD, 3, "raider777", False, created + timedelta(minutes=5), NOW + timedelta(seconds=20)) is None
+    signal = detector.observe(GUILD, 4, "RAIDER5", False, created + timedelta(minutes=30), NOW + timedelta(seconds=30))
+
+    assert signal.kind == 'cluster' and signal.count == 3
+    assert signal.key == ('name', 'raider#', False)
+    assert signal.member_ids == [1, 3, 4]
+
+
+def test_cluster_members_expire_from_the_window():
+    detector = RaidDetector(join_threshold=100, cluster_window=60, cluster_threshold=3)
+    created = NOW - timedelta(hours=1)
+    detector.observe(GUILD, 1, "bot1", False, created, NOW)
+    detector.observe(GUILD, 2, "bot2", False, created, NOW + timedelta(seconds=10))
+    # Первые двое выпали из окна — третьего для кластера мало
+    assert detector.observe(GUILD, 3, "bot3", False, created, NOW + timedelta(seconds=120)) is None
+    assert detector.observe(GUILD, 4, "bot4", False, created, NOW + timedelta(seconds=121)) is None
@@ -0,0 +1,208 @@
+import asyncio
+import struct
+
+import pytest
+
+from Modules.Tools.rcon import RCONClient, RCONError, RCONPool
+
+PASSWORD = "secret"
+
+
+def packet(packet_id, ptype, body=b""):
+    body += b"\x00\x00"
+    return struct.pack('<3i', len(body) + 8, packet_id, ptype) + body
+
+
+class FakeRCONServer:
+    """Minecraft-подобный RCON-сервер для тестов.
+
+    Команда "delay <сек> <текст>" отвечает через паузу, поэтому ответы на
+    конвейер приходят не по порядку. Ответ режется по 4096 байт, а байты
+    уходят в сокет кусками split_size, чтобы пакеты попадали на стыки
+    чтений клиента.
+    """
+
+    def __init__(self, split_size=None):
+        self.split_size = split_size
+        self.auths = 0
+        self.writers = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.drop()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def drop(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+    async def send(self, writer, data):
+        if not self.split_size:
+            writer.write(data)
+        else:
+            for i in range(0, len(data), self.split_size):
+                writer.write(data[i:i + self.split_size])
+                await writer.drain()
+                await asyncio.sleep(0)
+        await writer.drain()
+
+    async def respond(self, writer, lock, request_id, sentinel_id, command):
+        if command.startswith("delay "):
+            _, delay, text = command.split(" ", 2)
+            await asyncio.sleep(float(delay))
+        else:
+            text = f"echo:{command}"
+        body = text.encode()
+        data = b"".join(packet(request_id, 0, body[i:i + 4096]) for i in range(0, max(len(body), 1), 4096))
+        # Ответ и эхо сторожа уходят одним куском, как у настоящего сервера
+        async with lock:
+            await self.send(writer, data + packet(sentinel_id, 0, b"Unknown request 0"))
+
+    async def handle(self, reader, writer):
+        self.writers.append(writer)
+        lock = asyncio.Lock()
+        tasks = []
+        command = None
+        try:
+            while True:
+                size, = struct.unpack('<i', await reader.readexactly(4))
+                data = await reader.readexactly(size)
+                packet_id, ptype = struct.unpack('<2i', data[:8])
+                body = data[8:-2].decode()
+                if ptype == 3:
+                    self.auths += 1
+                    writer.write(packet(packet_id if body == PASSWORD else -1, 2))
+                    await writer.drain()
+                elif ptype == 2:
+                    command = (packet_id, body)
+                elif ptype == 0 and command is not None:
+                    request_id, text = command
+                    command = None
+                    tasks.append(asyncio.create_task(self.respond(writer, lock, request_id, packet_id, text)))
+                elif ptype == 0:
+                    async with lock:
+                        await self.send(writer, packet(packet_id, 0, b"Unknown request 0"))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=20))
+
+
+def test_auth():
+    async def scenario():
+        server = FakeRCONServer()
+        port = await server.start()
+        async with RCONClient('127.0.0.1', port, PASSWORD) as client:
+            assert await client.send_command("list") == "echo:list"
+        with pytest.raises(RCONError):
+            async with RCONClient('127.0.0.1', port, "wrong"):
+                pass
+        assert server.auths == 2
+        await server.stop()
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("split_size", [None, 1, 7, 4099])
+def test_pipelined_commands_split_and_merged_across_reads(split_size):
+    async def scenario():
+        server = FakeRCONServer(split_size=split_size)
+        port = await server.start()
+        commands = [f"cmd{i}" for i in range(50)] + ["delay 0 " + "x" * 4096, "delay 0 " + "y" * 10000]
+        async with RCONClient('127.0.0.1', port, PASSWORD) as client:
+            results = await client.send_many(commands)
+            assert results[:50] == [f"echo:cmd{i}" for i in range(50)]
+            assert results[50] == "x" * 4096
+            assert results[51] == "y" * 10000
+            assert client.in_flight == 0
+        await server.stop()
+
+    run(scenario())
+
+
+def test_out_of_order_completion():
+    async def scenario():
+        server = FakeRCONServer()
+        port = await server.start()
+        async with RCONClient('127.0.0.1', port, PASSWORD) as client:
+            finished = []
+
+            async def command(text):
+                result = await client.send_command(text)
+                finished.append(result)
+                return result
+
+            results = await asyncio.gather(
+                command("delay 0.3 slow"), command("delay 0.1 medium"), command("delay 0 fast")
+            )
+            assert results == ["slow", "medium", "fast"]
+            assert finished == ["fast", "medium", "slow"]
+        await server.stop()
+
+    run(scenario())
+
+
+def test_pool_reconnects_after_server_drop():
+    async def scenario():
+        server = FakeRCONServer()
+        port = await server.start()
+        pool = RCONPool('127.0.0.1', port, PASSWORD, size=1, timeout=2, keepalive=0)
+        assert await pool.send_command("first") == "echo:first"
+        assert server.auths == 1
+
+        server.drop()
+        await asyncio.sleep(0.1)  # читатель замечает разрыв
+        assert await pool.send_command("second") == "echo:second"
+        assert server.auths == 2
+        assert await pool.send_many(["a", "b"]) == ["echo:a", "echo:b"]
+        await pool.close()
+        await server.stop()
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("length", [4095, 4096, 4097, 8192])
+def test_response_at_packet_boundary_completes_without_timeout(length):
+    async def scenario():
+        server = FakeRCONServer()
+        port = await server.start()
+        loop = asyncio.get_running_loop()
+        async with RCONClient('127.0.0.1', port, PASSWORD, timeout=2) as client:
+            started = loop.time()
+            assert await client.send_command("delay 0 " + "z" * length) == "z" * length
+            # Конец ответа — эхо сторожа, а не таймаут на пакете ровно в 4096 байт
+            assert loop.time() - started < 1
+        await server.stop()
+
+    run(scenario())
+
+
+def test_stream_yields_packets_and_keeps_split_characters():
+    async def scenario():
+        server = FakeRCONServer(split_size=1000)
+        port = await server.start()
+        # Второй байт "é" попадает в следующий пакет
+        text = "a" + "é" * 3000
+        async with RCONClient('127.0.0.1', port, PASSWORD) as client:
+            chunks = [chunk async for chunk in client.stream("delay 0 " + text)]
+            assert len(chunks) == 2
+            assert "".join(chunks) == text
+            assert "�" not in "".join(chunks)
+            assert client.in_flight == 0
+            # Соединение пригодно для следующих команд
+            assert await client.send_command("after") == "echo:after"
+            await client.ping()
+        await server.stop()
+
+    run(scenario())
@@ -0,0 +1,109 @@
+import asyncio
+
+import discord
+
+from Modules.Moderator.rollout import PermissionRollout
+
+GUILD = 1
+
+
+class FakeTextChannel(discord.TextChannel):
+    def __init__(self, channel_id, overwrite=None):
+        self.id = channel_id
+        self.overwrite = overwrite or discord.PermissionOverwrite()
+
+    def overwrites_for(self, role):
+        return self.overwrite
+
+    async def set_permissions(self, role, reason=None, **permissions):
+        self.overwrite = discord.PermissionOverwrite(**permissions)
+
+
+class FakeVoiceChannel(discord.VoiceChannel):
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.overwrite = discord.PermissionOverwrite()
+
+    overwrites_for = FakeTextChannel.overwrites_for
+    set_permissions = FakeTextChannel.set_permissions
+
+
+class FakeRole:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+
+
+class FakeGuild:
+    def __init__(self, channels, roles):
+        self.id = GUILD
+        self.channels = channels
+        self.roles = {role.id: role for role in roles}
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+
+async def statuses(db):
+    rows = await db.fetchall("SELECT role_id, status FROM permission_rollouts ORDER BY role_id")
+    return {row['role_id']: row['status'] for row in rows}
+
+
+def test_resume_only_touches_rollouts_the_bot_left_unfinished(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        # Админ сознательно разрешил замученным писать в канал апелляций
+        appeals = FakeTextChannel(10, discord.PermissionOverwrite(send_messages=True))
+        voice = FakeVoiceChannel(20)
+        muted, voice_muted = FakeRole(5, "Muted"), FakeRole(6, "Voice Muted")
+        guild = FakeGuild([appeals, voice], [muted, voice_muted])
+
+        await db.executemany('''
+        INSERT INTO permission_rollouts (guild_id, role_id, role_name, status)
+        VALUES (%s, %s, %s, %s)
+        ''', [(GUILD, 5, "Muted", "done"), (GUILD, 6, "Voice Muted", "running"), (GUILD, 7, "Muted", "running")])
+
+        rollout = PermissionRollout(rate=0, db=db)
+        assert await rollout.resume([guild]) == 1
+        await asyncio.gather(*rollout._tasks.values())
+
+        assert appeals.overwrite.send_messages is True
+        assert voice.overwrite.speak is False
+        # Роль 7 удалили, пока бот лежал
+        assert await statuses(db) == {5: "done", 6: "done", 7: "abandoned"}
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_started_rollout_is_recorded_until_it_finishes(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        channels = [FakeTextChannel(i) for i in range(3)]
+        muted = FakeRole(5, "Muted")
+        guild = FakeGuild(channels, [muted])
+        rollout = PermissionRollout(rate=0, db=db)
+
+        release = asyncio.Event()
+        original = FakeTextChannel.set_permissions
+
+        async def slow_set_permissions(self, role, reason=None, **permissions):
+            await release.wait()
+            await original(self, role, reason=reason, **permissions)
+
+        for channel in channels:
+            channel.set_permissions = slow_set_permissions.__get__(channel)
+
+        task = rollout.start(guild, muted, "Muted")
+        await asyncio.sleep(0.05)
+        assert await statuses(db) == {5: "running"}
+        assert await rollout.unfinished([GUILD]) == [{'guild_id': GUILD, 'role_id': 5, 'role_name': "Muted"}]
+
+        release.set()
+        await task
+        assert await statuses(db) == {5: "done"}
+        assert rollout.status(GUILD, 5) == (3, 3)
+        assert all(channel.overwrite.send_messages is False for channel in channels)
+        await db.close()
+
+    asyncio.run(scenario())
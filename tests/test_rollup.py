@@ -0,0 +1,87 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+from Modules.Moderator.rollup import VoiceRollup, split_by_day
+from Modules.Moderator.voice import VoiceActivityBuffer
+
+GUILD = 1
+T0 = datetime(2024, 1, 1, 22, 0, 0)
+
+
+def test_split_by_day_cuts_at_midnight():
+    parts = list(split_by_day(T0, T0 + timedelta(hours=3)))
+    assert parts == [(date(2024, 1, 1), 7200), (date(2024, 1, 2), 3600)]
+    assert list(split_by_day(T0, T0)) == []
+
+
+async def raw_totals(db):
+    rows = await db.fetchall('''
+    SELECT user_id, channel_id, SUM(duration_seconds) AS seconds, COUNT(*) AS sessions
+    FROM voice_activity WHERE leave_time IS NOT NULL
+    GROUP BY user_id, channel_id
+    ''')
+    return {(r['user_id'], r['channel_id']): (r['seconds'], r['sessions']) for r in rows}
+
+
+async def daily_totals(db):
+    rows = await db.fetchall('''
+    SELECT user_id, channel_id, SUM(seconds) AS seconds, SUM(sessions) AS sessions
+    FROM voice_daily GROUP BY user_id, channel_id
+    ''')
+    return {(r['user_id'], r['channel_id']): (r['seconds'], r['sessions']) for r in rows}
+
+
+async def play_sessions(buffer):
+    buffer.join(GUILD, 10, "alice", 100, "general", T0)
+    buffer.join(GUILD, 11, "bob", 200, "music", T0 + timedelta(minutes=30))
+    await buffer.flush()
+    # Сессия alice переходит через полночь, bob заходит ещё раз
+    buffer.leave(GUILD, 10, T0 + timedelta(hours=3))
+    buffer.leave(GUILD, 11, T0 + timedelta(minutes=45))
+    buffer.join(GUILD, 11, "bob", 200, "music", T0 + timedelta(hours=1))
+    buffer.leave(GUILD, 11, T0 + timedelta(hours=1, minutes=10))
+    await buffer.flush()
+
+
+def test_rollup_totals_match_raw_sessions(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        rollup = VoiceRollup(db)
+        buffer = VoiceActivityBuffer(db, flush_size=100, rollup=rollup)
+        await play_sessions(buffer)
+
+        assert await daily_totals(db) == await raw_totals(db) == {
+            (10, 100): (3 * 3600, 1),
+            (11, 200): (25 * 60, 2),
+        }
+        # Сессия через полночь делится между двумя днями
+        by_day = await db.fetchall('''
+        SELECT day, seconds, sessions FROM voice_daily WHERE user_id = %s ORDER BY day
+        ''', (10,))
+        assert [(str(r['day']), r['seconds'], r['sessions']) for r in by_day] == [
+            ("2024-01-01", 7200, 1), ("2024-01-02", 3600, 0)
+        ]
+        assert [r['user_id'] for r in await rollup.top(GUILD, date(2024, 1, 1))] == [10, 11]
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_backfill_rebuilds_same_totals(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        rollup = VoiceRollup(db)
+        # Сессии пишутся без итогов, как до появления voice_daily
+        await play_sessions(VoiceActivityBuffer(db, flush_size=100))
+        assert await daily_totals(db) == {}
+
+        read = await rollup.backfill(GUILD, date(2024, 1, 1), date(2024, 1, 3), page_size=1)
+        assert read == 3
+        assert await daily_totals(db) == await raw_totals(db)
+
+        # Повторный пересчёт не удваивает итоги
+        await rollup.backfill(GUILD, date(2024, 1, 1), date(2024, 1, 3))
+        assert await daily_totals(db) == await raw_totals(db)
+        await db.close()
+
+    asyncio.run(scenario())
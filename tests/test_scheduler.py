@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from Modules.Moderator.scheduler import ExpiryScheduler
+
+
+async def noop(batch):
+    pass
+
+
+def test_pop_due_respects_reschedule_and_discard():
+    scheduler = ExpiryScheduler(noop)
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    scheduler.schedule(1, base + timedelta(seconds=5), 'one')
+    scheduler.schedule(2, base + timedelta(seconds=1, microseconds=300), 'two')
+    scheduler.schedule(3, base + timedelta(seconds=2), 'three')
+    scheduler.schedule(1, base + timedelta(seconds=1), 'one-moved')
+    scheduler.discard(3)
+
+    # Доли секунды округляются вверх, поэтому "two" ещё не истекло
+    assert scheduler.pop_due(base + timedelta(seconds=1)) == ['one-moved']
+    assert scheduler.next_deadline() == base + timedelta(seconds=2)
+    assert scheduler.pop_due(base + timedelta(seconds=10)) == ['two']
+    assert len(scheduler) == 0
+    assert scheduler.next_deadline() is None
+
+
+def test_run_fires_callback_when_punishments_expire():
+    async def scenario():
+        batches = []
+        done = asyncio.Event()
+
+        async def callback(batch):
+            batches.append(sorted(batch))
+            done.set()
+
+        scheduler = ExpiryScheduler(callback)
+        scheduler.start()
+        await asyncio.sleep(0)
+        now = datetime.utcnow()
+        scheduler.schedule(1, now - timedelta(seconds=1), 'a')
+        scheduler.schedule(2, now - timedelta(seconds=1), 'b')
+        scheduler.schedule(3, now + timedelta(hours=1), 'later')
+        await asyncio.wait_for(done.wait(), timeout=3)
+        scheduler.stop()
+
+        assert batches == [['a', 'b']]
+        assert 3 in scheduler
+
+    asyncio.run(scenario())
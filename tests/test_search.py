@@ -0,0 +1,86 @@
+import asyncio
+import sqlite3
+
+from Modules.Moderator.database import SQLiteDatabase
+from Modules.Moderator.schema import create_schema
+from Modules.Moderator.search import search_pager
+
+GUILD = 1
+REASONS = [
+    "спам ссылками в общем чате",
+    "оскорбления в голосовом канале",
+    "спам стикерами",
+    "реклама_сервера и спам",
+]
+
+
+async def add_punishments(db, guild_id=GUILD):
+    await db.execute('INSERT IGNORE INTO users (user_id, username) VALUES (%s, %s)', (10, "alice"))
+    (warn,) = await db.fetchall('SELECT id FROM punishment_types WHERE name = %s', ("warn",))
+    await db.executemany('''
+    INSERT INTO punishments (guild_id, user_id, moderator_id, punishment_type_id, reason)
+    VALUES (%s, %s, %s, %s, %s)
+    ''', [(guild_id, 10, 10, warn['id'], reason) for reason in REASONS])
+
+
+async def found(db, text, page_size=5):
+    pager = search_pager(db, 'punishments', GUILD, text, page_size=page_size)
+    if pager is None:
+        return None
+    rows = await pager.first()
+    while pager.has_next:
+        rows += await pager.next()
+    return sorted(row['text'] for row in rows)
+
+
+def test_fts5_search_matches_words_within_guild(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        assert db.fulltext
+        await add_punishments(db)
+        await add_punishments(db, guild_id=2)
+
+        assert await found(db, "спам", page_size=2) == sorted([REASONS[0], REASONS[2], REASONS[3]])
+        assert await found(db, "спам стикерами") == [REASONS[2]]
+        # Синтаксис FTS5 из ввода не интерпретируется
+        assert await found(db, 'голосовом" OR "спам') == []
+        assert await found(db, "!!!") is None
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+class NoFts5Cursor:
+    """Курсор транзакции, как в сборке SQLite без модуля FTS5"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.db = cursor.db
+
+    async def execute(self, query, params=()):
+        if "fts5" in query:
+            raise sqlite3.OperationalError("no such module: fts5")
+        return await self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def test_like_fallback_without_fts5(tmp_path):
+    async def scenario():
+        db = SQLiteDatabase(str(tmp_path / "moderation.db"))
+        async with db.transaction() as cursor:
+            await create_schema(NoFts5Cursor(cursor))
+        assert not db.fulltext
+        assert await db.fetchall("SELECT name FROM sqlite_master WHERE name LIKE '%_fts%'") == []
+        await add_punishments(db)
+
+        assert await found(db, "спам", page_size=2) == sorted([REASONS[0], REASONS[2], REASONS[3]])
+        assert await found(db, "спам стикерами") == [REASONS[2]]
+        # Подчёркивание — часть слова, а не шаблон LIKE
+        assert await found(db, "реклама_сервера") == [REASONS[3]]
+        assert await found(db, "реклама1сервера") == []
+        assert await found(db, "!!!") is None
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import discord
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_tools_cog_imports_with_rcon_group():
+    from Modules.Tools.main import Tools
+
+    assert isinstance(Tools.rcon, discord.SlashCommandGroup)
+    assert [command.name for command in Tools.rcon.subcommands] == ["broadcast"]
+
+
+def test_bot_entry_point_imports():
+    pytest.importorskip("dotenv")
+    # Отдельный процесс: main.py создаёт бота при импорте
+    environ = {k: v for k, v in os.environ.items() if not k.startswith(("SHARD", "AUTOMOD"))}
+    result = subprocess.run(
+        [sys.executable, "-c", "import main; print(type(main.bot).__name__)"],
+        cwd=ROOT, env=environ, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "Bot"
@@ -0,0 +1,148 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from Modules.Moderator.voice import VoiceActivityBuffer
+
+GUILD = 1
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+async def voice_rows(db):
+    return await db.fetchall('''
+    SELECT id, user_id, channel_id, join_time, leave_time, duration_seconds
+    FROM voice_activity ORDER BY id
+    ''')
+
+
+def test_sessions_are_written_behind_in_one_flush(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        buffer = VoiceActivityBuffer(db, flush_size=100)
+        buffer.join(GUILD, 10, "alice", 100, "general", T0)
+        buffer.join(GUILD, 11, "bob", 100, "general", T0)
+        buffer.leave(GUILD, 10, T0 + timedelta(seconds=90))
+        # До сброса в базу ничего не пишется
+        assert await voice_rows(db) == []
+        assert len(buffer) == 3
+
+        await buffer.flush()
+        rows = await voice_rows(db)
+        assert [(r['user_id'], r['duration_seconds']) for r in rows] == [(10, 90), (11, None)]
+        assert buffer.sessions[(GUILD, 11)]['id'] == rows[1]['id']
+        assert len(buffer) == 0
+
+        # Закрытие уже записанной сессии — UPDATE по id
+        buffer.leave(GUILD, 11, T0 + timedelta(seconds=30))
+        await buffer.close()
+        rows = await voice_rows(db)
+        assert [(r['user_id'], r['duration_seconds']) for r in rows] == [(10, 90), (11, 30)]
+        assert rows[1]['leave_time'] == T0 + timedelta(seconds=30)
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_flush_size_triggers_a_background_flush(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        buffer = VoiceActivityBuffer(db, flush_size=2)
+        buffer.join(GUILD, 10, "alice", 100, "general", T0)
+        buffer.join(GUILD, 11, "bob", 100, "general", T0)
+        await buffer._flush_task
+        assert len(await voice_rows(db)) == 2
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_join_closes_the_previous_session(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        buffer = VoiceActivityBuffer(db)
+        buffer.join(GUILD, 10, "alice", 100, "general", T0)
+        # Выход из первого канала потерялся
+        buffer.join(GUILD, 10, "alice", 200, "music", T0 + timedelta(seconds=40))
+        await buffer.flush()
+
+        rows = await voice_rows(db)
+        assert [(r['channel_id'], r['duration_seconds']) for r in rows] == [(100, 40), (200, None)]
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_reconcile_closes_memory_sessions_at_disconnect_time(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        buffer = VoiceActivityBuffer(db)
+        buffer.join(GUILD, 10, "alice", 100, "general", T0)
+        buffer.join(GUILD, 11, "bob", 100, "general", T0)
+        buffer.join(GUILD, 12, "carol", 100, "general", T0)
+        await buffer.flush()
+
+        buffer.disconnected(T0 + timedelta(seconds=60))
+        # Во время разрыва alice ушла в другой канал, bob вышел, carol осталась
+        states = {(GUILD, 10): ("alice", 200, "music"), (GUILD, 12): ("carol", 100, "general")}
+        now = T0 + timedelta(hours=2)
+        assert await buffer.reconcile([GUILD], states, now) == (2, 1)
+
+        rows = {(r['user_id'], r['channel_id']): r for r in await voice_rows(db)}
+        assert rows[(10, 100)]['leave_time'] == T0 + timedelta(seconds=60)
+        assert rows[(10, 100)]['duration_seconds'] == 60
+        assert rows[(11, 100)]['duration_seconds'] == 60
+        assert rows[(12, 100)]['leave_time'] is None
+        assert rows[(10, 200)]['join_time'] == now
+        assert buffer.sessions[(GUILD, 10)]['channel_id'] == 200
+        assert (GUILD, 11) not in buffer.sessions
+        assert buffer.disconnected_at is None
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_reconcile_closes_rows_left_by_a_previous_run_at_the_heartbeat(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        await db.executemany("INSERT INTO users (user_id, username) VALUES (%s, %s)", [(10, "alice"), (11, "bob")])
+        await db.executemany('''
+        INSERT INTO voice_activity (guild_id, user_id, channel_id, channel_name, join_time)
+        VALUES (%s, %s, %s, %s, %s)
+        ''', [(GUILD, 10, 100, "general", T0), (GUILD, 11, 100, "general", T0)])
+        await db.execute("INSERT INTO voice_heartbeat (guild_id, seen_at) VALUES (%s, %s)", (GUILD, T0 + timedelta(seconds=120)))
+
+        # Бот лежал час; bob всё ещё в том же канале, alice давно ушла
+        buffer = VoiceActivityBuffer(db)
+        states = {(GUILD, 11): ("bob", 100, "general")}
+        assert await buffer.reconcile([GUILD], states, T0 + timedelta(hours=1)) == (1, 0)
+
+        rows = {r['user_id']: r for r in await voice_rows(db)}
+        assert rows[10]['leave_time'] == T0 + timedelta(seconds=120)
+        assert rows[10]['duration_seconds'] == 120
+        assert rows[11]['leave_time'] is None
+        assert buffer.sessions[(GUILD, 11)]['id'] == rows[11]['id']
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_heartbeat_does_not_advance_while_disconnected(moderation_db):
+    async def scenario():
+        db = await moderation_db()
+        buffer = VoiceActivityBuffer(db)
+        buffer.join(GUILD, 10, "alice", 100, "general", T0)
+        await buffer.flush()
+        first = await db.fetchone("SELECT seen_at FROM voice_heartbeat WHERE guild_id = %s", (GUILD,))
+        assert first['seen_at'] > T0
+
+        buffer.disconnected(T0 + timedelta(seconds=5))
+        await buffer.flush()
+        row = await db.fetchone("SELECT seen_at FROM voice_heartbeat WHERE guild_id = %s", (GUILD,))
+        assert row['seen_at'] == T0 + timedelta(seconds=5)
+
+        buffer.resumed()
+        await buffer.flush()
+        row = await db.fetchone("SELECT seen_at FROM voice_heartbeat WHERE guild_id = %s", (GUILD,))
+        assert row['seen_at'] >= first['seen_at']
+        await db.close()
+
+    asyncio.run(scenario())
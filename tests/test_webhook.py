@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import aiohttp
+
+from Modules.Tools.webhook import WebhookClient
+
+
+def client_for(session, **kwargs):
+    return WebhookClient(lambda: session, backoff=0.01, **kwargs)
+
+
+def test_retries_429_and_5xx_then_delivers(webhook_server):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        server.script['1'] = [
+            (429, {}, json.dumps({'retry_after': 0.05, 'global': False})),
+            (503, {}, "unavailable"),
+        ]
+        async with aiohttp.ClientSession() as session:
+            result = await client_for(session).send(server.url(), {'content': "привет"})
+        assert result.ok and result.status == 204 and result.attempts == 3
+        assert server.payloads() == [{'content': "привет"}] * 3
+        times = [t for _, _, t in server.received]
+        assert times[1] - times[0] >= 0.05
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_client_error_is_not_retried(webhook_server):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        server.script['1'] = [(404, {}, '{"message": "Unknown Webhook"}')]
+        async with aiohttp.ClientSession() as session:
+            result = await client_for(session).send(server.url(), {'content': "x"})
+        assert not result.ok and result.status == 404 and result.attempts == 1
+        assert "Unknown Webhook" in result.error
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_exhausted_bucket_delays_only_its_webhook(webhook_server):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        server.script['1'] = [(204, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '0.3'}, "")]
+        loop = asyncio.get_running_loop()
+        async with aiohttp.ClientSession() as session:
+            client = client_for(session)
+            assert (await client.send(server.url('1'), {'n': 1})).ok
+            started = loop.time()
+            other, same = await asyncio.gather(
+                client.send(server.url('2'), {'n': 2}),
+                client.send(server.url('1') + '?wait=true', {'n': 3}),
+            )
+        assert other.ok and same.ok
+        arrived = {payload['n']: t - started for _, payload, t in server.received}
+        assert arrived[2] < 0.2
+        assert arrived[3] >= 0.25
+        await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_send_many_reports_each_payload_in_order(webhook_server):
+    async def scenario():
+        server = webhook_server()
+        await server.start()
+        server.script['1'] = [(400, {}, "bad")]
+        payloads = [{'n': i} for i in range(10)]
+        async with aiohttp.ClientSession() as session:
+            results = await client_for(session).send_many(server.url(), payloads, concurrency=1)
+        assert [r.ok for r in results] == [False] + [True] * 9
+        assert sorted(p['n'] for p in server.payloads()) == list(range(10))
+        await server.stop()
+
+    asyncio.run(scenario())